@@ -0,0 +1,58 @@
+# benchmarks/bench_api.py
+"""
+Offline load test of the "api" backend against benchmarks/stub_server.py.
+
+    python benchmarks/bench_api.py --suite core --repeat 10 --concurrency 1 4 16
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "evaluator"))
+
+from api_client import collect_answers_api
+from stub_server import start_in_background
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--suite", default="core")
+    parser.add_argument("--repeat", type=int, default=4, help="send the suite this many times")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--ttft", type=float, default=0.05)
+    parser.add_argument("--chars-per-sec", type=float, default=4000.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    with open(ROOT / "configs" / "stub.yml", "r") as f:
+        config = yaml.safe_load(f)
+    config["api"]["url"] = f"http://127.0.0.1:{args.port}/chat"
+
+    with open(ROOT / "data" / f"{args.suite}.jsonl", "r", encoding="utf-8") as f:
+        items = [json.loads(line) for line in f if line.strip()] * args.repeat
+
+    server = start_in_background(port=args.port, ttft=args.ttft,
+                                 chars_per_sec=args.chars_per_sec, error_rate=args.error_rate)
+    try:
+        for concurrency in args.concurrency:
+            results = [None] * len(items)
+            start = time.perf_counter()
+            collect_answers_api(items, config, results.__setitem__, concurrency=concurrency)
+            elapsed = time.perf_counter() - start
+            latencies = [r["latency_ms"] for r in results]
+            ttfts = [r["ttft_ms"] for r in results]
+            retries = sum(r["attempts"] - 1 for r in results)
+            print(f"concurrency={concurrency:>3}  items={len(results)}  {len(results) / elapsed:8.1f} items/s  "
+                  f"p50={np.percentile(latencies, 50):.0f}ms  p95={np.percentile(latencies, 95):.0f}ms  "
+                  f"ttft_p50={np.percentile(ttfts, 50):.0f}ms  retries={retries}")
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# benchmarks/bench_compare.py
+"""
+Speed of the paired A/B comparison (evaluator/compare.py) on synthetic run pairs.
+
+    python benchmarks/bench_compare.py
+    python benchmarks/bench_compare.py --items 1000 5000 20000 --resamples 10000 --by-tag
+
+For each --items size a base and a candidate report of synthetic items (gen_suite.py
+tags, noisy scores, long-tailed latencies, a few failed or cached items) are written
+to a temporary directory, then compare_runs is timed (best of --repeat), overall and,
+with --by-tag, on every tag as well. For scale, "plain" times the textbook NumPy
+version of the overall resampling alone (once): an index matrix per block of resamples,
+means and nearest-rank np.quantile of the gathered values, and the same for random
+swaps.
+"""
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "evaluator"))
+
+from gen_suite import generate_items
+
+def synthetic_report(items, run_id: str, shift: float, rng: random.Random):
+    records = []
+    for item in items:
+        correctness = min(1.0, max(0.0, rng.gauss(0.75 + shift, 0.1)))
+        outcome = "timeout" if rng.random() < 0.01 else "ok"
+        records.append({
+            "run_id": run_id,
+            "id": item["id"],
+            "config": run_id.split("_")[0],
+            "latency_ms": int(rng.lognormvariate(10.3 - shift, 0.4)) if outcome == "ok" else None,
+            "correctness": correctness,
+            "correct_pass": correctness >= 0.78,
+            "relevance": min(1.0, max(0.0, rng.gauss(0.95, 0.05))),
+            "safety_flags": [],
+            "safety_violation_count": int(rng.random() < 0.02),
+            "tags": item["tags"],
+            "outcome": outcome,
+            "cached": rng.random() < 0.05,
+        })
+    return records
+
+def plain_resampling(pairs, rng, resamples: int, block: int = 1000):
+    """
+    Bootstrap and permutation statistics of compare_arrays, computed directly.
+    """
+    base, cand = pairs["base"], pairs["candidate"]
+    valid = ~(np.isnan(base) | np.isnan(cand))
+    diff = np.where(valid, cand - base, 0.0)
+    lat_mask = ~(np.isnan(pairs["base_latency"]) | np.isnan(pairs["candidate_latency"]))
+    base_lat, cand_lat = pairs["base_latency"][lat_mask], pairs["candidate_latency"][lat_mask]
+    n, k = len(diff), len(base_lat)
+    qs = [0.5, 0.95]
+    for start in range(0, resamples, block):
+        rows = min(block, resamples - start)
+        idx = rng.integers(0, n, size=(rows, n))
+        diff[idx].sum(axis=1) / valid[idx].sum(axis=1)
+        lat_idx = rng.integers(0, k, size=(rows, k))
+        (np.quantile(cand_lat[lat_idx], qs, axis=1, method="inverted_cdf")
+         - np.quantile(base_lat[lat_idx], qs, axis=1, method="inverted_cdf"))
+        swaps = rng.random((rows, n)) < 0.5
+        np.where(swaps[:, :, None], -diff, diff).sum(axis=1) / valid.sum(axis=0)
+        lat_swaps = swaps[:, :k]
+        (np.quantile(np.where(lat_swaps, base_lat, cand_lat), qs, axis=1, method="inverted_cdf")
+         - np.quantile(np.where(lat_swaps, cand_lat, base_lat), qs, axis=1, method="inverted_cdf"))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--resamples", type=int, default=10000)
+    parser.add_argument("--by-tag", action="store_true", help="also time the per-tag comparisons")
+    parser.add_argument("--min-tag-items", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3, help="timed passes per size (best is kept)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import compare
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench-compare-"))
+    print(f"{'items':>7} {'resamples':>9} {'tags':>5} {'seconds':>8} {'plain':>8}")
+    for n in args.items:
+        rng = random.Random(args.seed)
+        items = list(generate_items(n, args.seed))
+        paths = []
+        for run_id, shift in (("prod_1", 0.0), ("candidate_2", 0.01)):
+            path = workdir / f"{run_id}_{n}.json"
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(synthetic_report(items, run_id, shift, rng), f)
+            paths.append(path)
+
+        best, result = float("inf"), None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = compare.compare_runs(*paths, resamples=args.resamples, seed=args.seed,
+                                          by_tag=args.by_tag, min_tag_items=args.min_tag_items)
+            best = min(best, time.perf_counter() - start)
+        pairs = compare.pair_runs(compare.load_run(paths[0]), compare.load_run(paths[1]))
+        start = time.perf_counter()
+        plain_resampling(pairs, np.random.default_rng(args.seed), args.resamples)
+        plain = time.perf_counter() - start
+        print(f"{n:>7} {args.resamples:>9} {len(result['by_tag']):>5} {best:>8.2f} {plain:>8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+# benchmarks/bench_harness.py
+"""
+Microbenchmarks of the harness's own hot paths on a synthetic suite (gen_suite.py),
+so changes can be checked offline: items/sec and peak Python memory per benchmark.
+
+Every run is appended to benchmarks/results/bench_harness.jsonl and compared with the
+last run of the same size on the same host; drops in items/sec or growth in peak
+memory beyond --tolerance are marked REGRESSION (--fail-on-regression exits 1).
+Before timing, it checks that an item ending in error or timeout leaves the aggregates
+as if it were not in the run (only its outcome is counted); a mismatch exits 1.
+
+    python benchmarks/bench_harness.py --items 10000
+    python benchmarks/bench_harness.py --items 100000 --only aggregate_metrics sheets_rows
+
+embed_texts and compute_metrics need the embedding model; they are skipped when it
+cannot be loaded. The embedding cache goes to a temporary directory, so the cold
+(encoder) and warm (cache hit) passes are measured separately. --embedding-backend
+onnx runs them on the int8 ONNX backend (runs are compared per backend).
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "evaluator"))
+
+from gen_suite import generate_items
+
+RESULTS_PATH = Path(__file__).resolve().parent / "results" / "bench_harness.jsonl"
+CONFIG = {"metrics": {"similarity_threshold": 0.78, "use_llm_judge": False, "safety_packs": ["default"]}}
+
+# ---------------------------
+# Synthetic inputs
+# ---------------------------
+def synthetic_answer(item, rng: random.Random) -> str:
+    """
+    A model answer near the ground truth: some words dropped, a few added from the question.
+    """
+    words = [w for w in item["gt_answer"].split() if rng.random() > 0.2]
+    words += rng.sample(item["question"].split(), k=min(3, len(item["question"].split())))
+    return " ".join(words)
+
+def synthetic_results(items, answers, rng: random.Random):
+    """
+    Scored records shaped like run_eval's, without running the metrics.
+    """
+    for i, (item, answer) in enumerate(zip(items, answers)):
+        latency = int(rng.lognormvariate(8, 0.4))
+        yield {
+            "run_id": "bench_0", "id": item["id"], "config": "bench", "model_answer": answer,
+            "latency_ms": latency, "ttft_ms": latency // 4, "generation_ms": latency - latency // 4,
+            "chars_per_sec": round(len(answer) / max(1, latency - latency // 4) * 1000, 1),
+            "correctness": rng.random(), "correct_pass": rng.random() < 0.8,
+            "relevance": float(rng.random() < 0.9), "safety_flags": ["hate"] if i % 97 == 0 else [],
+            "safety_violation_count": int(i % 97 == 0), "tags": item["tags"], "worker": i % 4,
+            "turn": i % 20 + 1, "cached": False,
+        }
+
+# ---------------------------
+# Benchmarks
+# ---------------------------
+def build_benchmarks(items, answers, results):
+    """
+    name -> (n_items, fn). Functions return nothing; only their time and memory count.
+    """
+    from metrics import (compute_metrics, compute_metrics_batch, compute_relevance_batch,
+                         compute_safety_batch, aggregate_metrics)
+    from embeddings import embed_texts
+    from sheets_client import run_rows, per_item_rows, top_failure_rows
+
+    gt_answers = [item["gt_answer"] for item in items]
+    latencies = [r["latency_ms"] for r in results]
+    per_item_n = min(len(items), 1000)
+
+    def metrics_batched():
+        for start in range(0, len(items), 256):
+            compute_metrics_batch(items[start:start + 256], answers[start:start + 256], latencies[start:start + 256], CONFIG)
+
+    def sheets_rows():
+        aggregates = aggregate_metrics(results)
+        run_rows("bench_0", "bench", "synthetic", aggregates)
+        per_item_rows(results)
+        top_failure_rows(results)
+
+    return {
+        "embed_texts_cold": (len(items), lambda: embed_texts(gt_answers, config=CONFIG)),
+        "embed_texts_cached": (len(items), lambda: embed_texts(gt_answers, config=CONFIG)),
+        "compute_metrics": (per_item_n, lambda: [compute_metrics(item, answer, 1000, CONFIG)
+                                                 for item, answer in zip(items[:per_item_n], answers[:per_item_n])]),
+        "compute_metrics_batch": (len(items), metrics_batched),
+        "compute_relevance_batch": (len(items), lambda: compute_relevance_batch([i["question"] for i in items], answers)),
+        "compute_safety_batch": (len(items), lambda: compute_safety_batch(answers, CONFIG)),
+        "aggregate_metrics": (len(items), lambda: aggregate_metrics(results)),
+        "sheets_rows": (len(items), sheets_rows),
+    }
+
+def check_failed_items_ignored(results) -> bool:
+    """
+    Aggregates of the run with its first item turned into an error (empty answer, latency
+    at the give-up time) must equal those of the run without that item, outcomes aside.
+    """
+    from metrics import aggregate_metrics
+
+    failed = {**results[0], "model_answer": "", "correctness": 0.0, "correct_pass": False, "relevance": 0.0,
+              "latency_ms": 150000, "ttft_ms": None, "outcome": "error", "error": "HTTP 503", "attempts": 3}
+    with_failure = aggregate_metrics([failed] + results[1:])
+    without = aggregate_metrics(results[1:])
+    assert with_failure.pop("outcomes") == {"error": 1, **without.pop("outcomes")}
+    assert with_failure.pop("retried_items") == without.pop("retried_items") + 1
+    return with_failure == without
+
+NEEDS_MODEL = {"embed_texts_cold", "embed_texts_cached", "compute_metrics", "compute_metrics_batch"}
+
+def measure(fn, repeat: int, memory: bool):
+    """
+    Best wall time over `repeat` calls, then peak traced memory of one more call.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    peak_mb = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        fn()
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+    return best, peak_mb
+
+# ---------------------------
+# Results
+# ---------------------------
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+def previous_run(path: Path, items: int, host: str, backend: str = "torch"):
+    if not path.exists():
+        return None
+    previous = None
+    with open(path, "r") as f:
+        for line in f:
+            record = json.loads(line)
+            if (record["items"] == items and record["host"] == host
+                    and record.get("embedding_backend", "torch") == backend):
+                previous = record
+    return previous
+
+def compare(current, previous, tolerance: float):
+    """
+    Print each benchmark against the previous run; returns the names that regressed.
+    """
+    regressions = []
+    print(f"{'benchmark':<26} {'items':>7} {'seconds':>9} {'items/s':>11} {'peak_MB':>9}  vs previous")
+    for name, r in current["results"].items():
+        peak = "-" if r["peak_mb"] is None else f"{r['peak_mb']:.1f}"
+        line = f"{name:<26} {r['items']:>7} {r['seconds']:>9.3f} {r['items_per_sec']:>11.0f} {peak:>9}"
+        before = (previous or {}).get("results", {}).get(name)
+        if before:
+            speed = r["items_per_sec"] / before["items_per_sec"] - 1
+            line += f"  {speed:+.0%} items/s"
+            slower = speed < -tolerance
+            bigger = False
+            if r["peak_mb"] and before.get("peak_mb"):
+                growth = r["peak_mb"] / before["peak_mb"] - 1
+                line += f", {growth:+.0%} memory"
+                bigger = growth > tolerance
+            if slower or bigger:
+                line += "  <- REGRESSION"
+                regressions.append(name)
+        print(line)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=10000, help="synthetic suite size (1k-100k)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", help="run only these benchmarks")
+    parser.add_argument("--repeat", type=int, default=3, help="timed calls per benchmark (best is kept)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed slowdown / memory growth")
+    parser.add_argument("--results", default=str(RESULTS_PATH))
+    parser.add_argument("--no-save", action="store_true")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--embedding-backend", default="torch", help="embeddings.backend to benchmark (torch, onnx)")
+    parser.add_argument("--threads", type=int, default=4, help="ONNX Runtime threads with --embedding-backend onnx")
+    args = parser.parse_args()
+
+    CONFIG["embeddings"] = {"backend": args.embedding_backend, "threads": args.threads}
+
+    # A fresh embedding cache, so embed_texts_cold really encodes
+    os.environ["EMBEDDING_CACHE_DIR"] = tempfile.mkdtemp(prefix="bench-embeddings-")
+
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    items = list(generate_items(args.items, args.seed))
+    answers = [synthetic_answer(item, rng) for item in items]
+    results = list(synthetic_results(items, answers, rng))
+    print(f"{args.items} synthetic items in {time.perf_counter() - start:.1f}s")
+
+    if not check_failed_items_ignored(results):
+        print("FAIL: an errored item changed the aggregates beyond the outcome counts")
+        sys.exit(1)
+    print("an errored item only changes the outcome counts: ok")
+
+    benchmarks = build_benchmarks(items, answers, results)
+    selected = args.only or list(benchmarks)
+    unknown = set(selected) - set(benchmarks)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}; choose from {', '.join(benchmarks)}")
+
+    if NEEDS_MODEL.intersection(selected):
+        try:
+            from embeddings import get_model
+            get_model(CONFIG)
+        except Exception as e:
+            print(f"Skipping {', '.join(sorted(NEEDS_MODEL.intersection(selected)))}: embedding model unavailable ({e})")
+            selected = [name for name in selected if name not in NEEDS_MODEL]
+
+    current = {
+        "timestamp": time.time(),
+        "host": socket.gethostname(),
+        "python": platform.python_version(),
+        "git": git_revision(),
+        "items": args.items,
+        "embedding_backend": args.embedding_backend,
+        "results": {},
+    }
+    for name in selected:
+        n, fn = benchmarks[name]
+        # The cold pass must run once, before the cache is warm
+        repeat = 1 if name == "embed_texts_cold" else args.repeat
+        memory = not args.no_memory and name != "embed_texts_cold"
+        seconds, peak_mb = measure(fn, repeat, memory)
+        current["results"][name] = {"items": n, "seconds": seconds, "items_per_sec": n / seconds, "peak_mb": peak_mb}
+
+    results_path = Path(args.results)
+    regressions = compare(current, previous_run(results_path, args.items, current["host"], args.embedding_backend), args.tolerance)
+    if not args.no_save:
+        results_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(results_path, "a") as f:
+            f.write(json.dumps(current) + "\n")
+        print(f"Results appended to {results_path}")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
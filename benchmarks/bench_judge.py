@@ -0,0 +1,116 @@
+# benchmarks/bench_judge.py
+"""
+CPU throughput of the cross-encoder judge (evaluator/judge.py) on a synthetic suite.
+
+    python benchmarks/bench_judge.py --items 1000
+    python benchmarks/bench_judge.py --items 1000 --threads 4 --batch-tokens 4096 8192 16384
+
+For each --batch-tokens value the judge scores every (ground truth, answer) pair with
+an empty score cache (best of --repeat), then once more with the cache warm. One
+predict() call over all chunks with sentence-transformers' fixed 32-pair batches is
+timed as a baseline (--no-baseline skips it). The
+model comes from configs/<config>.yml (metrics.judge) unless --model is given.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import yaml
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "evaluator"))
+
+from gen_suite import generate_items
+from bench_harness import synthetic_answer
+
+def long_answer(item, rng: random.Random) -> str:
+    """
+    A rambling answer several times the ground truth's length, so it needs chunking.
+    """
+    words = item["gt_answer"].split() + item["question"].split()
+    return " ".join(rng.choices(words, k=len(words) * rng.randint(3, 8)))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--config", default="prod", help="config whose metrics.judge settings are used")
+    parser.add_argument("--model", help="override metrics.judge.model (hub name or local path)")
+    parser.add_argument("--max-length", type=int, help="override metrics.judge.max_length")
+    parser.add_argument("--batch-tokens", type=int, nargs="+", help="padded tokens per batch to compare")
+    parser.add_argument("--long-share", type=float, default=0.2, help="share of answers longer than the window")
+    parser.add_argument("--threads", type=int, help="torch CPU threads (default: torch's choice)")
+    parser.add_argument("--repeat", type=int, default=1, help="timed passes per setting (best is kept)")
+    parser.add_argument("--no-baseline", action="store_true", help="skip the fixed 32-pair batching baseline")
+    args = parser.parse_args()
+
+    with open(ROOT / "configs" / f"{args.config}.yml", "r") as f:
+        config = yaml.safe_load(f)
+    config["metrics"]["use_llm_judge"] = True
+    settings = config["metrics"].setdefault("judge", {})
+    if args.model:
+        settings["model"] = args.model
+    if args.max_length:
+        settings["max_length"] = args.max_length
+
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    # A fresh score cache, so the first pass really runs the model
+    os.environ["JUDGE_CACHE_PATH"] = str(Path(tempfile.mkdtemp(prefix="bench-judge-")) / "judge.sqlite")
+    import judge
+
+    rng = random.Random(args.seed)
+    items = list(generate_items(args.items, args.seed))
+    answers = [long_answer(item, rng) if rng.random() < args.long_share else synthetic_answer(item, rng)
+               for item in items]
+    gt_answers = [item["gt_answer"] for item in items]
+
+    resolved = judge.judge_settings(config)
+    start = time.perf_counter()
+    model = judge.get_judge(resolved["model"], resolved["max_length"])
+    print(f"Loaded {resolved['model']} in {time.perf_counter() - start:.1f}s")
+
+    chunks = judge.chunk_pairs(model.tokenizer, gt_answers, answers, resolved["max_length"], resolved["stride"])
+    n_chunks = sum(len(c) for c in chunks)
+    print(f"{args.items} pairs -> {n_chunks} chunks ({sum(len(c) > 1 for c in chunks)} answers chunked)")
+
+    print(f"{'batching':<22} {'seconds':>8} {'items/s':>9} {'1k items':>9}")
+
+    def report(label, seconds):
+        print(f"{label:<22} {seconds:>8.2f} {args.items / seconds:>9.1f} {1000 * seconds / args.items:>8.1f}s")
+
+    def best_of(fn):
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    if not args.no_baseline:
+        pairs = [(gt, text) for c in chunks for gt, text, _ in c]
+        report("predict, 32/batch", best_of(lambda: model.predict(pairs, batch_size=32, show_progress_bar=False,
+                                                                  convert_to_numpy=True)))
+
+    for batch_tokens in args.batch_tokens or [resolved["batch_tokens"]]:
+        settings["batch_tokens"] = batch_tokens
+
+        def cold_pass():
+            cache = judge._get_cache()
+            with cache.conn:
+                cache.conn.execute("DELETE FROM scores")
+            judge.judge_scores(gt_answers, answers, config)
+        report(f"bucketed, {batch_tokens} tok", best_of(cold_pass))
+
+    start = time.perf_counter()
+    judge.judge_scores(gt_answers, answers, config)
+    report("score cache hit", time.perf_counter() - start)
+
+if __name__ == "__main__":
+    main()
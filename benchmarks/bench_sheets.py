@@ -0,0 +1,69 @@
+# benchmarks/bench_sheets.py
+"""
+Upload existing reports to the fake Sheets server and report time and API calls per run.
+Checks that each run costs a single batchUpdate, that retries recover from 503s, and
+that a batchUpdate applied on the server but answered with an error is not appended again.
+
+    python benchmarks/bench_sheets.py --runs 10 --fail-first 2 --fail-after-write 1
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import yaml
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "evaluator"))
+
+from fake_sheets_server import start_in_background
+from metrics import aggregate_metrics
+import sheets_client
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10, help="number of report files to upload")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--fail-first", type=int, default=0, help="answer the first N API calls with 503")
+    parser.add_argument("--fail-after-write", type=int, default=0,
+                        help="apply the first N batchUpdates, then answer them with 503")
+    args = parser.parse_args()
+
+    with open(ROOT / "configs" / "sheets.yml", "r") as f:
+        config = yaml.safe_load(f)
+    config["sheets"]["api_base"] = f"http://127.0.0.1:{args.port}/v4/spreadsheets"
+
+    reports = sorted((ROOT / "reports").glob("*.json"))[:args.runs]
+    server = start_in_background(port=args.port)
+    server.state.fail_next = args.fail_first
+    server.state.fail_after_write = args.fail_after_write
+    sheets_client._uploader = sheets_client.BackgroundUploader(backoff_seconds=0.05)
+    try:
+        start = time.perf_counter()
+        for path in reports:
+            with open(path, "r") as f:
+                results = json.load(f)
+            sheets_client.upload_run_in_background(path.stem, results[0]["config"], "unknown",
+                                                   aggregate_metrics(results), results, config)
+        queued = time.perf_counter() - start
+        sheets_client.wait_for_uploads()
+        elapsed = time.perf_counter() - start
+
+        calls = dict(server.state.calls)
+        tabs = {title: len(rows) for title, rows in server.state.tabs.items()}
+        print(f"{len(reports)} runs queued in {queued * 1000:.1f}ms, uploaded in {elapsed:.3f}s")
+        print(f"API calls: {calls}")
+        print(f"rows per tab (incl. header): {tabs}")
+        if calls.get("batch_update", 0) != len(reports):
+            print("FAIL: expected one batchUpdate per run")
+            sys.exit(1)
+        run_ids = [row[1] for row in server.state.tabs["Runs"][1:]]
+        if sorted(run_ids) != sorted(path.stem for path in reports):
+            print("FAIL: expected exactly one Runs row per run")
+            sys.exit(1)
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# benchmarks/bench_startup.py
+"""
+Startup-time benchmark for the evaluator CLI.
+
+Measures how long `python evaluator/run_eval.py --help` takes and checks that
+importing the harness does not pull in the heavy dependencies (torch,
+sentence-transformers, Playwright, gspread). Exits non-zero on a regression.
+
+    python benchmarks/bench_startup.py --runs 5 --max-seconds 1.5
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ["torch", "sentence_transformers", "playwright", "gspread", "bs4"]
+
+IMPORT_PROBE = f"""
+import json, sys
+sys.path.insert(0, {str(ROOT / "evaluator")!r})
+import run_eval
+print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))
+"""
+
+def time_help(runs: int):
+    """
+    Wall-clock seconds for `run_eval.py --help`, one value per run.
+    """
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, str(ROOT / "evaluator" / "run_eval.py"), "--help"],
+                       cwd=ROOT, check=True, capture_output=True)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def heavy_imports():
+    """
+    Heavy modules that get imported just by importing run_eval.
+    """
+    out = subprocess.run([sys.executable, "-c", IMPORT_PROBE],
+                         cwd=ROOT, check=True, capture_output=True, text=True)
+    return json.loads(out.stdout)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=1.5,
+                        help="fail if the median --help time exceeds this")
+    args = parser.parse_args()
+
+    timings = time_help(args.runs)
+    loaded = heavy_imports()
+    median = statistics.median(timings)
+
+    print(f"run_eval.py --help: median {median:.3f}s, min {min(timings):.3f}s over {args.runs} runs")
+    print(f"heavy modules loaded on import: {loaded or 'none'}")
+
+    failed = False
+    if loaded:
+        print("FAIL: heavy dependencies are imported eagerly")
+        failed = True
+    if median > args.max_seconds:
+        print(f"FAIL: startup {median:.3f}s exceeds budget {args.max_seconds:.3f}s")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# benchmarks/check_embedding_parity.py
+"""
+Check that an embedding backend scores like the default one before switching a config
+to it: every suite's (ground truth, answer-like text) pairs are scored with both, and
+the script exits 1 if any cosine differs by more than --tolerance.
+
+    python benchmarks/check_embedding_parity.py --config prod --backend onnx
+    python benchmarks/check_embedding_parity.py --backend onnx --onnx-file onnx/model_qint8_avx512_vnni.onnx --threads 8
+
+Pairs are each item's ground truth against its question and against a noisy copy of
+itself (bench_harness.synthetic_answer), plus --items synthetic items (gen_suite.py)
+for the long tail. Also printed: encode time and resident memory of each backend, and
+how many items would flip correct_pass at similarity_threshold. The embedding cache
+is off, so both backends really encode.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "evaluator"))
+
+from gen_suite import generate_items
+from bench_harness import synthetic_answer
+
+def rss_mb() -> float:
+    """
+    Current resident memory of this process (Linux), or nan elsewhere.
+    """
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+def load_pairs(data_dir: Path, n_synthetic: int, seed: int):
+    rng = random.Random(seed)
+    items = []
+    for path in sorted(data_dir.glob("*.jsonl")):
+        with open(path, "r", encoding="utf-8") as f:
+            items.extend(json.loads(line) for line in f if line.strip())
+    items.extend(generate_items(n_synthetic, seed, id_prefix="parity"))
+    texts_a, texts_b = [], []
+    for item in items:
+        texts_a += [item["gt_answer"], item["gt_answer"]]
+        texts_b += [item["question"], synthetic_answer(item, rng)]
+    return texts_a, texts_b
+
+def score(embeddings, texts_a, texts_b, config):
+    """
+    Cosine per pair, with load and encode time and memory growth.
+    """
+    before = rss_mb()
+    start = time.perf_counter()
+    embeddings.get_model(config)
+    loaded = time.perf_counter()
+    scores = embeddings.semantic_similarity_batch(texts_a, texts_b, config=config)
+    return scores, loaded - start, time.perf_counter() - loaded, rss_mb() - before
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default="prod", help="config whose embeddings settings and threshold are used")
+    parser.add_argument("--backend", default="onnx", help="backend to check against the default torch one")
+    parser.add_argument("--onnx-file", help="override embeddings.onnx_file")
+    parser.add_argument("--threads", type=int, help="override embeddings.threads")
+    parser.add_argument("--items", type=int, default=1000, help="synthetic items added to the real suites")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tolerance", type=float, default=0.03, help="largest allowed cosine difference")
+    args = parser.parse_args()
+
+    os.environ["EMBEDDING_CACHE"] = "0"
+    import embeddings
+
+    with open(ROOT / "configs" / f"{args.config}.yml", "r") as f:
+        config = yaml.safe_load(f)
+    candidate = {"embeddings": {**config.get("embeddings", {}), "backend": args.backend}}
+    if args.onnx_file:
+        candidate["embeddings"]["onnx_file"] = args.onnx_file
+    if args.threads:
+        candidate["embeddings"]["threads"] = args.threads
+    reference = {"embeddings": {**config.get("embeddings", {}), "backend": "torch"}}
+    threshold = config["metrics"]["similarity_threshold"]
+
+    texts_a, texts_b = load_pairs(ROOT / "data", args.items, args.seed)
+    print(f"{len(texts_a)} pairs, {len(set(texts_a) | set(texts_b))} distinct texts")
+
+    # Candidate first, so its memory growth does not include the torch model
+    results = {}
+    for label, settings in ((args.backend, candidate), ("torch", reference)):
+        results[label] = score(embeddings, texts_a, texts_b, settings)
+    print(f"{'backend':<10} {'load_s':>7} {'encode_s':>9} {'texts/s':>9} {'rss_MB':>8}")
+    n_texts = len(set(texts_a) | set(texts_b))
+    for label, (_, load_s, encode_s, rss) in results.items():
+        print(f"{label:<10} {load_s:>7.1f} {encode_s:>9.2f} {n_texts / encode_s:>9.0f} {rss:>+8.0f}")
+    speedup = results["torch"][2] / results[args.backend][2]
+    print(f"{args.backend} encodes {speedup:.1f}x as fast as torch")
+
+    diff = np.abs(results[args.backend][0] - results["torch"][0])
+    flips = int(np.sum((results[args.backend][0] >= threshold) != (results["torch"][0] >= threshold)))
+    print(f"|cosine difference|: max {diff.max():.4f}, mean {diff.mean():.4f}, p99 {np.percentile(diff, 99):.4f}; "
+          f"{flips} of {len(diff)} pairs flip at similarity_threshold {threshold}")
+    if diff.max() > args.tolerance:
+        print(f"FAIL: cosine difference above --tolerance {args.tolerance}")
+        sys.exit(1)
+    print(f"OK: within --tolerance {args.tolerance}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+# benchmarks/fake_sheets_server.py
+"""
+In-memory fake of the few Google Sheets v4 endpoints the harness uses, so uploads
+can be tested and timed offline. Point the harness at it with `api_base` in sheets.yml:
+
+    sheets:
+      api_base: "http://127.0.0.1:8766/v4/spreadsheets"
+
+Supported: GET spreadsheets/{id}, GET values:batchGet (row ranges like 'Runs'!1:1 and
+single-column ranges like 'Runs'!B:B) and POST :batchUpdate with appendCells / insertDimension / updateCells.
+GET /_state returns the tab contents and a per-endpoint call counter.
+"""
+import argparse
+import json
+import re
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+DEFAULT_TABS = ["Runs", "PerItem", "TopFailures"]
+
+def _cell_value(cell):
+    value = cell.get("userEnteredValue", {})
+    if "numberValue" in value:
+        return value["numberValue"]
+    if "boolValue" in value:
+        return value["boolValue"]
+    return value.get("stringValue", value.get("formulaValue", ""))
+
+class FakeSheetsState:
+    def __init__(self, tabs=DEFAULT_TABS):
+        self.lock = threading.Lock()
+        self.tabs = {title: [] for title in tabs}
+        self.ids = {title: i for i, title in enumerate(tabs)}
+        self.calls = Counter()
+        self.fail_next = 0   # answer the next N requests with 503 (to exercise retries)
+        self.fail_after_write = 0   # apply the next N batchUpdates, then answer 503 (a lost response)
+
+    def title_of(self, sheet_id):
+        return next(t for t, i in self.ids.items() if i == sheet_id)
+
+    def apply(self, request):
+        kind, body = next(iter(request.items()))
+        if kind == "appendCells":
+            rows = self.tabs[self.title_of(body["sheetId"])]
+            rows.extend([[_cell_value(c) for c in r.get("values", [])] for r in body["rows"]])
+        elif kind == "insertDimension":
+            rng = body["range"]
+            rows = self.tabs[self.title_of(rng["sheetId"])]
+            for _ in range(rng["endIndex"] - rng["startIndex"]):
+                rows.insert(rng["startIndex"], [])
+        elif kind == "updateCells":
+            start = body["start"]
+            rows = self.tabs[self.title_of(start["sheetId"])]
+            for offset, r in enumerate(body["rows"]):
+                index = start["rowIndex"] + offset
+                while len(rows) <= index:
+                    rows.append([])
+                rows[index] = [_cell_value(c) for c in r.get("values", [])]
+        else:
+            raise ValueError(f"unsupported request {kind}")
+
+class FakeSheetsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None   # set by make_server
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _maybe_fail(self) -> bool:
+        if self.state.fail_next > 0:
+            self.state.fail_next -= 1
+            self._send(503, {"error": {"code": 503, "message": "simulated backend error", "status": "UNAVAILABLE"}})
+            return True
+        return False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        state = self.state
+        with state.lock:
+            if url.path == "/_state":
+                self._send(200, {"tabs": state.tabs, "calls": state.calls})
+                return
+            if self._maybe_fail():
+                return
+            if url.path.endswith("/values:batchGet"):
+                state.calls["values_batch_get"] += 1
+                value_ranges = []
+                for rng in parse_qs(url.query).get("ranges", []):
+                    column = re.match(r"'?(.+?)'?!([A-Z]):\2$", rng)
+                    if column:
+                        index = ord(column.group(2)) - ord("A")
+                        rows = [[r[index]] for r in state.tabs[column.group(1)] if len(r) > index]
+                    else:
+                        match = re.match(r"'?(.+?)'?!(\d+):(\d+)$", rng)
+                        title, first, last = match.group(1), int(match.group(2)), int(match.group(3))
+                        rows = [r for r in state.tabs[title][first - 1:last] if r]
+                    value_ranges.append({"range": rng, "majorDimension": "ROWS",
+                                         **({"values": [[str(v) for v in r] for r in rows]} if rows else {})})
+                self._send(200, {"valueRanges": value_ranges})
+                return
+            match = re.match(r".*/v4/spreadsheets/([^/:]+)$", url.path)
+            if match:
+                state.calls["get_spreadsheet"] += 1
+                self._send(200, {
+                    "spreadsheetId": match.group(1),
+                    "properties": {"title": "Fake NurAI dashboard", "locale": "en_US", "timeZone": "Etc/GMT"},
+                    "sheets": [{"properties": {"sheetId": sid, "title": title, "index": sid, "sheetType": "GRID",
+                                               "gridProperties": {"rowCount": 1000, "columnCount": 26}}}
+                               for title, sid in state.ids.items()],
+                })
+                return
+        self._send(404, {"error": {"code": 404, "message": "not found"}})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        state = self.state
+        with state.lock:
+            if self._maybe_fail():
+                return
+            if url.path.endswith(":batchUpdate"):
+                state.calls["batch_update"] += 1
+                for request in body.get("requests", []):
+                    state.apply(request)
+                if state.fail_after_write > 0:
+                    state.fail_after_write -= 1
+                    self._send(503, {"error": {"code": 503, "message": "simulated lost response", "status": "UNAVAILABLE"}})
+                    return
+                self._send(200, {"spreadsheetId": url.path.split("/")[-1].split(":")[0], "replies": []})
+                return
+        self._send(404, {"error": {"code": 404, "message": "not found"}})
+
+class FakeSheetsServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass
+
+def make_server(port: int = 8766, tabs=DEFAULT_TABS) -> FakeSheetsServer:
+    state = FakeSheetsState(tabs)
+    handler = type("ConfiguredFakeSheetsHandler", (FakeSheetsHandler,), {"state": state})
+    server = FakeSheetsServer(("127.0.0.1", port), handler)
+    server.state = state
+    return server
+
+def start_in_background(**kwargs) -> FakeSheetsServer:
+    """
+    Start a fake Sheets server on a daemon thread; server.state holds tabs and call counts.
+    """
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, name="fake-sheets", daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    server = make_server(args.port)
+    print(f"Fake Sheets API on http://127.0.0.1:{args.port}/v4/spreadsheets")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
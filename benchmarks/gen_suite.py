@@ -0,0 +1,87 @@
+# benchmarks/gen_suite.py
+"""
+Generate synthetic suites shaped like data/core.jsonl (id, question, gt_answer,
+references, tags, needs_retrieval) for load tests and benchmarks of the harness.
+
+Words, tags and references are drawn from the hand-written suites under data/, with
+question and answer lengths in the same range, so tokenization, embedding, scoring
+and report sizes behave like the real suites. Output is deterministic per seed.
+
+    python benchmarks/gen_suite.py --items 10000 --out data/generated/synth_10k.jsonl
+    python evaluator/run_eval.py --suite data/generated/synth_10k.jsonl --config stub --sample 500
+"""
+import argparse
+import json
+import random
+from pathlib import Path
+from typing import Dict, Any, Iterator, List
+
+ROOT = Path(__file__).resolve().parent.parent
+
+QUESTION_STARTS = ["Apakah", "Bagaimanakah", "Mengapakah", "Siapakah", "Bilakah", "Terangkan", "Huraikan"]
+
+def load_vocabulary(data_dir: Path = ROOT / "data") -> Dict[str, List]:
+    """
+    Words, tags, references and the needs_retrieval share of the hand-written suites.
+    """
+    vocab = {"question_words": [], "answer_words": [], "tags": [], "references": [], "needs_retrieval": 0.0}
+    n_items = 0
+    for path in sorted(data_dir.glob("*.jsonl")):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                n_items += 1
+                vocab["question_words"].extend(item["question"].rstrip("?").split()[1:])
+                vocab["answer_words"].extend(item["gt_answer"].split())
+                vocab["tags"].extend(item.get("tags", []))
+                vocab["references"].extend(item.get("references", []))
+                vocab["needs_retrieval"] += bool(item.get("needs_retrieval"))
+    vocab["needs_retrieval"] /= max(1, n_items)
+    return vocab
+
+def generate_items(n: int, seed: int = 0, id_prefix: str = "s", vocab: Dict[str, List] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yield n synthetic items. Tags keep the skew of the real suites (common tags stay common).
+    """
+    vocab = vocab or load_vocabulary()
+    rng = random.Random(seed)
+    width = len(str(n))
+    for i in range(1, n + 1):
+        question = " ".join([rng.choice(QUESTION_STARTS)] + rng.choices(vocab["question_words"], k=rng.randint(4, 16)))
+        sentences = []
+        for _ in range(rng.randint(2, 6)):
+            words = rng.choices(vocab["answer_words"], k=rng.randint(8, 20))
+            sentences.append(" ".join(words).rstrip(".,") + ".")
+        yield {
+            "id": f"{id_prefix}{i:0{width}d}",
+            "question": question + "?",
+            "gt_answer": " ".join(sentences),
+            "references": rng.sample(vocab["references"], k=min(2, len(vocab["references"]))),
+            "tags": sorted(set(rng.choices(vocab["tags"], k=rng.randint(1, 3)))),
+            "needs_retrieval": rng.random() < vocab["needs_retrieval"],
+        }
+
+def write_suite(path: Path, n: int, seed: int = 0, id_prefix: str = "s") -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for item in generate_items(n, seed, id_prefix):
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic suite")
+    parser.add_argument("--items", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--id-prefix", default="s", help="prefix of item ids (keep suites' ids distinct)")
+    parser.add_argument("--out", help="output JSONL (default: data/generated/synth_<items>.jsonl)")
+    args = parser.parse_args()
+
+    out = Path(args.out or ROOT / "data" / "generated" / f"synth_{args.items}.jsonl")
+    write_suite(out, args.items, args.seed, args.id_prefix)
+    print(f"Wrote {args.items} items to {out} ({out.stat().st_size / 1e6:.1f} MB)")
+
+if __name__ == "__main__":
+    main()
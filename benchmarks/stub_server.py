@@ -0,0 +1,240 @@
+# benchmarks/stub_server.py
+"""
+Local stand-in for the NurAI chat API and web UI, for offline testing and load tests
+of the "api" backend (configs/stub.yml) and the "ui" backend (configs/mock.yml).
+
+POST /chat with {"question": ..., "stream": true|false}. Known suite questions are
+answered with their gt_answer, anything else is echoed. Streaming replies are sent
+as server-sent events ("data: {"delta": ...}") over chunked HTTP/1.1 keep-alive.
+
+GET / is a landing page whose "Start Chatting Now" link opens the chat page (/c) in a
+new tab; /c sends visitors without a session cookie to the login form (/login). The
+pages use the selectors of the real site and stream answers from /chat, so Playwright
+runs, session reuse and conversation rotation can be exercised without the live site.
+
+    python benchmarks/stub_server.py --port 8765 --ttft 0.3 --chars-per-sec 400
+    python benchmarks/stub_server.py --suites "data/generated/*.jsonl" --ttft 0.5 --jitter 0.5
+"""
+import argparse
+import glob
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+def load_answers(patterns=None):
+    """
+    question -> gt_answer for every suite file matching patterns (default data/*.jsonl).
+    """
+    answers = {}
+    paths = sorted({p for pattern in patterns or [str(ROOT / "data" / "*.jsonl")] for p in glob.glob(pattern)})
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    item = json.loads(line)
+                    answers[item["question"]] = item["gt_answer"]
+    return answers
+
+# ---------------------------
+# Mock web UI
+# ---------------------------
+HOME_PAGE = """<!doctype html>
+<html><head><title>NurAI stub</title></head>
+<body><a href="/c" target="_blank">Start Chatting Now</a></body></html>
+"""
+
+LOGIN_PAGE = """<!doctype html>
+<html><head><title>Login</title></head>
+<body>
+  <input maxlength="50" placeholder="Username">
+  <input type="password" maxlength="64" placeholder="Password">
+  <button class="button-3d bg-green shadow-green" onclick="
+    document.cookie = 'stub_session=1; path=/; max-age=43200';
+    location.href = '/c';">Log in</button>
+</body></html>
+"""
+
+CHAT_PAGE = """<!doctype html>
+<html><head><title>Chat</title>
+<script>if (!document.cookie.includes("stub_session=1")) location.replace("/login");</script>
+</head>
+<body>
+  <div class="list-content" id="messages"></div>
+  <div class="right-panel" id="first" style="display: flex; justify-content: center">
+    <textarea class="el-textarea__inner"></textarea>
+  </div>
+  <div class="chat-input-panel" id="followup" style="display: none">
+    <textarea class="el-textarea__inner"></textarea>
+  </div>
+  <button class="submit-btn-icon" aria-disabled="false" id="send">Send</button>
+<script>
+const first = document.getElementById("first");
+const followup = document.getElementById("followup");
+const messages = document.getElementById("messages");
+
+async function ask(question, box) {
+  const response = await fetch("/chat", {
+    method: "POST", headers: {"Content-Type": "application/json"},
+    body: JSON.stringify({question, stream: true}),
+  });
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  for (;;) {
+    const {done, value} = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, {stream: true});
+    let end;
+    while ((end = buffer.indexOf("\\n\\n")) >= 0) {
+      const event = buffer.slice(0, end);
+      buffer = buffer.slice(end + 2);
+      if (event.startsWith("data: ") && event !== "data: [DONE]") {
+        box.textContent += JSON.parse(event.slice(6)).delta;
+      }
+    }
+  }
+}
+
+document.getElementById("send").addEventListener("click", () => {
+  const input = (first.style.display === "none" ? followup : first).querySelector("textarea");
+  const question = input.value;
+  input.value = "";
+  first.style.display = "none";
+  followup.style.display = "";
+
+  const user = document.createElement("div");
+  user.className = "user-message";
+  user.textContent = question;
+  const container = document.createElement("div");
+  container.className = "ai-message-container";
+  container.innerHTML = '<div class="ai-message-content"><div class="markdown-body"></div></div>';
+  messages.append(user, container);
+  ask(question, container.querySelector(".markdown-body"));
+});
+</script>
+</body></html>
+"""
+
+PAGES = {"/": HOME_PAGE, "/login": LOGIN_PAGE, "/c": CHAT_PAGE}
+
+class StubChatHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive
+    # Set by make_server
+    answers = {}
+    ttft = 0.3
+    chars_per_sec = 400.0
+    chunk_chars = 40
+    error_rate = 0.0
+    jitter = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        page = PAGES.get(self.path.split("?", 1)[0])
+        if page is None:
+            self._send_json(404, {"error": "not found"})
+            return
+        body = page.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path.rstrip("/") != "/chat":
+            self._send_json(404, {"error": "not found"})
+            return
+        if random.random() < self.error_rate:
+            self._send_json(503, {"error": "simulated outage"})
+            return
+
+        question = request.get("question", "")
+        answer = self.answers.get(question, f"Echo: {question}")
+        # jitter spreads the time to first token uniformly by +/- that fraction
+        time.sleep(self.ttft * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+        if not request.get("stream", True):
+            time.sleep(len(answer) / self.chars_per_sec)
+            self._send_json(200, {"answer": answer})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for start in range(0, len(answer), self.chunk_chars):
+            piece = answer[start:start + self.chunk_chars]
+            self._write_chunk(f"data: {json.dumps({'delta': piece})}\n\n".encode("utf-8"))
+            time.sleep(len(piece) / self.chars_per_sec)
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients closing pooled keep-alive connections is expected, not an error
+        pass
+
+def make_server(port: int = 8765, ttft: float = 0.3, chars_per_sec: float = 400.0,
+                chunk_chars: int = 40, error_rate: float = 0.0, answers=None, jitter: float = 0.0) -> StubServer:
+    handler = type("ConfiguredStubChatHandler", (StubChatHandler,), {
+        "answers": load_answers() if answers is None else answers,
+        "ttft": ttft,
+        "chars_per_sec": chars_per_sec,
+        "chunk_chars": chunk_chars,
+        "error_rate": error_rate,
+        "jitter": jitter,
+    })
+    return StubServer(("127.0.0.1", port), handler)
+
+def start_in_background(**kwargs) -> StubServer:
+    """
+    Start a stub server on a daemon thread (for benchmarks); call .shutdown() when done.
+    """
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, name="stub-server", daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttft", type=float, default=0.3, help="seconds before the first chunk")
+    parser.add_argument("--chars-per-sec", type=float, default=400.0, help="streaming speed")
+    parser.add_argument("--chunk-chars", type=int, default=40)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--jitter", type=float, default=0.0, help="vary the time to first token by +/- this fraction")
+    parser.add_argument("--suites", nargs="+", help="suite files/globs whose gt_answers are served (default data/*.jsonl)")
+    args = parser.parse_args()
+
+    server = make_server(args.port, args.ttft, args.chars_per_sec, args.chunk_chars, args.error_rate,
+                         load_answers(args.suites), args.jitter)
+    print(f"Stub chat API on http://127.0.0.1:{args.port}/chat, web UI on http://127.0.0.1:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
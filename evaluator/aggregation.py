@@ -0,0 +1,353 @@
+# evaluator/aggregation.py
+import math
+from typing import Dict, Any, Iterable, List, Optional
+
+# ---------------------------
+# Latency sketch
+# ---------------------------
+class LatencyHistogram:
+    """
+    HDR-style histogram of millisecond values with bounded memory.
+
+    Values below 2**sub_bucket_bits are counted exactly; larger values keep their top
+    sub_bucket_bits bits, so any quantile is within 1 / 2**(sub_bucket_bits - 1) of the
+    true value (0.2% with the default 10 bits). Buckets only depend on the value,
+    so merging two histograms is exact: it equals one histogram of all their values.
+    """
+
+    def __init__(self, sub_bucket_bits: int = 10):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.min: Optional[int] = None
+        self.max: Optional[int] = None
+
+    def _bucket(self, value: int) -> int:
+        shift = value.bit_length() - self.sub_bucket_bits
+        if shift <= 0:
+            return value
+        return (shift << self.sub_bucket_bits) + (value >> shift)
+
+    def _bucket_value(self, bucket: int) -> int:
+        shift, mantissa = bucket >> self.sub_bucket_bits, bucket & ((1 << self.sub_bucket_bits) - 1)
+        if shift == 0:
+            return mantissa
+        # shift > 0 buckets start at 2**(bits-1); report the middle of the bucket's range
+        mantissa |= 1 << (self.sub_bucket_bits - 1)
+        return (mantissa << shift) + (1 << (shift - 1))
+
+    def record(self, value):
+        value = int(value + 0.5) if value > 0 else 0
+        bucket = self._bucket(value)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other: "LatencyHistogram"):
+        if other.sub_bucket_bits != self.sub_bucket_bits:
+            raise ValueError("Cannot merge histograms with different precision")
+        for bucket, n in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + n
+        self.count += other.count
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    def quantiles(self, qs: List[float]) -> List[Optional[int]]:
+        """
+        Nearest-rank quantiles (q in 0..1), clamped to the recorded min/max.
+        """
+        if not self.count:
+            return [None] * len(qs)
+        ranks = [max(1, math.ceil(q * self.count)) for q in qs]
+        results: List[Optional[int]] = [None] * len(qs)
+        order = sorted(range(len(qs)), key=lambda i: ranks[i])
+        seen, next_q = 0, 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            while next_q < len(order) and ranks[order[next_q]] <= seen:
+                value = self._bucket_value(bucket)
+                results[order[next_q]] = min(max(value, self.min), self.max)
+                next_q += 1
+            if next_q == len(order):
+                break
+        return results
+
+    def quantile(self, q: float) -> Optional[int]:
+        return self.quantiles([q])[0]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"sub_bucket_bits": self.sub_bucket_bits, "counts": {str(k): v for k, v in self.counts.items()},
+                "count": self.count, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LatencyHistogram":
+        histogram = cls(data["sub_bucket_bits"])
+        histogram.counts = {int(k): v for k, v in data["counts"].items()}
+        histogram.count, histogram.min, histogram.max = data["count"], data["min"], data["max"]
+        return histogram
+
+# ---------------------------
+# Running scores
+# ---------------------------
+class RunningMean:
+    """
+    Mean kept as an exact sum (Shewchuk partials, as in math.fsum), so merging
+    means from shards gives the same result in any order.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.partials: List[float] = []
+
+    def _add_exact(self, x: float):
+        partials = self.partials
+        i = 0
+        for y in partials:
+            if abs(x) < abs(y):
+                x, y = y, x
+            hi = x + y
+            lo = y - (hi - x)
+            if lo:
+                partials[i] = lo
+                i += 1
+            x = hi
+        partials[i:] = [x]
+
+    def add(self, value):
+        self.count += 1
+        self._add_exact(float(value))
+
+    def merge(self, other: "RunningMean"):
+        self.count += other.count
+        for partial in other.partials:
+            self._add_exact(partial)
+
+    @property
+    def mean(self) -> Optional[float]:
+        return math.fsum(self.partials) / self.count if self.count else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"count": self.count, "partials": list(self.partials)}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RunningMean":
+        running = cls()
+        running.count, running.partials = data["count"], list(data["partials"])
+        return running
+
+class GroupStats:
+    """
+    Running aggregates of one group of items (the whole run or one tag).
+    """
+    MEANS = ["correctness", "relevance", "chars_per_sec"]
+    SKETCHES = ["latency_ms", "ttft_ms"]
+    TIMINGS = {"chars_per_sec"}
+
+    def __init__(self):
+        self.n_items = 0
+        self.n_cached = 0
+        self.safety_violations = 0
+        self.means = {name: RunningMean() for name in self.MEANS}
+        self.sketches = {name: LatencyHistogram() for name in self.SKETCHES}
+
+    def add(self, result: Dict[str, Any]):
+        self.add_values(*self.values(result))
+
+    @classmethod
+    def values(cls, result: Dict[str, Any]):
+        """
+        Fields of one result in MEANS / SKETCHES order, extracted once for all its groups.
+        Answers reused from the answer cache keep their scores but add no timings.
+        """
+        cached = bool(result.get("cached"))
+        return (result.get("safety_violation_count", 0), cached,
+                [None if cached and name in cls.TIMINGS else result.get(name) for name in cls.MEANS],
+                [None if cached else result.get(name) for name in cls.SKETCHES])
+
+    def add_values(self, safety_violations: int, cached: bool, mean_values: List, sketch_values: List):
+        self.n_items += 1
+        self.n_cached += cached
+        self.safety_violations += safety_violations
+        # Streaming timings are only present for runs recorded with the event-driven watcher
+        for name, value in zip(self.MEANS, mean_values):
+            if value is not None:
+                self.means[name].add(value)
+        for name, value in zip(self.SKETCHES, sketch_values):
+            if value is not None:
+                self.sketches[name].record(value)
+
+    def merge(self, other: "GroupStats"):
+        self.n_items += other.n_items
+        self.n_cached += other.n_cached
+        self.safety_violations += other.safety_violations
+        for name in self.MEANS:
+            self.means[name].merge(other.means[name])
+        for name in self.SKETCHES:
+            self.sketches[name].merge(other.sketches[name])
+
+    def summary(self) -> Dict[str, Any]:
+        p50, p95, p99 = self.sketches["latency_ms"].quantiles([0.50, 0.95, 0.99])
+        ttft_p50, ttft_p95 = self.sketches["ttft_ms"].quantiles([0.50, 0.95])
+        return {
+            "n_items": self.n_items,
+            "cached_items": self.n_cached,
+            "correctness_avg": self.means["correctness"].mean or 0.0,
+            "relevance_avg": self.means["relevance"].mean or 0.0,
+            "safety_violations": self.safety_violations,
+            "p50_ms": p50,
+            "p95_ms": p95,
+            "p99_ms": p99,
+            "ttft_p50_ms": ttft_p50,
+            "ttft_p95_ms": ttft_p95,
+            "chars_per_sec_avg": self.means["chars_per_sec"].mean,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "n_items": self.n_items,
+            "n_cached": self.n_cached,
+            "safety_violations": self.safety_violations,
+            "means": {name: running.to_dict() for name, running in self.means.items()},
+            "sketches": {name: sketch.to_dict() for name, sketch in self.sketches.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "GroupStats":
+        stats = cls()
+        stats.n_items, stats.safety_violations = data["n_items"], data["safety_violations"]
+        stats.n_cached = data.get("n_cached", 0)
+        stats.means = {name: RunningMean.from_dict(d) for name, d in data["means"].items()}
+        stats.sketches = {name: LatencyHistogram.from_dict(d) for name, d in data["sketches"].items()}
+        return stats
+
+# ---------------------------
+# Run aggregator
+# ---------------------------
+# Conversation positions are grouped into buckets, so latency drift along a chat thread
+# shows up as p50/p95 rising from the first bucket to the last
+TURN_BUCKETS = [(1, "1"), (2, "2-5"), (6, "6-10"), (11, "11-20"), (21, "21-50"), (51, "51+")]
+
+def turn_bucket(turn: int) -> str:
+    label = TURN_BUCKETS[0][1]
+    for start, name in TURN_BUCKETS:
+        if turn >= start:
+            label = name
+    return label
+
+class StreamingAggregator:
+    """
+    Aggregates per-item results one at a time, overall, per tag and per conversation
+    turn bucket, in memory that does not grow with the number of items. Aggregators of
+    shards or workers merge exactly (merge() or to_dict()/from_dict() across processes).
+    """
+
+    def __init__(self):
+        self.overall = GroupStats()
+        self.by_tag: Dict[str, GroupStats] = {}
+        self.by_turn: Dict[str, GroupStats] = {}
+        # Items per outcome (ok / timeout / error) and items that needed more than one attempt
+        self.outcomes: Dict[str, int] = {}
+        self.retried_items = 0
+
+    def add(self, result: Dict[str, Any]):
+        outcome = result.get("outcome") or "ok"
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+        self.retried_items += (result.get("attempts") or 1) > 1
+        # An error or timeout has no real answer to score and its latency is the time we
+        # gave up, so it only shows in the outcome counts, not in scores or percentiles
+        if outcome != "ok":
+            return
+        values = GroupStats.values(result)
+        self.overall.add_values(*values)
+        for tag in result.get("tags") or []:
+            if tag not in self.by_tag:
+                self.by_tag[tag] = GroupStats()
+            self.by_tag[tag].add_values(*values)
+        # Only UI runs record a turn; API requests carry no conversation
+        if result.get("turn"):
+            bucket = turn_bucket(result["turn"])
+            if bucket not in self.by_turn:
+                self.by_turn[bucket] = GroupStats()
+            self.by_turn[bucket].add_values(*values)
+
+    def add_all(self, results: Iterable[Dict[str, Any]]) -> "StreamingAggregator":
+        for result in results:
+            self.add(result)
+        return self
+
+    def merge(self, other: "StreamingAggregator") -> "StreamingAggregator":
+        self.overall.merge(other.overall)
+        for tag, stats in other.by_tag.items():
+            if tag not in self.by_tag:
+                self.by_tag[tag] = GroupStats()
+            self.by_tag[tag].merge(stats)
+        for bucket, stats in other.by_turn.items():
+            if bucket not in self.by_turn:
+                self.by_turn[bucket] = GroupStats()
+            self.by_turn[bucket].merge(stats)
+        for outcome, n in other.outcomes.items():
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + n
+        self.retried_items += other.retried_items
+        return self
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Run aggregates (the keys of metrics.aggregate_metrics) plus outcome counts and
+        by_tag and by_turn breakdowns. n_items and everything else besides outcomes and
+        retried_items cover ok items only.
+        """
+        order = [name for _, name in TURN_BUCKETS]
+        return {
+            **self.overall.summary(),
+            "outcomes": dict(sorted(self.outcomes.items())),
+            "retried_items": self.retried_items,
+            "by_tag": {tag: stats.summary() for tag, stats in sorted(self.by_tag.items())},
+            "by_turn": {bucket: self.by_turn[bucket].summary() for bucket in order if bucket in self.by_turn},
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"overall": self.overall.to_dict(),
+                "by_tag": {tag: stats.to_dict() for tag, stats in self.by_tag.items()},
+                "by_turn": {bucket: stats.to_dict() for bucket, stats in self.by_turn.items()},
+                "outcomes": self.outcomes,
+                "retried_items": self.retried_items}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "StreamingAggregator":
+        aggregator = cls()
+        aggregator.overall = GroupStats.from_dict(data["overall"])
+        aggregator.by_tag = {tag: GroupStats.from_dict(d) for tag, d in data["by_tag"].items()}
+        aggregator.by_turn = {bucket: GroupStats.from_dict(d) for bucket, d in data.get("by_turn", {}).items()}
+        aggregator.outcomes = dict(data.get("outcomes", {}))
+        aggregator.retried_items = data.get("retried_items", 0)
+        return aggregator
+
+class LiveLatency:
+    """
+    Latency percentiles while answers are still arriving, printed every `every` answers.
+    label tells runs apart when several print at once (matrix runs).
+    """
+
+    def __init__(self, total: int, every: int = 25, label: str = None):
+        self.total = total
+        self.every = every
+        self.label = label
+        self.histogram = LatencyHistogram()
+
+    def record(self, latency_ms):
+        if latency_ms is None:
+            return
+        self.histogram.record(latency_ms)
+        n = self.histogram.count
+        if n % self.every == 0 or n == self.total:
+            print(self.status())
+
+    def status(self) -> str:
+        p50, p95, p99 = self.histogram.quantiles([0.50, 0.95, 0.99])
+        prefix = f"{self.label} " if self.label else ""
+        return f"{prefix}[{self.histogram.count}/{self.total}] latency p50={p50}ms p95={p95}ms p99={p99}ms"
@@ -0,0 +1,96 @@
+# evaluator/answer_cache.py
+"""
+Opt-in cache of model answers for deterministic configs (temperature 0).
+
+Entries are keyed by base_url, a fingerprint of the settings that shape the answer
+(backend, run settings, API endpoint) and the question. They expire after ttl_hours
+and are dropped as a group when the `deployment` tag in the config changes.
+"""
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+DEFAULT_PATH = Path(".cache") / "answers.sqlite"
+
+# Answer fields stored with each entry
+FIELDS = ["answer", "latency_ms", "ttft_ms", "generation_ms", "chars_per_sec"]
+
+def answer_fingerprint(config: Dict[str, Any]) -> str:
+    """
+    Short hash of the config settings that can change the model's answer.
+    """
+    spec = {
+        "backend": config.get("backend", "ui"),
+        "run": {k: v for k, v in config.get("run", {}).items() if k != "name"},
+        "api": {k: config.get("api", {}).get(k) for k in ("url", "answer_field")},
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+def question_hash(question: str) -> str:
+    return hashlib.sha256(question.encode("utf-8")).hexdigest()
+
+class AnswerCache:
+    def __init__(self, config: Dict[str, Any], path: Path = DEFAULT_PATH):
+        settings = config.get("answer_cache", {})
+        self.ttl_seconds = float(settings.get("ttl_hours", 24)) * 3600
+        self.deployment = str(settings.get("deployment", ""))
+        self.base_url = config["base_url"]
+        self.fingerprint = answer_fingerprint(config)
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Matrix runs write from the API thread; each cache is only used by one thread at a time
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "key TEXT PRIMARY KEY, base_url TEXT, fingerprint TEXT, deployment TEXT, "
+            "created_at REAL, value TEXT)"
+        )
+        # Entries of other deployments of this endpoint can never be hit again
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM answers WHERE base_url = ? AND fingerprint = ? AND deployment != ?",
+                (self.base_url, self.fingerprint, self.deployment),
+            )
+
+    def _key(self, question: str) -> str:
+        parts = [self.base_url, self.fingerprint, self.deployment, question_hash(question)]
+        return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, question: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(
+            "SELECT created_at, value FROM answers WHERE key = ?", (self._key(question),)
+        ).fetchone()
+        if row is None or time.time() - row[0] > self.ttl_seconds:
+            return None
+        return json.loads(row[1])
+
+    def put(self, question: str, result: Dict[str, Any]):
+        if not result.get("answer") or result.get("outcome", "ok") != "ok":
+            return  # never cache timeouts, failures or empty answers
+        value = json.dumps({field: result.get(field) for field in FIELDS}, ensure_ascii=False)
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?)",
+                (self._key(question), self.base_url, self.fingerprint, self.deployment, time.time(), value),
+            )
+
+    def close(self):
+        self.conn.close()
+
+def open_answer_cache(config: Dict[str, Any], enabled: Optional[bool] = None) -> Optional[AnswerCache]:
+    """
+    The cache for this config, or None when it is off. enabled overrides answer_cache.enabled.
+    Configs that sample (temperature > 0) never use it.
+    """
+    if enabled is None:
+        enabled = config.get("answer_cache", {}).get("enabled", False)
+    if not enabled:
+        return None
+    if config.get("run", {}).get("temperature", 0) > 0:
+        print("Answer cache skipped: config is not deterministic (temperature > 0)")
+        return None
+    return AnswerCache(config)
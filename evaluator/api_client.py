@@ -0,0 +1,164 @@
+# evaluator/api_client.py
+import asyncio
+import json
+import os
+import time
+from typing import Dict, Any, List
+
+from dotenv import load_dotenv
+
+from resilience import RetryPolicy, CircuitBreaker, OUTCOME_OK, OUTCOME_TIMEOUT, OUTCOME_ERROR
+import tracing
+
+# aiohttp is imported where it is used so UI-only runs never load it
+
+def _request_body(question: str, config: Dict[str, Any]) -> Dict[str, Any]:
+    run = config.get("run", {})
+    return {
+        "question": question,
+        "temperature": run.get("temperature"),
+        "max_tokens": run.get("max_tokens"),
+        "stream": config["api"].get("stream", True),
+    }
+
+def _extract_text(payload: str, answer_field: str) -> str:
+    """
+    Text of one response payload: a JSON object (answer_field or "delta") or plain text.
+    """
+    try:
+        data = json.loads(payload)
+    except ValueError:
+        return payload
+    if isinstance(data, dict):
+        return str(data.get(answer_field, data.get("delta", "")))
+    return str(data)
+
+def _parse_stream(body: str, answer_field: str) -> str:
+    """
+    Text of a streamed body: server-sent events ("data: ..." lines) or raw text chunks.
+    """
+    if "data:" not in body:
+        return body
+    parts = []
+    for line in body.splitlines():
+        if not line.startswith("data:"):
+            continue
+        payload = line[len("data:"):].strip()
+        if payload and payload != "[DONE]":
+            parts.append(_extract_text(payload, answer_field))
+    return "".join(parts)
+
+def _failed(outcome: str, attempts: int, error: str, latency_ms: int = None) -> Dict[str, Any]:
+    return {"answer": "", "latency_ms": latency_ms, "ttft_ms": None, "generation_ms": None, "chars_per_sec": None,
+            "attempts": attempts, "outcome": outcome, "error": error}
+
+async def _ask(session, semaphore, question: str, config: Dict[str, Any], headers: Dict[str, str],
+               policy: RetryPolicy, breaker: CircuitBreaker, item_id: str = None) -> Dict[str, Any]:
+    """
+    Send one question, retrying with jittered exponential backoff within the item's deadline.
+    Returns the answer plus timing and outcome in the same shape as the browser backend.
+    """
+    import aiohttp
+
+    answer_field = config["api"].get("answer_field", "answer")
+
+    queued = time.perf_counter()
+    async with semaphore:
+        tracing.add_span("api.queue", queued, time.perf_counter(), cat="api", track=item_id, item=item_id)
+        deadline = policy.deadline(time.time())
+        attempt = 0
+        while True:
+            attempt += 1
+            # While the breaker is open no new request is sent
+            while not breaker.allow():
+                await asyncio.sleep(0.5)
+            start = time.perf_counter()
+            first_chunk_at = None
+            chunks = []
+            timeout = aiohttp.ClientTimeout(total=policy.attempt_timeout_at(time.time(), deadline))
+            try:
+                async with session.post(config["api"]["url"], json=_request_body(question, config),
+                                        headers=headers, timeout=timeout) as resp:
+                    if resp.status == 429 or resp.status >= 500:
+                        raise aiohttp.ClientResponseError(resp.request_info, resp.history,
+                                                          status=resp.status, message=resp.reason or "")
+                    resp.raise_for_status()
+                    async for chunk in resp.content.iter_any():
+                        if first_chunk_at is None and chunk:
+                            first_chunk_at = time.perf_counter()
+                        chunks.append(chunk)
+                    end = time.perf_counter()
+                    is_json = resp.content_type == "application/json"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status = getattr(e, "status", None)
+                tracing.add_span("api.failed_attempt", start, time.perf_counter(), cat="api", track=item_id,
+                                 item=item_id, attempt=attempt, status=status)
+                timed_out = isinstance(e, asyncio.TimeoutError)
+                outcome = OUTCOME_TIMEOUT if timed_out else OUTCOME_ERROR
+                error = f"no answer within {timeout.total:.1f}s" if timed_out else f"{type(e).__name__}: {e}"
+                # Client errors other than 429 are about this request, not the site, and will not get better
+                if status is not None and status < 500 and status != 429:
+                    return _failed(outcome, attempt, error)
+                breaker.record_failure()
+                delay = policy.retry_delay(attempt, time.time(), deadline)
+                if delay is None:
+                    return _failed(outcome, attempt, error,
+                                   int((time.perf_counter() - start) * 1000) if timed_out else None)
+                await asyncio.sleep(delay)
+                continue
+
+            breaker.record_success()
+            body = b"".join(chunks).decode("utf-8", errors="replace")
+            if is_json:
+                answer = _extract_text(body, answer_field)
+            else:
+                answer = _parse_stream(body, answer_field)
+            answer = answer.strip()
+
+            first_chunk_at = first_chunk_at or end
+            tracing.add_span("api.ttft", start, first_chunk_at, cat="api", track=item_id, item=item_id)
+            tracing.add_span("api.generation", first_chunk_at, end, cat="api", track=item_id, item=item_id)
+            generation_ms = int((end - first_chunk_at) * 1000)
+            return {
+                "answer": answer,
+                "latency_ms": int((end - start) * 1000),
+                "ttft_ms": int((first_chunk_at - start) * 1000),
+                "generation_ms": generation_ms,
+                "chars_per_sec": round(len(answer) / (generation_ms / 1000), 1) if generation_ms > 0 else None,
+                "attempts": attempt,
+                "outcome": OUTCOME_OK,
+                "error": None,
+            }
+
+async def _ask_all(items: List[Dict[str, Any]], config: Dict[str, Any], on_answer, concurrency: int):
+    import aiohttp
+
+    load_dotenv()
+    headers = {}
+    token = os.getenv("NURAI_API_TOKEN")
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+
+    # Each attempt gets its own timeout: api.timeout_seconds, cut short by the item's deadline
+    policy = RetryPolicy.from_config(config, attempt_timeout=config["api"].get("timeout_seconds", 60))
+    breaker = CircuitBreaker.from_config(config)
+    # One pooled keep-alive connection per concurrent slot, reused across all items
+    connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=60)
+    semaphore = asyncio.Semaphore(concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        async def ask_one(index, item):
+            result = await _ask(session, semaphore, item["question"], config, headers, policy, breaker, item["id"])
+            on_answer(index, result)
+
+        await asyncio.gather(*(ask_one(index, item) for index, item in enumerate(items)))
+
+def collect_answers_api(items: List[Dict[str, Any]], config: Dict[str, Any], on_answer, concurrency: int = None):
+    """
+    HTTP counterpart of run_eval.collect_answers: ask every item through the chat API
+    with at most `concurrency` requests in flight, calling on_answer(index, result)
+    as soon as each item is finished. Retries, deadlines and the circuit breaker follow
+    the retry settings (see resilience.py).
+    """
+    if concurrency is None:
+        concurrency = config["api"].get("concurrency", 4)
+    asyncio.run(_ask_all(items, config, on_answer, max(1, concurrency)))
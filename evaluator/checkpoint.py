@@ -0,0 +1,165 @@
+# evaluator/checkpoint.py
+import json
+import os
+from pathlib import Path
+from typing import Dict, Any, Iterable, Iterator, List
+
+# ---------------------------
+# Paths
+# ---------------------------
+def checkpoint_dir(reports_dir: str) -> Path:
+    path = Path(reports_dir) / "checkpoints"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+def checkpoint_paths(reports_dir: str, run_id: str) -> Dict[str, Path]:
+    """
+    Files of one run's checkpoint:
+      meta     suite/config of the run, so --resume only needs the run id
+      answers  raw answers + timing, appended as soon as each answer arrives
+      scored   full per-item results, appended as each scoring batch finishes
+    """
+    base = checkpoint_dir(reports_dir)
+    return {
+        "meta": base / f"{run_id}.meta.json",
+        "answers": base / f"{run_id}.answers.jsonl",
+        "scored": base / f"{run_id}.scored.jsonl",
+    }
+
+def write_meta(path: Path, meta: Dict[str, Any]):
+    with open(path, "w") as f:
+        json.dump(meta, f, indent=2)
+
+def read_meta(path: Path) -> Dict[str, Any]:
+    if not path.exists():
+        raise FileNotFoundError(f"No checkpoint found at {path}")
+    with open(path, "r") as f:
+        return json.load(f)
+
+# ---------------------------
+# JSONL records
+# ---------------------------
+def append_record(path: Path, record: Dict[str, Any]):
+    """
+    Append one record and force it to disk, so a crash loses at most the item in flight.
+    """
+    append_records(path, [record])
+
+def append_records(path: Path, records: Iterable[Dict[str, Any]]):
+    """
+    Append a batch of records with a single fsync (e.g. a scored batch, which a crash
+    would only make us score again).
+    """
+    lines = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+    if not lines:
+        return
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(lines)
+        f.flush()
+        os.fsync(f.fileno())
+
+def iter_records(path: Path) -> Iterator[Dict[str, Any]]:
+    """
+    Stream records from a checkpoint. A torn last line (crash mid-write) is skipped.
+    """
+    if not path.exists():
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+def record_offsets(path: Path) -> Dict[str, int]:
+    """
+    Byte offset of each item id's record (the last one wins). Only ids are kept in memory.
+    """
+    offsets = {}
+    if not path.exists():
+        return offsets
+    with open(path, "rb") as f:
+        offset = 0
+        for line in f:
+            try:
+                offsets[json.loads(line)["id"]] = offset
+            except ValueError:
+                pass
+            offset += len(line)
+    return offsets
+
+def latest_values(path: Path, key: str, default: Any = None) -> Dict[str, Any]:
+    """
+    Value of key in each item id's last record (e.g. the outcome of its latest answer).
+    """
+    values = {}
+    for record in iter_records(path):
+        values[record["id"]] = record.get(key, default)
+    return values
+
+def iter_latest(path: Path) -> Iterator[Dict[str, Any]]:
+    """
+    Stream only the last record of each item id, in file order.
+    """
+    latest = set(record_offsets(path).values())
+    if not latest:
+        return
+    with open(path, "rb") as f:
+        offset = 0
+        for line in f:
+            if offset in latest:
+                yield json.loads(line)
+            offset += len(line)
+
+def iter_in_order(path: Path, ids: List[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Stream records in the given id order (e.g. suite order), seeking to each one.
+    Ids without a record are skipped.
+    """
+    offsets = record_offsets(path)
+    with open(path, "rb") as f:
+        for item_id in ids:
+            if item_id in offsets:
+                f.seek(offsets[item_id])
+                yield json.loads(f.readline())
+
+def write_json_array(records: Iterable[Dict[str, Any]], path: Path):
+    """
+    Stream records into a JSON array file, formatted exactly like json.dump(list, f, indent=2).
+    """
+    with open(path, "w") as f:
+        f.write("[")
+        first = True
+        for record in records:
+            f.write("\n" if first else ",\n")
+            f.write("\n".join("  " + line for line in json.dumps(record, indent=2).splitlines()))
+            first = False
+        f.write("\n]" if not first else "]")
+
+def iter_json_array(path: Path, chunk_size: int = 1 << 16) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the records of a JSON array file (e.g. a saved report) without loading it whole.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"{path} is not a JSON array")
+        buffer = buffer[1:]
+        while True:
+            buffer = buffer.lstrip()
+            if buffer.startswith(","):
+                buffer = buffer[1:].lstrip()
+            if buffer.startswith("]"):
+                return
+            try:
+                record, end = decoder.raw_decode(buffer)
+            except ValueError:
+                # Record continues past the buffer (or the file is truncated)
+                more = f.read(chunk_size)
+                if not more:
+                    raise ValueError(f"{path} ends in the middle of a record")
+                buffer += more
+                continue
+            yield record
+            buffer = buffer[end:]
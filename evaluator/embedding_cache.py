@@ -0,0 +1,140 @@
+# evaluator/embedding_cache.py
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import List, Dict, Optional
+
+import numpy as np
+from filelock import FileLock
+
+KEY_BYTES = 16
+
+def cache_key(model_name: str, text: str) -> bytes:
+    """
+    Content address of one embedding: hash of the model name and the text.
+    """
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).digest()[:KEY_BYTES]
+
+class EmbeddingCache:
+    """
+    Persistent, size-bounded embedding store.
+
+    Layout of the cache directory:
+      meta.json      dim and capacity
+      vectors.f32    memory-mapped float32 matrix (capacity x dim)
+      keys.bin       memory-mapped key per slot (all zeros = empty slot); this is the index
+      last_used.f64  memory-mapped last access time per slot, used for LRU eviction
+
+    Writers are serialized with a file lock. Readers never lock: a slot is read
+    seqlock-style (key, vector, key again) so a slot rewritten mid-read counts as a miss.
+    """
+
+    def __init__(self, cache_dir: str, dim: Optional[int], capacity: int = 50000):
+        """
+        Open (or create) the cache. With dim=None the stored dimension is used,
+        and FileNotFoundError is raised if the cache does not exist yet.
+        """
+        self.dir = Path(cache_dir)
+        meta_path = self.dir / "meta.json"
+        if dim is None and not meta_path.exists():
+            raise FileNotFoundError(f"No embedding cache at {self.dir}")
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._lock = FileLock(str(self.dir / "write.lock"))
+
+        with self._lock:
+            meta = json.loads(meta_path.read_text()) if meta_path.exists() else None
+            if meta is None or (dim is not None and meta["dim"] != dim):
+                meta = {"dim": dim, "capacity": capacity}
+                self._create_files(meta)
+                meta_path.write_text(json.dumps(meta))
+
+        self.dim = meta["dim"]
+        self.capacity = meta["capacity"]
+        self._vectors = np.memmap(self.dir / "vectors.f32", dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+        self._keys = np.memmap(self.dir / "keys.bin", dtype=np.uint8, mode="r+", shape=(self.capacity, KEY_BYTES))
+        self._last_used = np.memmap(self.dir / "last_used.f64", dtype=np.float64, mode="r+", shape=(self.capacity,))
+        self._slots: Dict[bytes, int] = {}
+        self._refresh_index()
+
+    def _create_files(self, meta):
+        capacity, dim = meta["capacity"], meta["dim"]
+        for name, size in (("vectors.f32", capacity * dim * 4),
+                           ("keys.bin", capacity * KEY_BYTES),
+                           ("last_used.f64", capacity * 8)):
+            with open(self.dir / name, "wb") as f:
+                f.truncate(size)
+
+    def _refresh_index(self):
+        """
+        Rebuild the key -> slot lookup from the keys file (picks up other processes' writes).
+        """
+        keys = np.asarray(self._keys)
+        filled = np.flatnonzero(keys.any(axis=1))
+        self._slots = {keys[slot].tobytes(): int(slot) for slot in filled}
+
+    def _read_slot(self, key: bytes, slot: int):
+        if self._keys[slot].tobytes() != key:
+            return None
+        vector = np.array(self._vectors[slot])
+        if self._keys[slot].tobytes() != key:
+            return None
+        return vector
+
+    def get_many(self, keys: List[bytes]) -> List:
+        """
+        Look up many keys at once. Returns a vector or None per key, in order.
+        """
+        if any(key not in self._slots for key in keys):
+            self._refresh_index()
+
+        now = time.time()
+        found = []
+        for key in keys:
+            slot = self._slots.get(key)
+            vector = self._read_slot(key, slot) if slot is not None else None
+            if vector is not None:
+                self._last_used[slot] = now
+            found.append(vector)
+        return found
+
+    def put_many(self, keys: List[bytes], vectors: np.ndarray):
+        """
+        Store vectors, evicting the least recently used slots once the cache is full.
+        """
+        if not keys:
+            return
+        with self._lock:
+            self._refresh_index()
+            new = [(key, vec) for key, vec in zip(keys, vectors) if key not in self._slots]
+            new = list(dict(new).items())[:self.capacity]
+            if not new:
+                return
+
+            # Empty slots first, then the least recently used ones
+            keys_arr = np.asarray(self._keys)
+            empty = np.flatnonzero(~keys_arr.any(axis=1))
+            if len(empty) >= len(new):
+                slots = empty[:len(new)]
+            else:
+                used = np.flatnonzero(keys_arr.any(axis=1))
+                lru = used[np.argsort(self._last_used[used], kind="stable")]
+                slots = np.concatenate([empty, lru[:len(new) - len(empty)]])
+
+            now = time.time()
+            for (key, vec), slot in zip(new, slots):
+                old_key = self._keys[slot].tobytes()
+                self._slots.pop(old_key, None)
+                # Invalidate the slot before rewriting it so concurrent readers see a miss
+                self._keys[slot] = 0
+                self._vectors[slot] = vec
+                self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+                self._last_used[slot] = now
+                self._slots[key] = int(slot)
+
+            self._vectors.flush()
+            self._keys.flush()
+            self._last_used.flush()
+
+    def __len__(self):
+        return len(self._slots)
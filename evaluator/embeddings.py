@@ -1,18 +1,224 @@
 # evaluator/embeddings.py
-from typing import List
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Any, List
 import numpy as np
-from sentence_transformers import SentenceTransformer
 
-# Load a lightweight, open-source embedding model once
+from embedding_cache import EmbeddingCache, cache_key
+import tracing
+
+# Lightweight, open-source embedding model, loaded on first use
 # You can swap this out for another model if needed
-_model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+_model = None
+_model_lock = threading.Lock()
+_onnx_models: Dict[tuple, Any] = {}
+
+# On-disk embedding caches, one per backend, shared across runs (set EMBEDDING_CACHE=0 to disable)
+_caches: Dict[str, EmbeddingCache] = {}
+
+# ---------------------------
+# Backends
+# ---------------------------
+# embeddings.backend in a config picks the encoder of MODEL_NAME:
+#   torch  sentence-transformers at full precision (the default)
+#   onnx   the model's int8-quantized ONNX export on ONNX Runtime, with a fixed thread
+#          count and length-bucketed batches
+BACKENDS = ("torch", "onnx")
+
+def embedding_settings(config: Dict[str, Any] = None) -> Dict[str, Any]:
+    settings = (config or {}).get("embeddings", {})
+    backend = settings.get("backend", "torch")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embeddings.backend {backend!r}; choose from {', '.join(BACKENDS)}")
+    return {
+        "backend": backend,
+        "onnx_file": settings.get("onnx_file", "onnx/model_quint8_avx2.onnx"),
+        "threads": settings.get("threads", 4),
+        "batch_tokens": settings.get("batch_tokens", 8192),
+        "max_length": settings.get("max_length", 256),
+    }
+
+def length_batches(lengths: List[int], batch_tokens: int) -> List[List[int]]:
+    """
+    Indices grouped into batches of similar length: sorted by length, each batch grows
+    until its padded size (longest x batch size) would exceed batch_tokens.
+    """
+    order = np.argsort(lengths, kind="stable")
+    batches, batch, longest = [], [], 0
+    for i in order:
+        longest_with = max(longest, lengths[i])
+        if batch and longest_with * (len(batch) + 1) > batch_tokens:
+            batches.append(batch)
+            batch, longest_with = [], lengths[i]
+        batch.append(int(i))
+        longest = longest_with
+    if batch:
+        batches.append(batch)
+    return batches
+
+class OnnxEncoder:
+    """
+    MODEL_NAME on ONNX Runtime: token embeddings from the ONNX graph, then the same mean
+    pooling and L2 normalization as the sentence-transformers pipeline. Texts are
+    tokenized once, sorted into length buckets and padded only to their batch's longest.
+    """
+
+    def __init__(self, onnx_file: str, threads: int = 4, batch_tokens: int = 8192, max_length: int = 256):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        path = Path(onnx_file)
+        if not path.exists():
+            # A file of the model's hub repo (the repo ships int8 exports under onnx/)
+            from huggingface_hub import hf_hub_download
+            path = Path(hf_hub_download(MODEL_NAME, onnx_file))
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+        self.dim = int(self.session.get_outputs()[0].shape[-1])
+        self.batch_tokens = batch_tokens
+        self.max_length = max_length
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        token_ids = self.tokenizer(texts, truncation=True, max_length=self.max_length)["input_ids"]
+        lengths = [len(ids) for ids in token_ids]
+        embeddings = np.empty((len(texts), self.dim), dtype=np.float32)
+        pad_id = self.tokenizer.pad_token_id or 0
+        for batch in length_batches(lengths, self.batch_tokens):
+            width = max(lengths[i] for i in batch)
+            input_ids = np.full((len(batch), width), pad_id, dtype=np.int64)
+            attention_mask = np.zeros((len(batch), width), dtype=np.int64)
+            for row, i in enumerate(batch):
+                input_ids[row, :lengths[i]] = token_ids[i]
+                attention_mask[row, :lengths[i]] = 1
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.zeros_like(input_ids)
+            with tracing.span("embeddings.onnx_run", cat="embeddings", n_texts=len(batch), width=width):
+                hidden = self.session.run(None, feeds)[0]
+            mask = attention_mask.astype(np.float32)
+            vectors = np.einsum("bsd,bs->bd", hidden, mask) / np.maximum(mask.sum(axis=1, keepdims=True), 1.0)
+            embeddings[batch] = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return embeddings
+
+def get_model(config: Dict[str, Any] = None):
+    """
+    Return the encoder of the configured backend, loading it on the first call.
+    """
+    global _model
+    settings = embedding_settings(config)
+    if settings["backend"] == "onnx":
+        key = (settings["onnx_file"], settings["threads"], settings["batch_tokens"], settings["max_length"])
+        if key not in _onnx_models:
+            with _model_lock:
+                if key not in _onnx_models:
+                    with tracing.span("embeddings.load_model", cat="embeddings", backend="onnx"):
+                        _onnx_models[key] = OnnxEncoder(*key)
+        return _onnx_models[key]
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                with tracing.span("embeddings.load_model", cat="embeddings"):
+                    from sentence_transformers import SentenceTransformer
+                    _model = SentenceTransformer(MODEL_NAME)
+    return _model
+
+def warm_up_model(config: Dict[str, Any] = None) -> threading.Thread:
+    """
+    Load the embedding model in a background thread (e.g. while the browser logs in).
+    """
+    thread = threading.Thread(target=get_model, args=(config,), name="embedding-warmup", daemon=True)
+    thread.start()
+    return thread
+
+def backend_label(config: Dict[str, Any] = None) -> str:
+    """
+    Name of the model as the configured backend runs it, e.g. for cache directories.
+    Includes the ONNX truncation length, which changes the vectors of long texts.
+    """
+    settings = embedding_settings(config)
+    name = MODEL_NAME.replace("/", "__")
+    if settings["backend"] == "onnx":
+        name += f"__{Path(settings['onnx_file']).stem}__len{settings['max_length']}"
+    return name
+
+def _get_cache(config: Dict[str, Any] = None):
+    if os.getenv("EMBEDDING_CACHE", "1") == "0":
+        return None
+    # Vectors of different backends differ slightly, so each has its own cache
+    label = backend_label(config)
+    if label not in _caches:
+        cache_dir = Path(os.getenv("EMBEDDING_CACHE_DIR", ".cache/embeddings")) / label
+        capacity = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "50000"))
+        try:
+            # An existing cache knows its dimension, so full cache hits never load the model
+            _caches[label] = EmbeddingCache(str(cache_dir), None, capacity)
+        except FileNotFoundError:
+            _caches[label] = EmbeddingCache(str(cache_dir), get_model(config).get_sentence_embedding_dimension(), capacity)
+    return _caches[label]
+
+def _encode(texts: List[str], batch_size: int, config: Dict[str, Any] = None) -> np.ndarray:
+    """
+    Encode texts in length-sorted batches to keep padding small,
+    then return them in the original order.
+    """
+    model = get_model(config)
+    if isinstance(model, OnnxEncoder):
+        # Bucketed by token length inside, in token-budget batches
+        with tracing.span("embeddings.encode", cat="embeddings", n_texts=len(texts)):
+            return model.encode(texts)
+    order = np.argsort([len(t) for t in texts], kind="stable")
+    with tracing.span("embeddings.encode", cat="embeddings", n_texts=len(texts)):
+        vectors = model.encode([texts[i] for i in order], batch_size=batch_size,
+                               convert_to_numpy=True, normalize_embeddings=True)
+    embeddings = np.empty_like(vectors, dtype=np.float32)
+    embeddings[order] = vectors
+    return embeddings
 
-def embed_texts(texts: List[str]) -> np.ndarray:
+def embed_texts(texts: List[str], batch_size: int = 64, config: Dict[str, Any] = None) -> np.ndarray:
     """
-    Generate embeddings for a list of texts.
+    Generate embeddings for a list of texts with the backend of config (torch by default).
+    Texts already in the on-disk cache skip the encoder; only misses are encoded.
     Returns a 2D numpy array (n_texts x dim).
     """
-    return np.array(_model.encode(texts, convert_to_numpy=True, normalize_embeddings=True))
+    cache = _get_cache(config)
+    dim = cache.dim if cache is not None else get_model(config).get_sentence_embedding_dimension()
+    if not texts:
+        return np.zeros((0, dim), dtype=np.float32)
+    if cache is None:
+        return _encode(texts, batch_size, config)
+
+    keys = [cache_key(MODEL_NAME, t) for t in texts]
+    with tracing.span("embeddings.cache_get", cat="embeddings", n_texts=len(keys)):
+        cached = cache.get_many(keys)
+    embeddings = np.zeros((len(texts), dim), dtype=np.float32)
+
+    missing = {}
+    for i, (text, vector) in enumerate(zip(texts, cached)):
+        if vector is not None:
+            embeddings[i] = vector
+        else:
+            missing.setdefault(text, []).append(i)
+
+    if missing:
+        miss_texts = list(missing)
+        vectors = _encode(miss_texts, batch_size, config)
+        for text, vector in zip(miss_texts, vectors):
+            embeddings[missing[text]] = vector
+        with tracing.span("embeddings.cache_put", cat="embeddings", n_texts=len(miss_texts)):
+            cache.put_many([cache_key(MODEL_NAME, t) for t in miss_texts], vectors)
+
+    return embeddings
 
 def cosine_similarity(vec1: np.ndarray, vec2: np.ndarray) -> float:
     """
@@ -20,13 +226,31 @@ def cosine_similarity(vec1: np.ndarray, vec2: np.ndarray) -> float:
     """
     return float(np.dot(vec1, vec2))
 
-def semantic_similarity(text1: str, text2: str) -> float:
+def semantic_similarity(text1: str, text2: str, config: Dict[str, Any] = None) -> float:
     """
     Convenience wrapper: embed two texts and return cosine similarity.
     """
-    embeddings = embed_texts([text1, text2])
+    embeddings = embed_texts([text1, text2], config=config)
     return cosine_similarity(embeddings[0], embeddings[1])
 
+def semantic_similarity_batch(texts_a: List[str], texts_b: List[str], batch_size: int = 64,
+                              config: Dict[str, Any] = None) -> np.ndarray:
+    """
+    Cosine similarity for many (text_a, text_b) pairs at once.
+    Every distinct text is embedded once, then all scores come from a single vectorized dot product.
+    Returns a 1D numpy array with one score per pair.
+    """
+    if len(texts_a) != len(texts_b):
+        raise ValueError("texts_a and texts_b must have the same length")
+
+    unique_texts = list(dict.fromkeys(list(texts_a) + list(texts_b)))
+    position = {text: i for i, text in enumerate(unique_texts)}
+    embeddings = embed_texts(unique_texts, batch_size=batch_size, config=config)
+
+    vecs_a = embeddings[[position[t] for t in texts_a]]
+    vecs_b = embeddings[[position[t] for t in texts_b]]
+    return np.einsum("ij,ij->i", vecs_a, vecs_b)
+
 def is_correct(model_answer: str, gt_answer: str, threshold: float = 0.78) -> bool:
     """
     Compare model answer to ground truth using semantic similarity.
@@ -0,0 +1,287 @@
+# evaluator/history.py
+"""
+Run history in a local SQLite database (reports/history.sqlite by default).
+
+run_suite ingests every finished run; existing reports can be imported in bulk.
+Runs, per-item results and item tags are indexed by run, config, suite, item id and tag,
+so trend and comparison queries no longer have to parse every report file.
+
+    python evaluator/history.py import                          # reports/*.json
+    python evaluator/history.py runs --config candidate --last 10
+    python evaluator/history.py trend q017 --config candidate --last 30
+    python evaluator/history.py failures candidate_1762383672
+"""
+import argparse
+import glob
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional
+
+from aggregation import StreamingAggregator
+from checkpoint import iter_json_array
+from suites import ItemLookup
+
+DEFAULT_PATH = Path("reports") / "history.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    config TEXT NOT NULL,
+    suite TEXT,
+    created_at REAL NOT NULL,
+    n_items INTEGER,
+    correctness_avg REAL,
+    relevance_avg REAL,
+    safety_violations INTEGER,
+    p50_ms INTEGER,
+    p95_ms INTEGER,
+    p99_ms INTEGER,
+    aggregates TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_by_config ON runs (config, created_at);
+CREATE INDEX IF NOT EXISTS runs_by_suite ON runs (suite, created_at);
+
+CREATE TABLE IF NOT EXISTS items (
+    run_id TEXT NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    item_id TEXT NOT NULL,
+    correctness REAL,
+    correct_pass INTEGER,
+    relevance REAL,
+    safety_flags TEXT,
+    safety_violation_count INTEGER,
+    latency_ms INTEGER,
+    ttft_ms INTEGER,
+    model_answer TEXT,
+    PRIMARY KEY (run_id, item_id)
+);
+CREATE INDEX IF NOT EXISTS items_by_item ON items (item_id, run_id);
+
+CREATE TABLE IF NOT EXISTS item_tags (
+    run_id TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (run_id, item_id, tag)
+);
+CREATE INDEX IF NOT EXISTS item_tags_by_tag ON item_tags (tag, run_id);
+"""
+
+# ---------------------------
+# Connection
+# ---------------------------
+def connect(path: Path = DEFAULT_PATH) -> sqlite3.Connection:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path))
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+def _created_at(run_id: str) -> float:
+    # Run ids end in the Unix time the run started ("prod_1762398456")
+    suffix = run_id.rsplit("_", 1)[-1]
+    return float(suffix) if suffix.isdigit() else time.time()
+
+# ---------------------------
+# Ingest
+# ---------------------------
+def ingest_run(conn: sqlite3.Connection, run_id: str, config_name: str, suite_name: Optional[str],
+               aggregates: Dict[str, Any], per_item_results: Iterable[Dict[str, Any]]):
+    """
+    Insert (or replace) one run and its per-item results in a single transaction.
+    per_item_results is consumed as a stream.
+    """
+    def item_rows():
+        for r in per_item_results:
+            yield (run_id, r["id"], r["correctness"], int(bool(r.get("correct_pass"))), r["relevance"],
+                   ",".join(r["safety_flags"]), r["safety_violation_count"], r["latency_ms"],
+                   r.get("ttft_ms"), r["model_answer"])
+            # Like the run aggregates, tag breakdowns and trends only cover ok items
+            if (r.get("outcome") or "ok") != "ok":
+                continue
+            for tag in r.get("tags") or []:
+                tag_rows.append((run_id, r["id"], tag))
+
+    tag_rows: List[tuple] = []
+    with conn:
+        conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+        conn.execute("DELETE FROM items WHERE run_id = ?", (run_id,))
+        conn.execute("DELETE FROM item_tags WHERE run_id = ?", (run_id,))
+        conn.execute(
+            "INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (run_id, config_name, suite_name, _created_at(run_id), aggregates["n_items"],
+             aggregates["correctness_avg"], aggregates["relevance_avg"], aggregates["safety_violations"],
+             aggregates["p50_ms"], aggregates["p95_ms"], aggregates.get("p99_ms"), json.dumps(aggregates)),
+        )
+        conn.executemany("INSERT INTO items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", item_rows())
+        conn.executemany("INSERT OR IGNORE INTO item_tags VALUES (?, ?, ?)", tag_rows)
+
+def ingest_report(conn: sqlite3.Connection, path: Path, suites: ItemLookup = None) -> Optional[str]:
+    """
+    Ingest one saved report file. Aggregates are recomputed from its items.
+    Returns the run id, or None for an empty report.
+    """
+    first = next(iter_json_array(path), None)
+    if first is None:
+        return None
+    # Old reports do not record their suite; find it from the item ids in data/
+    suites = suites if suites is not None else ItemLookup()
+    aggregates = StreamingAggregator().add_all(iter_json_array(path)).summary()
+    ingest_run(conn, first["run_id"], first["config"], suites.suite_of(first["id"]), aggregates, iter_json_array(path))
+    return first["run_id"]
+
+def import_reports(conn: sqlite3.Connection, patterns: List[str] = None, force: bool = False) -> List[str]:
+    """
+    Bulk import of saved reports (default reports/*.json). Runs already in the store
+    are skipped unless force is set.
+    """
+    patterns = patterns or ["reports/*.json"]
+    known = {row["run_id"] for row in conn.execute("SELECT run_id FROM runs")}
+    suites = ItemLookup()
+    imported = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            if not force and Path(path).stem in known:
+                continue
+            run_id = ingest_report(conn, Path(path), suites)
+            if run_id:
+                imported.append(run_id)
+    return imported
+
+# ---------------------------
+# Queries
+# ---------------------------
+def get_run(conn: sqlite3.Connection, run_id: str) -> Optional[Dict[str, Any]]:
+    row = conn.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+    if row is None:
+        return None
+    run = dict(row)
+    run["aggregates"] = json.loads(run["aggregates"])
+    return run
+
+def run_trend(conn: sqlite3.Connection, config: str = None, suite: str = None, last: int = 30) -> List[Dict[str, Any]]:
+    """
+    Run-level metrics of the last N runs (oldest first), optionally for one config and/or suite.
+    """
+    rows = conn.execute(
+        "SELECT run_id, config, suite, created_at, n_items, correctness_avg, relevance_avg, "
+        "safety_violations, p50_ms, p95_ms, p99_ms FROM runs "
+        "WHERE (?1 IS NULL OR config = ?1) AND (?2 IS NULL OR suite = ?2) "
+        "ORDER BY created_at DESC LIMIT ?3",
+        (config, suite, last),
+    ).fetchall()
+    return [dict(row) for row in reversed(rows)]
+
+def item_trend(conn: sqlite3.Connection, item_id: str, config: str = None, last: int = 30) -> List[Dict[str, Any]]:
+    """
+    One item's results across the last N runs (oldest first), e.g. correctness of q017 over candidate runs.
+    """
+    rows = conn.execute(
+        "SELECT r.run_id, r.config, r.created_at, i.correctness, i.correct_pass, i.relevance, "
+        "i.safety_flags, i.latency_ms FROM items i JOIN runs r ON r.run_id = i.run_id "
+        "WHERE i.item_id = ?1 AND (?2 IS NULL OR r.config = ?2) "
+        "ORDER BY r.created_at DESC LIMIT ?3",
+        (item_id, config, last),
+    ).fetchall()
+    return [dict(row) for row in reversed(rows)]
+
+def top_failures(conn: sqlite3.Connection, run_id: str, n: int = 10) -> List[Dict[str, Any]]:
+    """
+    Lowest-correctness items of a run.
+    """
+    rows = conn.execute(
+        "SELECT item_id AS id, correctness, relevance, safety_flags, latency_ms, model_answer "
+        "FROM items WHERE run_id = ? ORDER BY correctness ASC LIMIT ?",
+        (run_id, n),
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+def tag_breakdown(conn: sqlite3.Connection, run_id: str) -> List[Dict[str, Any]]:
+    """
+    Per-tag averages of a run.
+    """
+    rows = conn.execute(
+        "SELECT t.tag, COUNT(*) AS n_items, AVG(i.correctness) AS correctness_avg, "
+        "AVG(i.relevance) AS relevance_avg, SUM(i.safety_violation_count) AS safety_violations "
+        "FROM item_tags t JOIN items i ON i.run_id = t.run_id AND i.item_id = t.item_id "
+        "WHERE t.run_id = ? GROUP BY t.tag ORDER BY t.tag",
+        (run_id,),
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+def tag_trend(conn: sqlite3.Connection, tag: str, config: str = None, last: int = 30) -> List[Dict[str, Any]]:
+    """
+    Average correctness of one tag's items across the last N runs (oldest first).
+    """
+    rows = conn.execute(
+        "SELECT r.run_id, r.config, r.created_at, COUNT(*) AS n_items, AVG(i.correctness) AS correctness_avg "
+        "FROM item_tags t JOIN items i ON i.run_id = t.run_id AND i.item_id = t.item_id "
+        "JOIN runs r ON r.run_id = t.run_id "
+        "WHERE t.tag = ?1 AND (?2 IS NULL OR r.config = ?2) "
+        "GROUP BY r.run_id ORDER BY r.created_at DESC LIMIT ?3",
+        (tag, config, last),
+    ).fetchall()
+    return [dict(row) for row in reversed(rows)]
+
+# ---------------------------
+# CLI
+# ---------------------------
+def _print_rows(rows: List[Dict[str, Any]]):
+    if not rows:
+        print("(no rows)")
+        return
+    columns = list(rows[0])
+    print(" | ".join(columns))
+    for row in rows:
+        print(" | ".join(f"{v:.3f}" if isinstance(v, float) and c != "created_at" else str(v)
+                         for c, v in row.items()))
+
+def main():
+    parser = argparse.ArgumentParser(description="Query or fill the run-history store")
+    parser.add_argument("--db", default=str(DEFAULT_PATH))
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_cmd = commands.add_parser("import", help="bulk import saved reports")
+    import_cmd.add_argument("--reports", nargs="+", default=["reports/*.json"])
+    import_cmd.add_argument("--force", action="store_true", help="re-import runs already in the store")
+
+    runs_cmd = commands.add_parser("runs", help="run-level metrics over time")
+    runs_cmd.add_argument("--config")
+    runs_cmd.add_argument("--suite")
+    runs_cmd.add_argument("--last", type=int, default=30)
+
+    trend_cmd = commands.add_parser("trend", help="one item (or --tag) across runs")
+    trend_cmd.add_argument("item_id", nargs="?")
+    trend_cmd.add_argument("--tag")
+    trend_cmd.add_argument("--config")
+    trend_cmd.add_argument("--last", type=int, default=30)
+
+    failures_cmd = commands.add_parser("failures", help="lowest-correctness items of a run")
+    failures_cmd.add_argument("run_id")
+    failures_cmd.add_argument("-n", type=int, default=10)
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    if args.command == "import":
+        imported = import_reports(conn, args.reports, force=args.force)
+        print(f"Imported {len(imported)} run(s) into {args.db}")
+    elif args.command == "runs":
+        _print_rows(run_trend(conn, args.config, args.suite, args.last))
+    elif args.command == "trend":
+        if args.tag:
+            _print_rows(tag_trend(conn, args.tag, args.config, args.last))
+        elif args.item_id:
+            _print_rows(item_trend(conn, args.item_id, args.config, args.last))
+        else:
+            parser.error("trend needs an item id or --tag")
+    elif args.command == "failures":
+        rows = top_failures(conn, args.run_id, args.n)
+        for row in rows:
+            row["model_answer"] = row["model_answer"][:80].replace("\n", " ")
+        _print_rows(rows)
+
+if __name__ == "__main__":
+    main()
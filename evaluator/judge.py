@@ -0,0 +1,221 @@
+# evaluator/judge.py
+"""
+Local correctness judge: a sentence-transformers cross-encoder that reads the ground
+truth and the model answer together, run on CPU. Used by metrics.py when
+metrics.use_llm_judge is true, with settings from metrics.judge:
+
+    metrics:
+      use_llm_judge: true
+      judge:
+        model: "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+        threshold: 0.5         # judge score needed for correct_pass
+        max_length: 512        # tokens per (ground truth, answer) pair
+        batch_tokens: 8192     # padded tokens per forward pass
+        stride: 0.75           # step between answer chunks, as a share of the chunk length
+
+The model must have a single output (a score in 0..1 after its activation). Answers too
+long for one pair are split into overlapping chunks and the best chunk's score is kept.
+Pairs are sorted by token length and batched up to batch_tokens padded tokens, so short
+pairs go in large batches and long ones in small. Scores are cached in
+.cache/judge.sqlite by a hash of the model, window and both texts (set JUDGE_CACHE=0 to
+disable).
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+
+from embeddings import length_batches
+import tracing
+
+DEFAULT_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+DEFAULT_PATH = Path(".cache") / "judge.sqlite"
+
+_models: Dict[Tuple[str, int], Any] = {}
+_model_lock = threading.Lock()
+_cache = None
+
+def judge_settings(config: Dict[str, Any]) -> Dict[str, Any]:
+    settings = config["metrics"].get("judge", {})
+    return {
+        "model": settings.get("model", DEFAULT_MODEL),
+        "threshold": settings.get("threshold", 0.5),
+        "max_length": settings.get("max_length", 512),
+        "batch_tokens": settings.get("batch_tokens", 8192),
+        "stride": settings.get("stride", 0.75),
+    }
+
+def get_judge(model_name: str = DEFAULT_MODEL, max_length: int = 512):
+    """
+    Return the cross-encoder, loading it on CPU on the first call.
+    """
+    key = (model_name, max_length)
+    if key not in _models:
+        with _model_lock:
+            if key not in _models:
+                with tracing.span("judge.load_model", cat="judge"):
+                    from sentence_transformers import CrossEncoder
+                    model = CrossEncoder(model_name, device="cpu", max_length=max_length)
+                if model.num_labels != 1:
+                    raise ValueError(f"Judge model {model_name} has {model.num_labels} outputs; expected a single score")
+                _models[key] = model
+    return _models[key]
+
+def warm_up_judge(config: Dict[str, Any]) -> threading.Thread:
+    """
+    Load the judge model in a background thread (e.g. while the browser logs in).
+    """
+    settings = judge_settings(config)
+    thread = threading.Thread(target=get_judge, args=(settings["model"], settings["max_length"]),
+                              name="judge-warmup", daemon=True)
+    thread.start()
+    return thread
+
+# ---------------------------
+# Score cache
+# ---------------------------
+class JudgeCache:
+    """
+    Judge scores by content hash, in SQLite.
+    """
+
+    def __init__(self, path: Path = DEFAULT_PATH):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS scores (key TEXT PRIMARY KEY, score REAL)")
+        self.lock = threading.Lock()
+
+    def get_many(self, keys: List[str]) -> Dict[str, float]:
+        found = {}
+        with self.lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT key, score FROM scores WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def put_many(self, scores: Dict[str, float]):
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO scores (key, score) VALUES (?, ?)", scores.items())
+
+def _get_cache():
+    global _cache
+    if _cache is None and os.getenv("JUDGE_CACHE", "1") != "0":
+        _cache = JudgeCache(Path(os.getenv("JUDGE_CACHE_PATH", DEFAULT_PATH)))
+    return _cache
+
+def score_key(settings: Dict[str, Any], gt_answer: str, model_answer: str) -> str:
+    spec = "\x00".join([settings["model"], str(settings["max_length"]), str(settings["stride"]), gt_answer, model_answer])
+    return hashlib.sha256(spec.encode("utf-8")).hexdigest()
+
+# ---------------------------
+# Chunking and batching
+# ---------------------------
+def token_spans(tokenizer, texts: List[str]) -> List[List[Tuple[int, int]]]:
+    """
+    Character span of every token of each text (special tokens left out), from one
+    batched call of the fast tokenizer.
+    """
+    # Long answers are expected here (they get chunked), so no over-length warning
+    encoding = tokenizer(texts, add_special_tokens=False, return_offsets_mapping=True, truncation=False, verbose=False)
+    return [[tuple(span) for span in spans] for spans in encoding["offset_mapping"]]
+
+def chunk_pair(gt_answer: str, gt_spans, model_answer: str, answer_spans, max_length: int, special: int,
+               stride: float) -> List[Tuple[str, str, int]]:
+    """
+    (ground truth, answer chunk, n_tokens) pairs that each fit max_length tokens. The
+    ground truth keeps at most half the window; the answer is cut into overlapping
+    chunks on token boundaries.
+    """
+    gt_budget = (max_length - special) // 2
+    if len(gt_spans) > gt_budget:
+        gt_answer = gt_answer[:gt_spans[gt_budget - 1][1]]
+        gt_spans = gt_spans[:gt_budget]
+
+    window = max(1, max_length - special - len(gt_spans))
+    if len(answer_spans) <= window:
+        return [(gt_answer, model_answer, len(gt_spans) + len(answer_spans) + special)]
+
+    step = max(1, int(window * stride))
+    chunks = []
+    for start in range(0, len(answer_spans), step):
+        end = min(start + window, len(answer_spans))
+        text = model_answer[answer_spans[start][0]:answer_spans[end - 1][1]]
+        chunks.append((gt_answer, text, len(gt_spans) + end - start + special))
+        if end == len(answer_spans):
+            break
+    return chunks
+
+def chunk_pairs(tokenizer, gt_answers: List[str], model_answers: List[str], max_length: int,
+                stride: float) -> List[List[Tuple[str, str, int]]]:
+    """
+    chunk_pair for many pairs; every distinct text is tokenized once, in one batch.
+    """
+    texts = list(dict.fromkeys(list(gt_answers) + list(model_answers)))
+    spans = dict(zip(texts, token_spans(tokenizer, texts)))
+    special = tokenizer.num_special_tokens_to_add(pair=True)
+    return [chunk_pair(gt, spans[gt], answer, spans[answer], max_length, special, stride)
+            for gt, answer in zip(gt_answers, model_answers)]
+
+# ---------------------------
+# Scoring
+# ---------------------------
+@tracing.traced("judge.score", cat="judge")
+def judge_scores(gt_answers: List[str], model_answers: List[str], config: Dict[str, Any]) -> np.ndarray:
+    """
+    Judge score (0..1) of each (gt_answer, model_answer) pair. Cached pairs skip the model;
+    the rest are chunked, batched by length and scored, and each pair keeps its best chunk.
+    """
+    if len(gt_answers) != len(model_answers):
+        raise ValueError("gt_answers and model_answers must have the same length")
+    settings = judge_settings(config)
+    scores = np.zeros(len(model_answers), dtype=np.float32)
+    keys = [score_key(settings, gt, answer) for gt, answer in zip(gt_answers, model_answers)]
+
+    cache = _get_cache()
+    cached = cache.get_many(list(set(keys))) if cache is not None else {}
+    missing: Dict[str, List[int]] = {}
+    for i, key in enumerate(keys):
+        if key in cached:
+            scores[i] = cached[key]
+        elif not model_answers[i].strip():
+            scores[i] = 0.0  # nothing to judge (failed or empty answer)
+        else:
+            missing.setdefault(key, []).append(i)
+    if not missing:
+        return scores
+
+    model = get_judge(settings["model"], settings["max_length"])
+    pairs, owners, lengths = [], [], []
+    with tracing.span("judge.chunk", cat="judge", n_pairs=len(missing)):
+        firsts = [positions[0] for positions in missing.values()]
+        chunked = chunk_pairs(model.tokenizer, [gt_answers[i] for i in firsts], [model_answers[i] for i in firsts],
+                              settings["max_length"], settings["stride"])
+        for n, chunks in enumerate(chunked):
+            for gt, chunk, n_tokens in chunks:
+                pairs.append((gt, chunk))
+                owners.append(n)
+                lengths.append(n_tokens)
+
+    chunk_scores = np.zeros(len(pairs), dtype=np.float32)
+    for batch in length_batches(lengths, settings["batch_tokens"]):
+        with tracing.span("judge.predict", cat="judge", n_pairs=len(batch), max_tokens=max(lengths[i] for i in batch)):
+            chunk_scores[batch] = model.predict([pairs[i] for i in batch], batch_size=len(batch),
+                                                show_progress_bar=False, convert_to_numpy=True)
+
+    best = np.full(len(missing), -np.inf, dtype=np.float32)
+    np.maximum.at(best, np.asarray(owners), chunk_scores)
+    new_scores = {}
+    for (key, positions), score in zip(missing.items(), best):
+        scores[positions] = score
+        new_scores[key] = float(score)
+    if cache is not None:
+        cache.put_many(new_scores)
+    return scores
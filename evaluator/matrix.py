@@ -0,0 +1,289 @@
+# evaluator/matrix.py
+"""
+Run several suites against several configs in one go, with one browser and one loaded
+embedding model shared by every (suite, config) cell:
+
+    python evaluator/matrix.py --suites core adversarial bias --configs prod candidate --workers 2
+
+Each cell is a normal run with its own run id, checkpoint, report and history entry.
+UI configs get their own browser contexts (own session and settings) in the shared
+browser, and all of their items go through one polling loop; API configs are asked
+from their own threads at the same time. Cells start longest-first (expected time
+from the history store), so a big cell never runs alone at the end.
+
+When every cell is in, a comparison table is printed and saved to
+reports/matrix/matrix_<timestamp>.json (outside the reports/*.json that history.py
+import and rescore.py read), and all cells are uploaded to Sheets in one batch.
+A matrix aborted by the circuit breaker is finished cell by cell with run_eval.py --resume.
+"""
+import argparse
+import itertools
+import json
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, List
+
+from run_eval import (available_configs, load_config, prepare_run, finish_run, answer_group,
+                      collect_answer_groups, open_worker_pool, answered_ids)
+from api_client import collect_answers_api
+from nurai_client import launch_browser
+from resilience import CircuitOpenError
+from suites import suite_label, SuiteItems
+from checkpoint import iter_in_order
+from embeddings import warm_up_model, backend_label
+from judge import warm_up_judge
+from sheets_client import upload_runs_in_background, wait_for_uploads
+import history
+import tracing
+
+# Expected seconds per item for a cell with no history
+DEFAULT_SECONDS_PER_ITEM = 10.0
+
+# ---------------------------
+# Planning
+# ---------------------------
+def seconds_per_item(conn, config_name: str, suite: str) -> float:
+    """
+    p50 latency of the last run of this cell, else of this config on any suite, else the default.
+    """
+    for suite_filter in (suite, None):
+        runs = history.run_trend(conn, config=config_name, suite=suite_filter, last=1)
+        if runs and runs[-1]["p50_ms"]:
+            return runs[-1]["p50_ms"] / 1000
+    return DEFAULT_SECONDS_PER_ITEM
+
+def plan_cells(suites: List[str], config_names: List[str], workers: int = 1, answer_cache: bool = None,
+               filters: dict = None) -> List[Dict[str, Any]]:
+    """
+    Prepare a run for every (suite, config) cell and order them longest-first by
+    pending items x expected seconds per item.
+    """
+    stamp = int(time.time())
+    cells = []
+    for config_name, suite in itertools.product(config_names, suites):
+        # Run ids end in the start time like any run (the history store reads it) and name
+        # the cell, so they never collide with each other or with a plain <config>_<time> run.
+        # prepare_run refuses an id that already has a checkpoint (two matrices in one second)
+        cell = re.sub(r"[^A-Za-z0-9]+", "-", suite_label(suite)).strip("-")
+        run = prepare_run(suite, config_name, answer_cache=answer_cache, run_id=f"{config_name}-{cell}_{stamp}",
+                          filters=filters, label=f"{config_name}/{suite_label(suite)}")
+        conn = history.connect(Path(run["reports_dir"]) / history.DEFAULT_PATH.name)
+        per_item = seconds_per_item(conn, config_name, suite_label(suite))
+        conn.close()
+        concurrency = workers
+        if run["config"].get("backend", "ui") == "api" and workers <= 1:
+            concurrency = run["config"]["api"].get("concurrency", 4)
+        run["estimate_seconds"] = len(run["pending"]) * per_item / max(1, concurrency)
+        cells.append(run)
+    cells.sort(key=lambda run: run["estimate_seconds"], reverse=True)
+    return cells
+
+def print_plan(cells: List[Dict[str, Any]]):
+    print("cell | run_id | backend | pending | est_s")
+    for run in cells:
+        print(f"{run['config_name']}/{suite_label(run['suite'])} | {run['run_id']} | "
+              f"{run['config'].get('backend', 'ui')} | {len(run['pending'])} | {run['estimate_seconds']:.0f}")
+
+# ---------------------------
+# Answering
+# ---------------------------
+def _by_config(cells: List[Dict[str, Any]], backend: str) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Cells with pending items on this backend, grouped by config (cell order kept).
+    """
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for run in cells:
+        if run["pending"] and run["config"].get("backend", "ui") == backend:
+            groups.setdefault(run["config_name"], []).append(run)
+    return groups
+
+def _chained(runs: List[Dict[str, Any]]):
+    """
+    The pending items of several runs as one SuiteItems, with an on_answer that hands each
+    answer to the run it belongs to.
+    """
+    entries, owners = [], []
+    for run in runs:
+        entries.extend(run["pending"].entries)
+        owners.extend((run, index) for index in range(len(run["pending"])))
+
+    def on_answer(index, result):
+        run, local_index = owners[index]
+        run["on_answer"](local_index, result)
+    return SuiteItems(entries), on_answer
+
+def _collect_api(runs: List[Dict[str, Any]], workers: int, errors: List[Exception]):
+    try:
+        for run in runs:
+            with tracing.span("run.collect_answers", cat="run", n_items=len(run["pending"]), cell=run["run_id"]):
+                collect_answers_api(run["pending"], run["config"], run["on_answer"],
+                                    concurrency=workers if workers > 1 else None)
+            run["answered_at"] = time.time()
+    except Exception as e:
+        errors.append(e)
+
+def collect_matrix_answers(cells: List[Dict[str, Any]], workers: int = 1, headless: bool = None):
+    """
+    Answer every cell's pending items: API configs on one thread each, UI configs in one
+    shared browser with workers contexts per config, all driven by one polling loop.
+    """
+    errors: List[Exception] = []
+    threads = [threading.Thread(target=_collect_api, args=(runs, workers, errors), name=f"api-{config_name}")
+               for config_name, runs in _by_config(cells, "api").items()]
+    for thread in threads:
+        thread.start()
+    try:
+        ui_configs = _by_config(cells, "ui")
+        if ui_configs:
+            from playwright.sync_api import sync_playwright
+            with sync_playwright() as p:
+                first = ui_configs[next(iter(ui_configs))][0]["config"]
+                browser = launch_browser(p, first, headless)
+                pool = []
+                for config_name, runs in ui_configs.items():
+                    items, on_answer = _chained(runs)
+                    config = runs[0]["config"]
+                    group = answer_group(items, config, on_answer)
+                    workers_of_config = open_worker_pool(browser, config, min(workers, len(items)), first_id=len(pool))
+                    for worker in workers_of_config:
+                        worker["group"] = group
+                    pool.extend(workers_of_config)
+                with tracing.span("run.collect_answers", cat="run", n_workers=len(pool)):
+                    collect_answer_groups(pool)
+                browser.close()
+            for runs in ui_configs.values():
+                for run in runs:
+                    run["answered_at"] = time.time()
+    finally:
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+
+# ---------------------------
+# Comparison
+# ---------------------------
+def comparison_rows(cells: List[Dict[str, Any]], config_names: List[str]) -> List[Dict[str, Any]]:
+    """
+    One row per cell, in suite then config order, with the correctness and p50 change
+    against the first config on the same suite.
+    """
+    baseline = {}
+    rows = []
+    for run in sorted(cells, key=lambda r: (suite_label(r["suite"]), config_names.index(r["config_name"]))):
+        a = run["aggregates"]
+        suite = suite_label(run["suite"])
+        row = {
+            "suite": suite,
+            "config": run["config_name"],
+            "run_id": run["run_id"],
+            "n_items": a["n_items"],
+            "correctness_avg": a["correctness_avg"],
+            "relevance_avg": a["relevance_avg"],
+            "safety_violations": a["safety_violations"],
+            "p50_ms": a["p50_ms"],
+            "p95_ms": a["p95_ms"],
+            "not_ok": sum(n for outcome, n in a.get("outcomes", {}).items() if outcome != "ok"),
+        }
+        base = baseline.setdefault(suite, row)
+        row["correctness_delta"] = row["correctness_avg"] - base["correctness_avg"]
+        row["p50_delta_ms"] = (row["p50_ms"] - base["p50_ms"]
+                               if row["p50_ms"] is not None and base["p50_ms"] is not None else None)
+        rows.append(row)
+    return rows
+
+def print_comparison(rows: List[Dict[str, Any]]):
+    print("suite | config | n_items | correctness | Δ | relevance | safety | p50_ms | Δ | p95_ms | not_ok")
+    for r in rows:
+        p50_delta = "-" if r["p50_delta_ms"] is None else f"{r['p50_delta_ms']:+.0f}"
+        print(f"{r['suite']} | {r['config']} | {r['n_items']} | {r['correctness_avg']:.3f} | "
+              f"{r['correctness_delta']:+.3f} | {r['relevance_avg']:.3f} | {r['safety_violations']} | "
+              f"{r['p50_ms']} | {p50_delta} | {r['p95_ms']} | {r['not_ok']}")
+
+# ---------------------------
+# Entry point
+# ---------------------------
+def run_matrix(suites: List[str], config_names: List[str], workers: int = 1, headless: bool = None,
+               answer_cache: bool = None, filters: dict = None, upload: bool = True,
+               reports_dir: str = "./reports") -> List[Dict[str, Any]]:
+    """
+    Run every suite against every config; returns the comparison rows.
+    """
+    started_at = time.time()
+    cells = plan_cells(suites, config_names, workers, answer_cache, filters)
+
+    # Load the embedding models (one per backend) and judges in the background while the browser logs in
+    for run in {backend_label(run["config"]): run for run in cells}.values():
+        warm_up_model(run["config"])
+    for run in {run["config_name"]: run for run in cells}.values():
+        if run["config"]["metrics"].get("use_llm_judge", False):
+            warm_up_judge(run["config"])
+    print_plan(cells)
+    try:
+        collect_matrix_answers(cells, workers, headless)
+    except CircuitOpenError as e:
+        # Everything answered so far is in the cells' checkpoints
+        print(f"Matrix aborted: {e}. Finish the unfinished cells later with:")
+        for run in cells:
+            if len(answered_ids(run["paths"]) & {entry.id for entry in run["entries"]}) < len(run["entries"]):
+                print(f"  python evaluator/run_eval.py --resume {run['checkpoint_id']}")
+        raise SystemExit(1)
+
+    # Score cell by cell with the one loaded model; Sheets gets every cell in one batch below
+    for run in cells:
+        run["aggregates"] = finish_run(run, upload=False)
+
+    rows = comparison_rows(cells, config_names)
+    print_comparison(rows)
+    path = Path(reports_dir) / "matrix" / f"matrix_{int(started_at)}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"suites": suites, "configs": config_names, "workers": workers, "started_at": started_at,
+                   "finished_at": time.time(), "cells": rows}, f, indent=2)
+    print(f"Comparison written to {path}")
+
+    uploads = [run for run in cells if run["config"]["reports"].get("upload_to_sheets", True)]
+    if upload and uploads:
+        upload_runs_in_background([
+            (run["run_id"], run["config_name"], suite_label(run["suite"]), run["aggregates"],
+             iter_in_order(run["paths"]["scored"], [entry.id for entry in run["entries"]]))
+            for run in uploads
+        ], load_config("sheets"))
+        wait_for_uploads()
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a suite x config matrix with one browser and one model")
+    parser.add_argument("--suites", nargs="+", required=True, help="suite names, JSONL files or globs")
+    parser.add_argument("--configs", nargs="+", required=True, choices=available_configs(),
+                        help="configs to compare; the first is the baseline of the Δ columns")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="browser contexts per UI config, or in-flight requests per API config")
+    parser.add_argument("--sample", type=int, help="random sample of N items of each suite")
+    parser.add_argument("--seed", type=int, default=0, help="seed for --sample")
+    parser.add_argument("--answer-cache", action=argparse.BooleanOptionalAction, default=None,
+                        help="reuse cached answers of deterministic configs (default: answer_cache.enabled)")
+    parser.add_argument("--headless", action=argparse.BooleanOptionalAction, default=None,
+                        help="run the browser headless (default: browser.headless of the first UI config)")
+    parser.add_argument("--no-upload", action="store_true", help="skip the Sheets upload")
+    parser.add_argument("--reports-dir", default="./reports", help="the comparison JSON goes to its matrix/ subdirectory")
+    parser.add_argument("--trace", metavar="PATH", help="record per-phase spans and write a Chrome trace to PATH")
+    args = parser.parse_args()
+
+    if args.trace:
+        tracing.enable()
+    try:
+        run_matrix(args.suites, args.configs, workers=args.workers, headless=args.headless,
+                   answer_cache=args.answer_cache, filters={"sample": args.sample, "seed": args.seed},
+                   upload=not args.no_upload, reports_dir=args.reports_dir)
+    except FileExistsError as e:
+        parser.error(str(e))
+    if args.trace:
+        tracing.export_chrome_trace(args.trace)
+        tracing.print_phase_summary()
+        print(f"Trace written to {args.trace}")
+
+if __name__ == "__main__":
+    main()
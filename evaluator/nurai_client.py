@@ -1,16 +1,30 @@
 # nurai_client.py
+from __future__ import annotations
+
+import hashlib
+import json
 import os
 import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+
 import yaml
 from dotenv import load_dotenv
-from playwright.sync_api import sync_playwright, TimeoutError, Page, Frame
-from bs4 import BeautifulSoup
+
+import tracing
+
+# Playwright and BeautifulSoup are imported where they are used, so importing
+# this module (e.g. from run_eval --help) stays cheap
+if TYPE_CHECKING:
+    from playwright.sync_api import Page
 
 def load_config(path: str):
     with open(path, "r") as f:
         return yaml.safe_load(f)
 
 def goto_from_home(context, config):
+    from playwright.sync_api import TimeoutError
+
     base_url = config["base_url"]
     selectors = config["selectors"]
     timeout = config.get("timeout", 5000)
@@ -27,6 +41,8 @@ def goto_from_home(context, config):
         page.click(start_chat_locator, timeout=5000)
     new_page = new_page_info.value
     new_page.wait_for_load_state("domcontentloaded")
+    # The landing page is not needed once the chat tab is open
+    page.close()
 
     # Try login page
     try:
@@ -67,14 +83,105 @@ def login_if_needed(page, config):
 
     page.locator(selectors["submit_button"]["locator"]).click()
 
-    # Wait a bit for redirect
-    time.sleep(config["delays"]["after_login"])
-
-    # Verify chat input appears
+    # The redirect is done once the chat input appears
     chat_input = page.locator(config["selectors"]["chat_page"]["prompt_input"]["locator"])
     chat_input.wait_for(state="visible", timeout=timeout)
     return {"page": page, "state": "chat"}
 
+# ---------------------------
+# Browser setup and session reuse
+# ---------------------------
+# The logged-in storage_state (cookies, local storage) is saved per site and user, so
+# later runs open the chat page directly instead of going through home page and login.
+SESSION_DIR = Path(".cache") / "sessions"
+
+def launch_browser(playwright, config, headless: bool = None):
+    """
+    Launch Chromium; headless comes from browser.headless unless given.
+    """
+    if headless is None:
+        headless = config.get("browser", {}).get("headless", False)
+    return playwright.chromium.launch(headless=headless)
+
+def session_path(config) -> Path:
+    load_dotenv()
+    key = f"{config['base_url']}\x00{os.getenv('LOGIN_USER', '')}"
+    return SESSION_DIR / f"{hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]}.json"
+
+def load_session(config):
+    """
+    The saved session of this site and user, or None if there is none, it is too old
+    (browser.session_max_age_hours) or reuse is off (browser.reuse_session).
+    """
+    settings = config.get("browser", {})
+    if not settings.get("reuse_session", True):
+        return None
+    try:
+        with open(session_path(config), "r", encoding="utf-8") as f:
+            session = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - session.get("saved_at", 0) > settings.get("session_max_age_hours", 12) * 3600:
+        return None
+    return session
+
+def save_session(context, page, config):
+    if not config.get("browser", {}).get("reuse_session", True):
+        return
+    path = session_path(config)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    # Holds login cookies: readable by the owner only
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({"saved_at": time.time(), "chat_url": page.url, "storage_state": context.storage_state()}, f)
+    tmp_path.replace(path)
+
+def new_chat_context(browser, config):
+    """
+    A browser context for one worker, restored from the saved session if there is one,
+    with browser.block_urls (images, fonts, analytics) aborted before they are fetched.
+    Returns (context, session).
+    """
+    session = load_session(config)
+    context = browser.new_context(storage_state=session["storage_state"] if session else None)
+    for pattern in config.get("browser", {}).get("block_urls", []):
+        context.route(pattern, lambda route: route.abort())
+    return context, session
+
+def _open_saved_chat(context, config, session):
+    """
+    Go straight to the chat page of a saved session. Returns None if the session no
+    longer lands on the chat page (expired or logged out).
+    """
+    from playwright.sync_api import TimeoutError
+
+    page = context.new_page()
+    page.goto(session["chat_url"], wait_until="domcontentloaded")
+    try:
+        page.locator(config["selectors"]["chat_page"]["prompt_input"]["locator"]).wait_for(
+            state="visible", timeout=config.get("browser", {}).get("session_check_ms", 5000)
+        )
+        return page
+    except TimeoutError:
+        page.close()
+        return None
+
+def open_chat_page(context, config, session=None):
+    """
+    Open a logged-in chat page for this context: directly from the saved session while
+    it is valid, otherwise from the home page through the login form, saving the new session.
+    """
+    page = _open_saved_chat(context, config, session) if session else None
+    if page is None:
+        result = goto_from_home(context, config)
+        if result["state"] == "login":
+            result = login_if_needed(result["page"], config)
+        page = result["page"]
+        save_session(context, page, config)
+    install_answer_watcher(page, config)
+    return page
+
 def take_snapshot(page: Page, file_name: str, full_page: bool = True):
     """
     Save a snapshot (screenshot) of the current page.
@@ -88,6 +195,8 @@ def take_snapshot(page: Page, file_name: str, full_page: bool = True):
     print(f"Snapshot saved as {file_name}")
 
 def extract_page_source(url: str, output_file: str = "page_source.html"):
+    from playwright.sync_api import sync_playwright
+
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=True)
         page = browser.new_page()
@@ -105,6 +214,8 @@ def extract_selectors_from_current_page(page: Page, output_file: str = "current_
     Extracts selector-relevant attributes from the current page source.
     Dumps results into a human-readable .txt file.
     """
+    from bs4 import BeautifulSoup
+
     html = page.content()
     soup = BeautifulSoup(html, "html.parser")
     elements = soup.find_all(True)  # all tags
@@ -169,6 +280,250 @@ def wait_for_latest_answer(page: Page, timeout: int = 60, poll_interval: float =
 
     return current
 
+# ---------------------------
+# Event-driven answer watching
+# ---------------------------
+# A MutationObserver in the page follows the newest answer and pushes events to
+# Python through an exposed binding. All timestamps are taken in the page
+# (performance.now()), so they measure the model and not the harness.
+WATCH_SCRIPT = """
+({baseline, quietMs}) => {
+  const prev = window.__nuraiWatch;
+  if (prev) { prev.observer.disconnect(); clearTimeout(prev.timer); }
+
+  const w = {submittedAt: performance.now(), firstTokenAt: null, lastChangeAt: null,
+             text: "", done: false, timer: null, box: null};
+  window.__nuraiWatch = w;
+
+  // The answer box is looked up once, not on every mutation, so long chats stay cheap to watch
+  const latestText = () => {
+    if (!w.box || !w.box.isConnected) {
+      const containers = document.querySelectorAll("div.ai-message-container");
+      if (containers.length <= baseline) return null;
+      w.box = containers[containers.length - 1].querySelector("div.ai-message-content div.markdown-body");
+      if (!w.box) return null;
+    }
+    return w.box.innerText.trim();
+  };
+  w.state = () => ({text: w.text, submittedAt: w.submittedAt,
+                    firstTokenAt: w.firstTokenAt, lastChangeAt: w.lastChangeAt});
+  w.finish = () => {
+    if (w.done) return w.state();
+    w.done = true;
+    w.observer.disconnect();
+    clearTimeout(w.timer);
+    window.__nuraiAnswerEvent({type: "done", ...w.state()});
+    return w.state();
+  };
+  // The quiet timer is only a fallback: once the answer's stream request is known,
+  // a pause in the stream must not end the answer
+  w.holdQuiet = () => { w.quietHeld = true; clearTimeout(w.timer); };
+  // Network stream ended: give the last chunk a moment to render, then finish
+  w.settle = () => { w.holdQuiet(); w.timer = setTimeout(w.finish, 150); };
+
+  w.observer = new MutationObserver(() => {
+    const text = latestText();
+    if (text === null || text === w.text) return;
+    const now = performance.now();
+    if (w.firstTokenAt === null) {
+      w.firstTokenAt = now;
+      window.__nuraiAnswerEvent({type: "first_token", ttftMs: now - w.submittedAt});
+    }
+    w.text = text;
+    w.lastChangeAt = now;
+    if (!w.quietHeld) {
+      clearTimeout(w.timer);
+      w.timer = setTimeout(w.finish, quietMs);
+    }
+  });
+  w.observer.observe(document.body, {childList: true, subtree: true, characterData: true});
+}
+"""
+
+# Watch dict of the prompt currently in flight, per page
+_active_watches = {}
+
+def _finish_watch(watch, state):
+    """
+    Fill timing fields of a watch from the page-side state.
+    """
+    watch["answer"] = state["text"]
+    if state["firstTokenAt"] is not None:
+        watch["ttft_ms"] = int(state["firstTokenAt"] - state["submittedAt"])
+        watch["latency_ms"] = int(state["lastChangeAt"] - state["submittedAt"])
+        watch["generation_ms"] = int(state["lastChangeAt"] - state["firstTokenAt"])
+        if watch["generation_ms"] > 0:
+            watch["chars_per_sec"] = round(len(state["text"]) / (watch["generation_ms"] / 1000), 1)
+    else:
+        watch["latency_ms"] = int((time.time() - watch["start_time"]) * 1000)
+    watch["done"] = True
+
+def _on_answer_event(source, event):
+    watch = _active_watches.get(source["page"])
+    if watch is None or watch["done"]:
+        return
+    if event["type"] == "first_token":
+        watch["ttft_ms"] = int(event["ttftMs"])
+        # The requests still in flight as the answer starts rendering are its stream
+        watch["stream"] = set(watch["requests"])
+        if not watch["stream"] and watch["stream_matched"]:
+            watch["stream_finished"] = True
+    elif event["type"] == "done":
+        _finish_watch(watch, event)
+
+def install_answer_watcher(page: Page, config):
+    """
+    Expose the event binding used by WATCH_SCRIPT and follow the page's requests, so
+    completion is taken from the answer's streaming response finishing: the fetch/XHR
+    requests (only those whose URL contains stream.url_contains, if set) sent after the
+    prompt and still in flight when the first token renders. delays.answer_quiet seconds
+    without DOM changes only end an answer when no such request is seen (e.g. a WebSocket).
+    """
+    page.expose_binding("__nuraiAnswerEvent", _on_answer_event)
+    url_contains = config.get("stream", {}).get("url_contains")
+
+    def is_stream_candidate(request):
+        if url_contains:
+            return url_contains in request.url
+        return request.resource_type in ("fetch", "xhr")
+
+    def on_request(request):
+        watch = _active_watches.get(page)
+        if watch is not None and not watch["done"] and is_stream_candidate(request):
+            watch["requests"].add(request)
+
+    def on_request_done(request):
+        watch = _active_watches.get(page)
+        if watch is None or request not in watch["requests"]:
+            return
+        watch["requests"].discard(request)
+        if watch["stream"] is None:
+            # Finished before the first token rendered; with an explicit URL it is still the stream
+            watch["stream_matched"] = bool(url_contains)
+        elif request in watch["stream"]:
+            watch["stream"].discard(request)
+            if not watch["stream"]:
+                watch["stream_finished"] = True
+
+    page.on("request", on_request)
+    page.on("requestfinished", on_request_done)
+    page.on("requestfailed", on_request_done)
+
+def submit_prompt(page: Page, question: str, config, is_first_prompt: bool):
+    """
+    Type a question into the chat box, start the in-page answer watcher and send it.
+    Returns a watch dict that poll_latest_answer uses to follow the reply.
+    """
+    chat_selectors = config["selectors"]["chat_page"]
+    if is_first_prompt:
+        input_selector = chat_selectors["prompt_input"]["locator"]
+    else:
+        input_selector = chat_selectors["prompt_input_followup"]["locator"]
+
+    watch = {
+        "start_time": time.time(),
+        "done": False,
+        "requests": set(),          # stream candidates in flight
+        "stream": None,             # ...of those, the ones in flight at the first token
+        "stream_matched": False,
+        "stream_finished": False,
+        "quiet_held": False,
+        "settling": False,
+        "timed_out": False,
+        "answer": "",
+        "latency_ms": None,
+        "ttft_ms": None,
+        "generation_ms": None,
+        "chars_per_sec": None,
+    }
+    _active_watches[page] = watch
+
+    with tracing.span("ui.fill", cat="ui"):
+        page.locator(input_selector).fill(question)
+    quiet_ms = int(config["delays"].get("answer_quiet", 1) * 1000)
+    # Pass the current answer count so the previous answer is never mistaken for the new one
+    with tracing.span("ui.install_watch", cat="ui"):
+        page.evaluate(WATCH_SCRIPT, {
+            "baseline": page.locator("div.ai-message-container").count(),
+            "quietMs": quiet_ms,
+        })
+    with tracing.span("ui.click", cat="ui"):
+        page.locator(chat_selectors["submit_button"]["locator"]).click()
+    return watch
+
+def poll_latest_answer(page: Page, watch, timeout: int = 60):
+    """
+    Non-blocking check of a watched answer; completion arrives as a page event.
+    Only talks to the page when the stream has ended or the timeout is hit.
+    Returns True once the answer is complete.
+    """
+    if watch["done"]:
+        return True
+
+    if watch["stream"] and not watch["quiet_held"]:
+        with tracing.span("ui.hold_quiet", cat="ui"):
+            page.evaluate("() => window.__nuraiWatch.holdQuiet()")
+        watch["quiet_held"] = True
+
+    if watch["stream_finished"] and not watch["settling"]:
+        with tracing.span("ui.settle", cat="ui"):
+            page.evaluate("() => window.__nuraiWatch.settle()")
+        watch["settling"] = True
+
+    if time.time() - watch["start_time"] >= timeout:
+        with tracing.span("ui.finish", cat="ui"):
+            state = page.evaluate("() => window.__nuraiWatch.finish()")
+        _finish_watch(watch, state)
+        watch["timed_out"] = True
+    return watch["done"]
+
+# ---------------------------
+# Conversation rotation and DOM pruning
+# ---------------------------
+# A long chat thread slows down both the page (more nodes to render and query) and the
+# model (more context), so later items would look slower than they are. Workers start a
+# fresh conversation every conversation.rotate_every prompts or once the page has more than
+# conversation.max_dom_nodes elements, and empty all but the last prune_keep answers.
+PRUNE_SCRIPT = """
+(keep) => {
+  const contents = document.querySelectorAll("div.ai-message-container div.ai-message-content");
+  for (let i = 0; i < contents.length - keep; i++) {
+    if (contents[i].childElementCount) contents[i].replaceChildren();
+  }
+  return document.getElementsByTagName("*").length;
+}
+"""
+
+def prune_conversation(page: Page, keep: int) -> int:
+    """
+    Empty the content of all but the last `keep` answers (keep=0 prunes nothing, the
+    message containers themselves stay). Returns the page's element count afterwards.
+    """
+    return page.evaluate(PRUNE_SCRIPT, keep if keep > 0 else 1 << 30)
+
+def rotation_due(turn: int, dom_nodes, config) -> bool:
+    """
+    Whether a worker that has sent `turn` prompts in its current conversation should start a new one.
+    """
+    settings = config.get("conversation", {})
+    rotate_every = settings.get("rotate_every", 0)
+    max_dom_nodes = settings.get("max_dom_nodes", 0)
+    return bool(rotate_every and turn >= rotate_every) or bool(max_dom_nodes and dom_nodes and dom_nodes > max_dom_nodes)
+
+def start_new_conversation(page: Page, config, chat_url: str):
+    """
+    Open an empty chat: through selectors.chat_page.new_chat if configured, otherwise by
+    reloading the chat page the worker started on. The answer watcher binding survives.
+    """
+    new_chat = config["selectors"]["chat_page"].get("new_chat", {}).get("locator")
+    if new_chat:
+        page.locator(new_chat).click()
+    else:
+        page.goto(chat_url, wait_until="domcontentloaded")
+    page.locator(config["selectors"]["chat_page"]["prompt_input"]["locator"]).wait_for(
+        state="visible", timeout=config.get("timeout", 5000)
+    )
+
 def dump_ai_answer_to_file(page: Page, output_file: str = "ai_answer.txt", timeout: int = 60, poll_interval: float = 0.5):
     """
     Uses wait_for_latest_answer to get the final AI response,
@@ -181,12 +536,12 @@ def dump_ai_answer_to_file(page: Page, output_file: str = "ai_answer.txt", timeo
 
 # Example usage
 if __name__ == "__main__":
+    from playwright.sync_api import sync_playwright
+
     config = load_config("configs/prod.yml")
     with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False)
-        context = browser.new_context()
-        result = goto_from_home(context, config)
-        if result["state"] == "login":
-            result = login_if_needed(result["page"], config)
-        print("Final state:", result["state"])
+        browser = launch_browser(p, config)
+        context, session = new_chat_context(browser, config)
+        page = open_chat_page(context, config, session)
+        print("Chat page:", page.url, "(saved session)" if session else "(fresh login)")
         browser.close()
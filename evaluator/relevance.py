@@ -0,0 +1,80 @@
+# evaluator/relevance.py
+import re
+from functools import lru_cache
+from typing import Dict, Any, List
+
+import numpy as np
+
+_TOKEN = re.compile(r"\w+")
+
+# Process-wide vocabulary, so cached token ids stay valid across runs.
+# Tokens are lower-cased \w+ runs, the same tokenization as compute_relevance.
+_vocab: Dict[str, int] = {}
+
+def _token_ids(text: str) -> np.ndarray:
+    return np.fromiter((_vocab.setdefault(t, len(_vocab)) for t in _TOKEN.findall(text.lower())), dtype=np.int64)
+
+# Questions repeat across runs and re-scoring, answers almost never do
+_question_ids = lru_cache(maxsize=200000)(_token_ids)
+
+def _term_matrix(texts: List[str], token_ids, width: int = None):
+    """
+    Sparse (n x V) term-count matrix of texts over the shared vocabulary.
+    """
+    from scipy.sparse import csr_matrix
+
+    ids = [token_ids(text) for text in texts]
+    cols = np.concatenate(ids) if ids else np.zeros(0, dtype=np.int64)
+    rows = np.repeat(np.arange(len(texts)), [len(i) for i in ids])
+    shape = (len(texts), width or max(len(_vocab), 1))
+    matrix = csr_matrix((np.ones(len(cols)), (rows, cols)), shape=shape)
+    matrix.sum_duplicates()
+    return matrix
+
+def _term_matrices(questions: List[str], answers: List[str]):
+    """
+    Q (n x V) marks each question's distinct terms, A (n x V) holds answer term counts.
+    """
+    A = _term_matrix(answers, _token_ids)
+    # Tokenize both sides before fixing the width so every id fits
+    for question in questions:
+        _question_ids(question)
+    width = max(len(_vocab), 1)
+    A.resize((len(answers), width))
+    Q = _term_matrix(questions, _question_ids, width)
+    Q.data[:] = 1.0
+    return Q, A
+
+def score_relevance_batch(questions: List[str], answers: List[str], k1: float = 1.2, b: float = 0.75) -> List[Dict[str, Any]]:
+    """
+    Relevance of every (question, answer) pair of a run with a few sparse matrix operations.
+
+    relevance          1.0 if the answer shares at least one word with the question (the original 0/1 score)
+    relevance_overlap  fraction of the question's distinct words found in the answer
+    relevance_bm25     BM25 score of the answer for its question, with IDF over the run's answers
+    """
+    n = len(questions)
+    if n == 0:
+        return []
+    Q, A = _term_matrices(questions, answers)
+
+    # Distinct question terms present in the answer
+    present = Q.multiply(A > 0)
+    overlap = np.asarray(present.sum(axis=1)).ravel()
+    q_terms = np.asarray(Q.sum(axis=1)).ravel()
+
+    # BM25: saturate answer term frequencies by answer length, weight by IDF
+    doc_len = np.asarray(A.sum(axis=1)).ravel()
+    avg_len = doc_len.mean() if doc_len.mean() > 0 else 1.0
+    df = np.bincount(A.indices, minlength=A.shape[1])
+    idf = np.log(1.0 + (n - df + 0.5) / (df + 0.5))
+    tf = A.copy()
+    row_len = np.repeat(doc_len, np.diff(A.indptr))
+    tf.data = tf.data * (k1 + 1) / (tf.data + k1 * (1 - b + b * row_len / avg_len))
+    bm25 = np.asarray(Q.multiply(tf) @ idf).ravel()
+
+    graded = np.divide(overlap, q_terms, out=np.zeros(n), where=q_terms > 0)
+    return [
+        {"relevance": 1.0 if o > 0 else 0.0, "relevance_overlap": float(g), "relevance_bm25": float(s)}
+        for o, g, s in zip(overlap, graded, bm25)
+    ]
@@ -1,23 +1,21 @@
 # evaluator/report.py
 from pathlib import Path
-from typing import List, Dict
-import statistics
+
+from history import DEFAULT_PATH, connect, get_run, top_failures, tag_breakdown
 
 def generate_test_report(run_id: str,
-                         suite_name: str,
-                         config_name: str,
-                         aggregates: Dict[str, any],
-                         per_item_results: List[Dict[str, any]],
-                         output_dir: str = "./reports"):
+                         output_dir: str = "./reports",
+                         history_path: str = None):
     """
-    Generate a TEST_REPORT.md summarizing the run.
+    Generate a TEST_REPORT.md summarizing the run, read from the run-history store.
     """
+    conn = connect(history_path or Path(output_dir) / DEFAULT_PATH.name)
+    run = get_run(conn, run_id)
+    if run is None:
+        raise KeyError(f"Run {run_id} is not in the history store (import it with history.py import)")
+    aggregates = run["aggregates"]
     report_path = Path(output_dir) / f"TEST_REPORT_{run_id}.md"
 
-    # Top 10 failures by correctness
-    sorted_items = sorted(per_item_results, key=lambda r: r["correctness"])
-    top_failures = sorted_items[:10]
-
     # Recommendations (simple heuristics)
     recs = []
     if aggregates["correctness_avg"] < 0.8:
@@ -28,11 +26,15 @@ def generate_test_report(run_id: str,
         recs.append("Strengthen safety filters: flagged unsafe content detected.")
     if aggregates["p95_ms"] and aggregates["p95_ms"] > 5000:
         recs.append("Optimize latency: 95th percentile response time is high.")
+    failed = {k: n for k, n in aggregates.get("outcomes", {}).items() if k != "ok"}
+    if failed:
+        recs.append(f"Check site stability: {', '.join(f'{n} {k}' for k, n in failed.items())} "
+                    f"({aggregates.get('retried_items', 0)} items needed retries).")
 
     with open(report_path, "w") as f:
         f.write(f"# Test Report for Run {run_id}\n\n")
-        f.write(f"**Suite:** {suite_name}  \n")
-        f.write(f"**Config:** {config_name}  \n\n")
+        f.write(f"**Suite:** {run['suite']}  \n")
+        f.write(f"**Config:** {run['config']}  \n\n")
 
         f.write("## Summary Metrics\n\n")
         f.write("| n_items | correctness_avg | relevance_avg | safety_violations | p50_ms | p95_ms |\n")
@@ -41,10 +43,34 @@ def generate_test_report(run_id: str,
                 f"{aggregates['relevance_avg']:.2f} | {aggregates['safety_violations']} | "
                 f"{aggregates['p50_ms']} | {aggregates['p95_ms']} |\n\n")
 
+        by_tag = aggregates.get("by_tag", {})
+        tags = tag_breakdown(conn, run_id)
+        if tags:
+            f.write("## By Tag\n\n")
+            f.write("| tag | n_items | correctness_avg | relevance_avg | safety_violations | p50_ms | p95_ms | p99_ms |\n")
+            f.write("|-----|---------|-----------------|---------------|-------------------|--------|--------|--------|\n")
+            for agg in tags:
+                latency = by_tag.get(agg["tag"], {})
+                f.write(f"| {agg['tag']} | {agg['n_items']} | {agg['correctness_avg']:.2f} | {agg['relevance_avg']:.2f} | "
+                        f"{agg['safety_violations']} | {latency.get('p50_ms')} | {latency.get('p95_ms')} | "
+                        f"{latency.get('p99_ms')} |\n")
+            f.write("\n")
+
+        by_turn = aggregates.get("by_turn", {})
+        if by_turn:
+            f.write("## Latency by Conversation Turn\n\n")
+            f.write("| turn | n_items | p50_ms | p95_ms | ttft_p50_ms | correctness_avg |\n")
+            f.write("|------|---------|--------|--------|-------------|-----------------|\n")
+            for bucket, agg in by_turn.items():
+                f.write(f"| {bucket} | {agg['n_items']} | {agg['p50_ms']} | {agg['p95_ms']} | "
+                        f"{agg['ttft_p50_ms']} | {agg['correctness_avg']:.2f} |\n")
+            f.write("\n")
+
+        # Top 10 failures by correctness
         f.write("## Top 10 Failures\n\n")
         f.write("| id | correctness | snippet |\n")
         f.write("|----|-------------|---------|\n")
-        for item in top_failures:
+        for item in top_failures(conn, run_id, 10):
             snippet = item["model_answer"][:120].replace("\n", " ")
             f.write(f"| {item['id']} | {item['correctness']:.2f} | {snippet} |\n")
 
@@ -52,4 +78,5 @@ def generate_test_report(run_id: str,
         for rec in recs:
             f.write(f"- {rec}\n")
 
+    conn.close()
     return str(report_path)
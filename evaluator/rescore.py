@@ -0,0 +1,158 @@
+# evaluator/rescore.py
+"""
+Re-score saved reports with the current metrics code, without asking the model again.
+
+Each result records the metrics fingerprint and a hash of the texts it was scored on;
+only items whose answer, ground truth or metrics changed are scored again, in batches.
+Reports are rewritten in place, their new aggregates saved under reports/aggregates/
+and the run-history store (if there is one) updated.
+
+    python evaluator/rescore.py                                   # every report in reports/
+    python evaluator/rescore.py --reports "reports/prod_*.json" --config candidate
+    python evaluator/rescore.py --dry-run
+"""
+import argparse
+import glob
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Iterator
+
+from aggregation import StreamingAggregator
+from checkpoint import iter_json_array, write_json_array
+import history
+from metrics import compute_metrics_batch, metrics_fingerprint, inputs_fingerprint
+from run_eval import available_configs, load_config
+from suites import ItemLookup
+
+def _rescored(records: Iterator[Dict[str, Any]], items_by_id, config, metrics_version: str,
+              stats: Dict[str, Any], batch_size: int) -> Iterator[Dict[str, Any]]:
+    """
+    Yield records in their original order, re-scoring stale ones a batch at a time.
+    """
+    def flush(batch):
+        stale = []
+        for record in batch:
+            item = items_by_id.get(record["id"])
+            if item is None:
+                stats["missing"] += 1
+                continue
+            inputs_hash = inputs_fingerprint(item["question"], item["gt_answer"], record["model_answer"])
+            if record.get("metrics_version") != metrics_version or record.get("inputs_hash") != inputs_hash:
+                stale.append((record, item, inputs_hash))
+        if stale:
+            all_metrics = compute_metrics_batch(
+                [item for _, item, _ in stale],
+                [record["model_answer"] for record, _, _ in stale],
+                [record["latency_ms"] for record, _, _ in stale],
+                config,
+            )
+            for (record, item, inputs_hash), metrics in zip(stale, all_metrics):
+                record.update(metrics)
+                record["tags"] = item.get("tags", record.get("tags", []))
+                record["metrics_version"] = metrics_version
+                record["inputs_hash"] = inputs_hash
+            stats["rescored"] += len(stale)
+        return batch
+
+    batch = []
+    for record in records:
+        stats["before"].add(record)
+        batch.append(dict(record))
+        if len(batch) >= batch_size:
+            yield from flush(batch)
+            batch = []
+    if batch:
+        yield from flush(batch)
+
+def rescore_report(path: Path, items_by_id, config_name: str = None, batch_size: int = 256,
+                   dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Re-score one report file. The metric settings come from config_name, or from the
+    config the run was made with. Returns counts and the aggregates before and after.
+    """
+    path = Path(path)
+    first = next(iter_json_array(path), None)
+    if first is None:
+        return {"report": path.name, "n_items": 0, "rescored": 0, "missing": 0}
+    config_name = config_name or first["config"]
+    config = load_config(config_name)
+    metrics_version = metrics_fingerprint(config)
+
+    stats = {"rescored": 0, "missing": 0, "before": StreamingAggregator()}
+    after = StreamingAggregator()
+
+    def tracked():
+        for record in _rescored(iter_json_array(path), items_by_id, config, metrics_version, stats, batch_size):
+            after.add(record)
+            yield record
+
+    # Stream into a temporary file and swap it in only if anything changed
+    tmp_path = path.with_suffix(".json.tmp")
+    write_json_array(tracked(), tmp_path)
+    if stats["rescored"] and not dry_run:
+        os.replace(tmp_path, path)
+    else:
+        tmp_path.unlink()
+
+    aggregates = after.summary()
+    if stats["rescored"] and not dry_run:
+        aggregates_dir = path.parent / "aggregates"
+        aggregates_dir.mkdir(exist_ok=True)
+        with open(aggregates_dir / path.name, "w") as f:
+            json.dump({
+                "run_id": first["run_id"],
+                "metrics_config": config_name,
+                "metrics_version": metrics_version,
+                "rescored_at": datetime.utcnow().isoformat(),
+                **aggregates,
+            }, f, indent=2)
+
+        # Keep the run-history store in line with the rewritten report
+        history_path = path.parent / history.DEFAULT_PATH.name
+        if history_path.exists():
+            conn = history.connect(history_path)
+            history.ingest_report(conn, path)
+            conn.close()
+
+    return {
+        "report": path.name,
+        "n_items": aggregates["n_items"],
+        "rescored": stats["rescored"],
+        "missing": stats["missing"],
+        "before": stats["before"].summary(),
+        "after": aggregates,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--reports", nargs="+", default=["reports/*.json"],
+                        help="report files or glob patterns (default: reports/*.json)")
+    parser.add_argument("--config", choices=available_configs(),
+                        help="metric settings to score with (default: each run's own config)")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    args = parser.parse_args()
+
+    paths: List[Path] = []
+    for pattern in args.reports:
+        matches = sorted(Path(p) for p in glob.glob(pattern)) if glob.has_magic(pattern) else [Path(pattern)]
+        paths.extend(p for p in matches if p not in paths)
+
+    # Ground truth of every suite in data/, read by id through the suite indexes
+    items_by_id = ItemLookup()
+    for path in paths:
+        result = rescore_report(path, items_by_id, args.config, args.batch_size, args.dry_run)
+        line = f"{result['report']}: {result['rescored']}/{result['n_items']} rescored"
+        if result["missing"]:
+            line += f", {result['missing']} without ground truth"
+        if result["rescored"]:
+            before, after = result["before"], result["after"]
+            line += (f", correctness {before['correctness_avg']:.3f} -> {after['correctness_avg']:.3f}"
+                     f", relevance {before['relevance_avg']:.3f} -> {after['relevance_avg']:.3f}"
+                     f", safety violations {before['safety_violations']} -> {after['safety_violations']}")
+        print(line)
+
+if __name__ == "__main__":
+    main()
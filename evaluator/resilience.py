@@ -0,0 +1,156 @@
+# evaluator/resilience.py
+"""
+Retry, deadline and circuit-breaker policy shared by the browser and API backends.
+
+Settings come from the retry: block of a config:
+
+    retry:
+      max_attempts: 3
+      backoff_seconds: 2             # base of the exponential backoff between attempts
+      jitter: 0.5                    # each delay is spread by +/- this fraction
+      attempt_timeout_seconds: 60    # how long one attempt waits for an answer
+      item_deadline_seconds: 150     # budget for all attempts of one item, backoff included
+      circuit_breaker:
+        failure_threshold: 5         # consecutive failed attempts that open the breaker
+        cooldown_seconds: 30         # pause before a single probe prompt is let through
+        max_trips: 3                 # openings in a row without a success before the run aborts
+
+Every result records its outcome ("ok", "timeout" or "error"), its attempts and the
+last error, so flaky runs can be told apart from slow ones.
+"""
+import random
+import time
+from typing import Dict, Any, Optional
+
+OUTCOME_OK = "ok"
+OUTCOME_TIMEOUT = "timeout"
+OUTCOME_ERROR = "error"
+
+class CircuitOpenError(RuntimeError):
+    """
+    The site kept failing after max_trips cool-downs; the run should stop (and be resumed later).
+    """
+
+# ---------------------------
+# Retries and deadlines
+# ---------------------------
+class RetryPolicy:
+    def __init__(self, max_attempts: int = 1, backoff_seconds: float = 0.0, jitter: float = 0.5,
+                 attempt_timeout: float = 60.0, item_deadline: Optional[float] = None, rng: random.Random = None):
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_seconds = backoff_seconds
+        self.jitter = jitter
+        self.attempt_timeout = attempt_timeout
+        self.item_deadline = item_deadline
+        self.rng = rng or random.Random()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], attempt_timeout: float = 60.0) -> "RetryPolicy":
+        """
+        attempt_timeout is the backend's default when retry.attempt_timeout_seconds is unset.
+        """
+        retry = config.get("retry", {})
+        return cls(
+            max_attempts=retry.get("max_attempts", 1),
+            backoff_seconds=retry.get("backoff_seconds", 0.0),
+            jitter=retry.get("jitter", 0.5),
+            attempt_timeout=retry.get("attempt_timeout_seconds", attempt_timeout),
+            item_deadline=retry.get("item_deadline_seconds"),
+        )
+
+    def deadline(self, start: float) -> float:
+        return start + self.item_deadline if self.item_deadline else float("inf")
+
+    def attempt_timeout_at(self, now: float, deadline: float) -> float:
+        """
+        Timeout of an attempt starting now: the attempt timeout, cut short by the item's deadline.
+        """
+        return max(0.0, min(self.attempt_timeout, deadline - now))
+
+    def delay(self, attempt: int) -> float:
+        """
+        Jittered exponential backoff after failed attempt `attempt` (1-based). The jitter
+        keeps workers that failed together from retrying in lockstep.
+        """
+        base = self.backoff_seconds * 2 ** (attempt - 1)
+        return base * self.rng.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def retry_delay(self, attempt: int, now: float, deadline: float) -> Optional[float]:
+        """
+        Seconds to wait before the next attempt, or None if the item is out of attempts
+        or the next attempt could not start before its deadline.
+        """
+        if attempt >= self.max_attempts:
+            return None
+        delay = self.delay(attempt)
+        if now + delay >= deadline:
+            return None
+        return delay
+
+# ---------------------------
+# Circuit breaker
+# ---------------------------
+class CircuitBreaker:
+    """
+    Stops sending new prompts while the site is clearly down. After failure_threshold
+    consecutive failures it opens for cooldown_seconds, then lets one probe through: a
+    success closes it, a failure opens it again. After max_trips openings with no success
+    in between, allow() raises CircuitOpenError.
+    """
+
+    def __init__(self, failure_threshold: int = 5, cooldown_seconds: float = 30.0, max_trips: int = 3):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.max_trips = max_trips
+        self.state = "closed"
+        self.failures = 0
+        self.trips = 0
+        self.open_until = 0.0
+        self.probing = False
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "CircuitBreaker":
+        settings = config.get("retry", {}).get("circuit_breaker", {})
+        return cls(
+            failure_threshold=settings.get("failure_threshold", 5),
+            cooldown_seconds=settings.get("cooldown_seconds", 30.0),
+            max_trips=settings.get("max_trips", 3),
+        )
+
+    def allow(self) -> bool:
+        """
+        Whether a new attempt may start now.
+        """
+        if self.trips > self.max_trips:
+            raise CircuitOpenError(f"Site still failing after {self.max_trips} cool-downs of {self.cooldown_seconds}s")
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            if time.monotonic() < self.open_until:
+                return False
+            self.state = "half_open"
+        # Half open: one probe at a time
+        if self.probing:
+            return False
+        self.probing = True
+        return True
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self.trips = 0
+        self.probing = False
+
+    def record_failure(self):
+        if self.state == "open":
+            return  # attempts already in flight when it opened
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.trips += 1
+            self.state = "open"
+            self.open_until = time.monotonic() + self.cooldown_seconds
+            self.failures = 0
+            self.probing = False
+            if self.trips <= self.max_trips:
+                print(f"Circuit breaker open (trip {self.trips}/{self.max_trips}): "
+                      f"pausing new prompts for {self.cooldown_seconds:g}s")
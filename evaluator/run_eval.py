@@ -1,110 +1,596 @@
 # evaluator/run_eval.py
 import argparse
-import json
 import time
+from collections import deque
 from pathlib import Path
 import yaml
-from nurai_client import goto_from_home, login_if_needed, take_snapshot,wait_for_latest_answer
-from metrics import compute_metrics, aggregate_metrics
-from sheets_client import append_run, append_per_item, append_top_failures
-from report import generate_test_report
+from nurai_client import (launch_browser, new_chat_context, open_chat_page, load_session, submit_prompt,
+                          poll_latest_answer, prune_conversation, rotation_due, start_new_conversation)
+from resilience import RetryPolicy, CircuitBreaker, CircuitOpenError, OUTCOME_OK, OUTCOME_TIMEOUT, OUTCOME_ERROR
+from api_client import collect_answers_api
+from answer_cache import open_answer_cache
+from suites import suite_index, select, iter_items, suite_label, SuiteItems, ItemLookup
+from shards import parse_shard, shard_items, shard_label, write_shard, host_name
+from metrics import compute_metrics_batch, aggregate_metrics, metrics_fingerprint, inputs_fingerprint
+from aggregation import LiveLatency
+from sheets_client import upload_run_in_background, wait_for_uploads
+import history
+from embeddings import warm_up_model
+from judge import warm_up_judge
+import tracing
+from checkpoint import (checkpoint_paths, write_meta, read_meta, append_record, append_records,
+                        iter_records, iter_latest, latest_values, iter_in_order, write_json_array)
+
+def available_configs():
+    """
+    Run configs in configs/ (everything except the Sheets settings).
+    """
+    return sorted(p.stem for p in Path("configs").glob("*.yml") if p.stem != "sheets")
 
 def load_config(config_name: str):
     path = Path("configs") / f"{config_name}.yml"
     with open(path, "r") as f:
         return yaml.safe_load(f)
 
-def load_suite(suite_name: str):
-    path = Path("data") / f"{suite_name}.jsonl"
-    items = []
-    with open(path, "r") as f:
-        for line in f:
-            items.append(json.loads(line))
-    return items
+def find_checkpoint(run_id: str, config_name: str = None):
+    """
+    Meta of a run's checkpoint, looked up in the reports dir of config_name or, without
+    one, of every config (run ids need not start with the config name).
+    """
+    names = [config_name] if config_name else available_configs()
+    for reports_dir in dict.fromkeys(load_config(name)["reports"]["output_dir"] for name in names):
+        path = checkpoint_paths(reports_dir, run_id)["meta"]
+        if path.exists():
+            return read_meta(path)
+    raise FileNotFoundError(f"No checkpoint {run_id} in the reports dir of {', '.join(names)}")
 
-def run_suite(suite_name: str, config_name: str):
-    config = load_config(config_name)
-    items = load_suite(suite_name)
-    sheets_config = load_config("sheets")
+def _reset_worker(worker, config) -> bool:
+    """
+    Bring a worker's page back to an empty chat after a failed attempt: a new conversation
+    in the same page, or else a freshly opened page. Returns False if both fail.
+    """
+    try:
+        start_new_conversation(worker["page"], config, worker["chat_url"])
+    except Exception:
+        try:
+            worker["page"].close()
+        except Exception:
+            pass
+        try:
+            worker["page"] = open_chat_page(worker["context"], config, load_session(config))
+            worker["chat_url"] = worker["page"].url
+        except Exception as e:
+            print(f"Worker {worker['id']} could not reopen the chat page: {e}")
+            return False
+    worker["conversation"] += 1
+    worker["turn"] = 0
+    return True
+
+def _wait(pool, poll_interval: float):
+    # Waiting inside Playwright (not time.sleep) lets the page's answer events reach Python
+    for worker in pool:
+        try:
+            worker["page"].wait_for_timeout(poll_interval * 1000)
+            return
+        except Exception:
+            continue
+    time.sleep(poll_interval)
+
+def answer_group(items, config, on_answer, timeout: int = 60):
+    """
+    Work queue, retry policy and circuit breaker of one config's items. Every worker of
+    the pool serving these items holds the group as worker["group"].
+    """
+    conversation = config.get("conversation", {})
+    return {
+        "items": items,
+        "config": config,
+        "on_answer": on_answer,
+        "queue": deque(range(len(items))),
+        "retries": [],  # (not_before, index, attempt, deadline)
+        "policy": RetryPolicy.from_config(config, attempt_timeout=timeout),
+        "breaker": CircuitBreaker.from_config(config),
+        "conversation": conversation,
+        "measure_dom": bool(conversation.get("prune_keep") or conversation.get("max_dom_nodes")),
+    }
+
+def collect_answers(pool, items, config, on_answer, timeout: int = 60, poll_interval: float = 0.1):
+    """
+    Spread suite items across the worker pool through a shared work queue.
+    Every worker times only its own prompts (in its own page), so latencies still reflect a single user.
+    Workers start fresh conversations and prune old answers per the conversation settings.
+
+    Each item has a deadline budget (retry.item_deadline_seconds) for all its attempts; an
+    attempt that errors or times out without an answer is retried after a jittered backoff,
+    by any worker, in a reset chat. A circuit breaker stops new prompts while the site keeps
+    failing and raises CircuitOpenError if it does not recover.
+
+    on_answer(index, result) is called as soon as each item is finished, with result holding
+    answer, latency_ms, ttft_ms, generation_ms, chars_per_sec, worker, conversation, turn,
+    dom_nodes, attempts, outcome and error.
+    """
+    group = answer_group(items, config, on_answer, timeout)
+    for worker in pool:
+        worker["group"] = group
+    collect_answer_groups(pool, poll_interval)
+
+def collect_answer_groups(pool, poll_interval: float = 0.1):
+    """
+    collect_answers for a pool whose workers serve different groups (answer_group), e.g. one
+    per config of a matrix run: one polling loop drives them all, each worker only takes
+    items of its own group, and retries and the circuit breaker stay per group.
+    """
+    groups = list({id(worker["group"]): worker["group"] for worker in pool}.values())
+
+    def fail(worker, task, outcome, error, watch=None):
+        """
+        A failed attempt: retry it if attempts and budget allow, else record the failure.
+        """
+        group = worker["group"]
+        group["breaker"].record_failure()
+        worker["task"] = None
+        worker["needs_reset"] = True
+        now = time.time()
+        delay = group["policy"].retry_delay(task["attempt"], now, task["deadline"])
+        if delay is not None:
+            group["retries"].append((now + delay, task["index"], task["attempt"] + 1, task["deadline"]))
+            return
+        group["on_answer"](task["index"], {
+            "answer": (watch or {}).get("answer") or "",
+            "latency_ms": (watch or {}).get("latency_ms"),
+            "ttft_ms": None,
+            "generation_ms": None,
+            "chars_per_sec": None,
+            "worker": worker["id"],
+            **task["position"],
+            "attempts": task["attempt"],
+            "outcome": outcome,
+            "error": error,
+        })
 
-    # Start Playwright
+    def has_due_task(group):
+        return bool(group["queue"]) or any(not_before <= time.time() for not_before, *_ in group["retries"])
+
+    def next_task(group):
+        """
+        Due retries first, then new items.
+        """
+        now = time.time()
+        retries = group["retries"]
+        for i, (not_before, index, attempt, deadline) in enumerate(retries):
+            if not_before <= now:
+                del retries[i]
+                return index, attempt, deadline
+        return group["queue"].popleft(), 1, None
+
+    while any(group["queue"] or group["retries"] for group in groups) or any(worker["task"] for worker in pool):
+        for worker in pool:
+            worker_id = worker["id"]
+            group = worker["group"]
+            items, config = group["items"], group["config"]
+            # Collect a finished answer first so the worker can pick up the next item right away
+            task = worker["task"]
+            if task is not None:
+                watch = task["watch"]
+                item_id = task["id"]
+                try:
+                    with tracing.span("ui.poll", cat="ui", item=item_id):
+                        done = poll_latest_answer(worker["page"], watch, timeout=task["timeout"])
+                except Exception as e:
+                    fail(worker, task, OUTCOME_ERROR, f"{type(e).__name__}: {e}")
+                    continue
+                if done and watch["timed_out"] and not watch["answer"]:
+                    fail(worker, task, OUTCOME_TIMEOUT, f"no answer within {task['timeout']:.1f}s", watch)
+                elif done:
+                    group["breaker"].record_success()
+                    if tracing.enabled() and watch["latency_ms"] is not None:
+                        # Page-side timings: model time to first token and generation,
+                        # then the harness's delay in noticing the answer was complete
+                        now = time.perf_counter()
+                        start = now - (time.time() - watch["start_time"])
+                        first_token = start + (watch["ttft_ms"] or 0) / 1000
+                        answered = start + watch["latency_ms"] / 1000
+                        track = f"worker {worker_id}"
+                        tracing.add_span("ui.ttft", start, first_token, cat="ui", track=track, item=item_id)
+                        tracing.add_span("ui.generation", first_token, answered, cat="ui", track=track, item=item_id)
+                        tracing.add_span("ui.detect", answered, now, cat="ui", track=track, item=item_id)
+                    group["on_answer"](task["index"], {
+                        "answer": watch["answer"],
+                        "latency_ms": watch["latency_ms"],
+                        "ttft_ms": watch["ttft_ms"],
+                        "generation_ms": watch["generation_ms"],
+                        "chars_per_sec": watch["chars_per_sec"],
+                        "worker": worker_id,
+                        **task["position"],
+                        "attempts": task["attempt"],
+                        # A partial answer cut off at the timeout is kept, but marked
+                        "outcome": OUTCOME_TIMEOUT if watch["timed_out"] else OUTCOME_OK,
+                        "error": None,
+                    })
+                    worker["task"] = None
+
+            if worker["task"] is None and has_due_task(group) and group["breaker"].allow():
+                index, attempt, deadline = next_task(group)
+                item = items[index]
+                policy = group["policy"]
+                now = time.time()
+                deadline = deadline or policy.deadline(now)
+                task = {"index": index, "id": item["id"], "attempt": attempt, "deadline": deadline,
+                        "timeout": policy.attempt_timeout_at(now, deadline), "position": {}}
+                try:
+                    with tracing.span("ui.submit", cat="ui", item=item["id"], worker=worker_id, attempt=attempt):
+                        if worker["needs_reset"]:
+                            with tracing.span("ui.reset", cat="ui", worker=worker_id):
+                                if not _reset_worker(worker, config):
+                                    raise RuntimeError("worker page could not be reset")
+                            worker["needs_reset"] = False
+                        dom_nodes = None
+                        if worker["turn"] and group["measure_dom"]:
+                            dom_nodes = prune_conversation(worker["page"], group["conversation"].get("prune_keep", 0))
+                        if worker["turn"] and rotation_due(worker["turn"], dom_nodes, config):
+                            with tracing.span("ui.new_conversation", cat="ui", worker=worker_id):
+                                start_new_conversation(worker["page"], config, worker["chat_url"])
+                            worker["conversation"] += 1
+                            worker["turn"] = 0
+                            dom_nodes = None
+                        # Position in the conversation, so latency drift over a thread can be measured
+                        task["position"] = {
+                            "conversation": f"w{worker_id}-{worker['conversation']}",
+                            "turn": worker["turn"] + 1,
+                            "dom_nodes": dom_nodes,
+                        }
+                        task["watch"] = submit_prompt(worker["page"], item["question"], config, worker["turn"] == 0)
+                except Exception as e:
+                    fail(worker, task, OUTCOME_ERROR, f"{type(e).__name__}: {e}")
+                    continue
+                worker["turn"] += 1
+                worker["task"] = task
+
+        _wait(pool, poll_interval)
+
+def open_worker_pool(browser, config, workers: int, first_id: int = 0):
+    """
+    One logged-in context per worker, all sharing the same browser. The first one to
+    log in saves the session, so the others (and later runs) start on the chat page.
+    """
+    pool = []
+    for _ in range(max(1, workers)):
+        context, session = new_chat_context(browser, config)
+        with tracing.span("ui.open_chat_page", cat="ui", saved_session=session is not None):
+            page = open_chat_page(context, config, session)
+        pool.append({"id": first_id + len(pool), "context": context, "page": page, "chat_url": page.url,
+                     "conversation": 1, "turn": 0, "task": None, "needs_reset": False})
+    return pool
+
+def collect_answers_ui(items, config, on_answer, workers: int = 1, headless: bool = None):
+    """
+    Ask every item through the NurAI web UI with a pool of logged-in browser contexts.
+    headless overrides browser.headless in the config.
+    """
     from playwright.sync_api import sync_playwright
     with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False)
-        context = browser.new_context()
+        browser = launch_browser(p, config, headless)
+        pool = open_worker_pool(browser, config, min(workers, len(items)))
+        collect_answers(pool, items, config, on_answer)
+        browser.close()
+
+def score_answers(items_by_id, run_id: str, config_name: str, config, paths, batch_size: int = 256, extra=None):
+    """
+    Score each item's latest checkpointed answer that has no up-to-date scored record yet,
+    in batches, appending each finished result to the scored checkpoint (the last record
+    of an id wins). items_by_id is anything with get(id) (a dict or an ItemLookup); extra
+    holds fields added to every result (e.g. shard and host).
+    """
+    # What each scored record was computed from: an item answered again on --resume
+    # (after an error or timeout) no longer matches and is scored again
+    scored = {r["id"]: _answer_key(r.get("inputs_hash"), r) for r in iter_records(paths["scored"])}
+    # Lets rescore.py tell which saved results are stale after a metric change
+    metrics_version = metrics_fingerprint(config)
+
+    def flush(batch_items, batch):
+        with tracing.span("run.score_batch", cat="run", n_items=len(batch)):
+            all_metrics = compute_metrics_batch(
+                batch_items,
+                [a["answer"] for a in batch],
+                [a["latency_ms"] for a in batch],
+                config,
+            )
+            records = []
+            for item, answer, metrics in zip(batch_items, batch, all_metrics):
+                records.append({
+                    "run_id": run_id,
+                    "id": item["id"],
+                    "config": config_name,
+                    "model_answer": answer["answer"],
+                    "latency_ms": answer["latency_ms"],
+                    "ttft_ms": answer["ttft_ms"],
+                    "generation_ms": answer["generation_ms"],
+                    "chars_per_sec": answer["chars_per_sec"],
+                    **metrics,
+                    "tags": item.get("tags", []),
+                    "worker": answer.get("worker"),
+                    "conversation": answer.get("conversation"),
+                    "turn": answer.get("turn"),
+                    "dom_nodes": answer.get("dom_nodes"),
+                    "attempts": answer.get("attempts", 1),
+                    "outcome": answer.get("outcome", OUTCOME_OK),
+                    "error": answer.get("error"),
+                    "cached": answer.get("cached", False),
+                    "metrics_version": metrics_version,
+                    "inputs_hash": inputs_fingerprint(item["question"], item["gt_answer"], answer["answer"]),
+                    **(extra or {}),
+                })
+            # One fsync per batch: a crash only costs re-scoring it
+            append_records(paths["scored"], records)
 
-        # Navigate from home
-        result = goto_from_home(context, config)
-        if result["state"] == "login":
-            result = login_if_needed(result["page"], config)
-        chat_page = result["page"]
+    batch_items, batch = [], []
+    for answer in iter_latest(paths["answers"]):
+        item = items_by_id.get(answer["id"])
+        if item is None:
+            continue
+        inputs_hash = inputs_fingerprint(item["question"], item["gt_answer"], answer["answer"])
+        if scored.get(answer["id"]) == _answer_key(inputs_hash, answer):
+            continue
+        batch_items.append(item)
+        batch.append(answer)
+        if len(batch) >= batch_size:
+            flush(batch_items, batch)
+            batch_items, batch = [], []
+    if batch:
+        flush(batch_items, batch)
 
-        run_id = f"{config_name}_{int(time.time())}"
-        per_item_results = []
+def _answer_key(inputs_hash: str, record):
+    return inputs_hash, record.get("outcome", OUTCOME_OK), record.get("attempts", 1), record["latency_ms"]
 
-        is_first_prompt = True
+def answered_ids(paths) -> set:
+    """
+    Ids whose latest checkpointed answer is ok; errors and timeouts are asked again on --resume.
+    """
+    outcomes = latest_values(paths["answers"], "outcome", OUTCOME_OK)
+    return {item_id for item_id, outcome in outcomes.items() if outcome == OUTCOME_OK}
 
-        for item in items:
-            qid = item["id"]
-            question = item["question"]
+def prepare_run(suite_name: str, config_name: str, resume_run_id: str = None, answer_cache: bool = None,
+                shard=None, run_id: str = None, filters: dict = None, label: str = None):
+    """
+    Select the suite's index entries and read the checkpoint of one run, and work out which
+    items still need an answer. Returns the run state used by collect_run_answers and
+    finish_run: the run's index entries, and its pending items as a SuiteItems, read from
+    the suite file as they are asked. Its on_answer(index, result) checkpoints the answer to
+    pending[index]. label prefixes the live latency lines.
+    """
+    started_at = time.time()
+    config = load_config(config_name)
+    reports_dir = config["reports"]["output_dir"]
+
+    # Every answer is checkpointed as it arrives, so a crashed run can be resumed
+    if resume_run_id:
+        meta = read_meta(checkpoint_paths(reports_dir, resume_run_id)["meta"])
+        run_id = meta.get("run_id", resume_run_id)
+        shard = tuple(meta["shard"]) if meta.get("shard") else None
+        filters = meta.get("filters")
+    filters = filters or {}
+    entries = select(suite_index(suite_name), **filters)
+    run_id = run_id or f"{config_name}_{int(time.time())}"
+    if shard:
+        entries = shard_items(entries, *shard, key=lambda entry: entry.id)
+    checkpoint_id = resume_run_id or (f"{run_id}.{shard_label(shard)}" if shard else run_id)
+    paths = checkpoint_paths(reports_dir, checkpoint_id)
+    if not resume_run_id:
+        # Never mix a fresh run into the answers of an earlier one with the same id
+        if paths["answers"].exists() and paths["answers"].stat().st_size:
+            raise FileExistsError(f"Run {checkpoint_id} already has checkpointed answers; finish it with "
+                                  f"--resume {checkpoint_id} or pick another --run-id")
+        write_meta(paths["meta"], {"run_id": run_id, "suite": suite_name, "config": config_name, "filters": filters,
+                                   "shard": list(shard) if shard else None, "host": host_name()})
 
-            # Send prompt & measure latency
-            start = time.time()
+    done = answered_ids(paths)
+    pending = [entry for entry in entries if entry.id not in done]
+    if resume_run_id:
+        print(f"Resuming {checkpoint_id}: {len(entries) - len(pending)} of {len(entries)} items already answered")
 
-            if is_first_prompt:
-                input_selector = config["selectors"]["chat_page"]["prompt_input"]["locator"]
+    # Deterministic configs can reuse answers from earlier runs (answer_cache in the config).
+    # Reused answers are marked cached and left out of latency stats.
+    cache = open_answer_cache(config, answer_cache)
+    if cache is not None:
+        misses, hits = [], []
+        for entry, item in zip(pending, iter_items(pending)):
+            hit = cache.get(item["question"])
+            if hit is None:
+                misses.append(entry)
             else:
-                input_selector = config["selectors"]["chat_page"]["prompt_input_followup"]["locator"]
-            chat_page.locator(input_selector).fill(question)
-            chat_page.locator(config["selectors"]["chat_page"]["submit_button"]["locator"]).click()
-
-            # Capture model answer
-            answer = wait_for_latest_answer(chat_page)
-            #dump_ai_answer_to_file(chat_page)
-
-            latency_ms = int((time.time() - start) * 1000)
-
-            # Compute metrics
-            metrics = compute_metrics(item, answer, latency_ms, config)
-
-            per_item_results.append({
-                "run_id": run_id,
-                "id": qid,
-                "config": config_name,
-                "model_answer": answer,
-                "latency_ms": latency_ms,
-                **metrics,
-                "tags": item.get("tags", [])
-            })
-            is_first_prompt = False
-
-        # Aggregate
-        aggregates = aggregate_metrics(per_item_results)
-
-        # Save artifacts locally
-        reports_dir = Path(config["reports"]["output_dir"])
-        reports_dir.mkdir(exist_ok=True)
-        with open(reports_dir / f"{run_id}.json", "w") as f:
-            json.dump(per_item_results, f, indent=2)
-
-        # Push to Google Sheets
-        # append_top_failures(per_item_results, config)
-        append_run(run_id, config_name, suite_name, aggregates, sheets_config)
-        append_per_item(per_item_results, sheets_config)
-        append_top_failures(per_item_results, sheets_config)
+                hits.append({"id": item["id"], **hit, "worker": None, "cached": True})
+        append_records(paths["answers"], hits)
+        if len(misses) < len(pending):
+            print(f"Answer cache: reused {len(pending) - len(misses)} of {len(pending)} answers")
+        pending = misses
+    pending = SuiteItems(pending)
 
-        browser.close()
+    # Latency percentiles are printed while answers arrive, long before scoring
+    live = LiveLatency(total=len(pending), label=label)
+
+    def on_answer(index, result):
+        item_id = pending.entries[index].id
+        append_record(paths["answers"], {"id": item_id, **result})
+        if result.get("outcome", OUTCOME_OK) == OUTCOME_OK:
+            live.record(result["latency_ms"])
+        else:
+            print(f"{item_id}: {result['outcome']} after {result['attempts']} attempt(s) ({result['error']})")
+        if cache is not None:
+            cache.put(pending[index]["question"], result)
+
+    return {
+        "suite": suite_name,
+        "config_name": config_name,
+        "config": config,
+        "reports_dir": reports_dir,
+        "run_id": run_id,
+        "checkpoint_id": checkpoint_id,
+        "shard": shard,
+        "filters": filters,
+        "paths": paths,
+        "entries": entries,
+        "pending": pending,
+        "cache": cache,
+        "on_answer": on_answer,
+        "started_at": started_at,
+        "answered_at": None,
+    }
+
+def collect_run_answers(run, workers: int = 1, headless: bool = None):
+    """
+    Ask the run's pending items through its config's backend.
+    """
+    config, pending = run["config"], run["pending"]
+    if pending:
+        with tracing.span("run.collect_answers", cat="run", n_items=len(pending)):
+            if config.get("backend", "ui") == "api":
+                collect_answers_api(pending, config, run["on_answer"], concurrency=workers if workers > 1 else None)
+            else:
+                collect_answers_ui(pending, config, run["on_answer"], workers, headless)
+
+def finish_run(run, upload: bool = True):
+    """
+    Score the run's answers, then write its report, add it to the history store and
+    (with upload) queue its Sheets upload. Returns the aggregates, or None for a shard.
+    """
+    if run["cache"] is not None:
+        run["cache"].close()
+        run["cache"] = None
+    run["answered_at"] = answered_at = run["answered_at"] or time.time()
+    config, config_name, paths = run["config"], run["config_name"], run["paths"]
+    run_id, shard, reports_dir = run["run_id"], run["shard"], run["reports_dir"]
+    entries = run["entries"]
+
+    # Score after all answers are in, so metric time never inflates a worker's latency,
+    # and embed answer/ground-truth pairs in large batches (items are read by id as scored)
+    items_by_id = ItemLookup(entries=entries)
+    extra = {"shard": f"{shard[0]}/{shard[1]}", "host": host_name()} if shard else None
+    with tracing.span("run.score", cat="run"):
+        score_answers(items_by_id, run_id, config_name, config, paths, extra=extra)
+
+    # Aggregate and save artifacts by streaming over the checkpoint in suite order
+    item_ids = [entry.id for entry in entries]
+    if shard:
+        # History and Sheets are written once, when the shards are merged
+        write_shard(reports_dir, run_id, shard, lambda: iter_in_order(paths["scored"], item_ids), {
+            "suite": run["suite"],
+            "filters": run["filters"],
+            "config": config_name,
+            "host": host_name(),
+            "started_at": run["started_at"],
+            "finished_at": time.time(),
+            "answer_seconds": answered_at - run["started_at"],
+            "score_seconds": time.time() - answered_at,
+            "n_answered": len(run["pending"]),
+        })
+        print(f"Shard {shard[0]}/{shard[1]} of {run_id} done; merge with: python evaluator/shards.py merge {run_id}")
+        return None
+
+    aggregates = aggregate_metrics(iter_in_order(paths["scored"], item_ids))
+    with tracing.span("run.write_report", cat="run"):
+        write_json_array(iter_in_order(paths["scored"], item_ids), Path(reports_dir) / f"{run_id}.json")
+
+    # Add the run to the local run-history store (trend queries, test reports)
+    with tracing.span("run.history", cat="run"):
+        conn = history.connect(Path(reports_dir) / history.DEFAULT_PATH.name)
+        history.ingest_run(conn, run_id, config_name, suite_label(run["suite"]), aggregates,
+                           iter_in_order(paths["scored"], item_ids))
+        conn.close()
+
+    # Push to Google Sheets (one batched write, in the background)
+    if upload and config["reports"].get("upload_to_sheets", True):
+        upload_run_in_background(run_id, config_name, suite_label(run["suite"]), aggregates,
+                                 iter_in_order(paths["scored"], item_ids), load_config("sheets"))
+    return aggregates
+
+def run_suite(suite_name: str, config_name: str, workers: int = 1, warmup: bool = True, resume_run_id: str = None,
+              answer_cache: bool = None, shard=None, run_id: str = None, filters: dict = None, headless: bool = None):
+    """
+    Run one suite against one config. suite_name is a suite name, file or glob, and
+    filters (ids, tags, sample, seed) select a subset of it. With shard=(i, N) only
+    that shard's items are run and the results go to reports/shards/<run_id>/ for
+    shards.py merge.
+    """
+    run = prepare_run(suite_name, config_name, resume_run_id, answer_cache, shard, run_id, filters)
+
+    # Load the embedding model (and judge) in the background while the browser logs in
+    if warmup:
+        warm_up_model(run["config"])
+        if run["config"]["metrics"].get("use_llm_judge", False):
+            warm_up_judge(run["config"])
+    try:
+        collect_run_answers(run, workers, headless)
+    except CircuitOpenError as e:
+        # Everything answered so far is in the checkpoint
+        print(f"Run aborted: {e}. Finish it later with: python evaluator/run_eval.py --resume {run['checkpoint_id']}")
+        raise SystemExit(1)
+    return finish_run(run)
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--suite", required=True, choices=["core", "adversarial", "bias"])
-    parser.add_argument("--config", required=True, choices=["prod", "candidate"])
+    parser.add_argument("--suite", help="suite name in data/ (core, adversarial, bias, ...), JSONL file or glob")
+    parser.add_argument("--ids", nargs="+", help="only these item ids (space- or comma-separated)")
+    parser.add_argument("--tags", nargs="+", help="only items with any of these tags")
+    parser.add_argument("--sample", type=int, help="random sample of N items (after --ids/--tags)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for --sample")
+    parser.add_argument("--config", choices=available_configs())
+    parser.add_argument("--workers", type=int, default=1,
+                        help="parallel browser contexts (ui backend) or in-flight requests (api backend)")
+    parser.add_argument("--warmup", action=argparse.BooleanOptionalAction, default=True,
+                        help="load the embedding model in the background during browser login")
+    parser.add_argument("--resume", metavar="RUN_ID",
+                        help="finish a crashed run, skipping items already answered ok (errors and timeouts are asked again)")
+    parser.add_argument("--answer-cache", action=argparse.BooleanOptionalAction, default=None,
+                        help="reuse cached answers of a deterministic config (default: answer_cache.enabled)")
+    parser.add_argument("--shard", type=parse_shard, metavar="i/N",
+                        help="run only shard i of N (items split by id hash); merge with shards.py merge")
+    parser.add_argument("--run-id", help="run id to use (give every shard of a run the same one)")
+    parser.add_argument("--headless", action=argparse.BooleanOptionalAction, default=None,
+                        help="run the browser headless (default: browser.headless)")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="record per-phase spans and write a Chrome trace (chrome://tracing, Perfetto) to PATH")
+    parser.add_argument("--profile", metavar="PATH", help="run under cProfile and dump the stats to PATH")
     args = parser.parse_args()
 
-    run_suite(args.suite, args.config)
+    if args.trace:
+        tracing.enable()
+    with tracing.profiled(args.profile):
+        run(parser, args)
+
+    if args.trace:
+        tracing.export_chrome_trace(args.trace)
+        tracing.print_phase_summary()
+        print(f"Trace written to {args.trace}")
+
+def run(parser, args):
+    if args.resume:
+        # Suite and config come from the checkpoint unless given explicitly
+        try:
+            meta = find_checkpoint(args.resume, args.config)
+        except FileNotFoundError as e:
+            parser.error(str(e))
+        run_suite(args.suite or meta["suite"], args.config or meta["config"],
+                  workers=args.workers, warmup=args.warmup, resume_run_id=args.resume,
+                  answer_cache=args.answer_cache, headless=args.headless)
+    elif not (args.suite and args.config):
+        parser.error("--suite and --config are required unless --resume is given")
+    elif args.shard and not args.run_id:
+        parser.error("--shard needs --run-id, the same one on every shard, so shards.py merge can find them")
+    else:
+        filters = {
+            "ids": [i for value in args.ids for i in value.split(",") if i] if args.ids else None,
+            "tags": args.tags,
+            "sample": args.sample,
+            "seed": args.seed,
+        }
+        try:
+            run_suite(args.suite, args.config, workers=args.workers, warmup=args.warmup,
+                      answer_cache=args.answer_cache, shard=args.shard, run_id=args.run_id, filters=filters,
+                      headless=args.headless)
+        except FileExistsError as e:
+            parser.error(str(e))
+
+    wait_for_uploads()
 
 if __name__ == "__main__":
     main()
-
-#report_file = generate_test_report(run_id, suite_name, config_name, aggregates, per_item_results, config["reports"]["output_dir"])
-#print("Report written to", report_file)
\ No newline at end of file
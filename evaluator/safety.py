@@ -0,0 +1,153 @@
+# evaluator/safety.py
+import re
+from bisect import bisect_right
+from itertools import accumulate
+from pathlib import Path
+from typing import Dict, Any, List, Tuple
+
+import yaml
+
+PACKS_DIR = Path("configs") / "safety"
+
+# Joins answers for batch scanning; never part of a word, so \b still holds at the seams
+_SEPARATOR = "\x00"
+
+def load_pack(name: str) -> Dict[str, Any]:
+    """
+    Load a safety pattern pack from configs/safety/<name>.yml.
+    """
+    with open(PACKS_DIR / f"{name}.yml", "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+def _trie_pattern(terms: List[str]) -> str:
+    """
+    Regex alternation of literal terms, factored into a prefix trie so the regex engine
+    tries each character once instead of once per term. Greedy optional branches
+    keep the longest term preferred, like a longest-first alternation.
+    """
+    trie: Dict[str, Any] = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node) -> str:
+        ends_here = "" in node
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if ends_here:
+            return "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+class SafetyScanner:
+    """
+    Single-pass safety scanner over one or more pattern packs.
+
+    Every term of every category is compiled into one case-insensitive prefix-trie
+    regex (longest term preferred), so an answer is scanned once no matter how many categories
+    or languages there are. The regex is a lookahead tried at every word start, so matches
+    may overlap ("serang balas" and "balas dendam" in "serang balas dendam"). A term also
+    credits every category whose terms occur inside it as whole words ("bunuh diri" counts
+    for self_harm and for hate via "bunuh"), which matches what running one regex per
+    category would flag.
+
+    Raw `patterns` are compiled on their own and run on each answer separately, so their
+    anchors, \s classes and named groups behave as written and never see a neighbouring
+    answer or shadow a term match at the same position.
+    """
+
+    def __init__(self, packs: List[Dict[str, Any]]):
+        term_categories: Dict[str, set] = {}
+        self.patterns: List[Tuple[str, Any]] = []
+        self.categories: List[str] = []
+
+        for pack in packs:
+            for category, spec in pack["categories"].items():
+                if category not in self.categories:
+                    self.categories.append(category)
+                for key, values in spec.items():
+                    if key == "patterns":
+                        self.patterns.extend((category, re.compile(r"\b(?:" + p + r")\b", re.I)) for p in values)
+                    else:
+                        for term in values:
+                            term_categories.setdefault(term.lower(), set()).add(category)
+
+        # Credit categories of whole-word terms nested inside longer terms
+        per_category = {
+            c: re.compile(r"\b(?:" + "|".join(re.escape(t) for t, cs in term_categories.items() if c in cs) + r")\b", re.I)
+            for c in self.categories if any(c in cs for cs in term_categories.values())
+        }
+        self.term_categories = {
+            term: sorted(c for c, rx in per_category.items() if rx.search(term))
+            for term in term_categories
+        }
+
+        # Zero-width, so finditer also reports terms that start inside an earlier match
+        trie = _trie_pattern(list(self.term_categories)) if self.term_categories else None
+        self.regex = re.compile(r"\b(?=(" + trie + r")\b)", re.I) if trie else None
+
+    def scan(self, text: str) -> Dict[str, Any]:
+        """
+        Scan one answer. Returns flagged categories (in pack order) and every match span.
+        """
+        return self.scan_batch([text])[0]
+
+    def scan_batch(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """
+        Scan many answers: terms in a single regex pass over their concatenation,
+        raw patterns per answer.
+        """
+        results = [{"safety_flags": [], "safety_violation_count": 0, "safety_matches": []} for _ in texts]
+        if not texts:
+            return results
+
+        flagged = [set() for _ in texts]
+        if self.regex is not None:
+            starts = list(accumulate([0] + [len(t) + 1 for t in texts[:-1]]))
+            covered_to = 0
+            for match in self.regex.finditer(_SEPARATOR.join(texts)):
+                start, end = match.span(1)
+                # A term inside an earlier match is already credited through term_categories
+                if end <= covered_to:
+                    continue
+                covered_to = end
+                i = bisect_right(starts, start) - 1
+                categories = self.term_categories.get(match.group(1).lower(), [])
+                flagged[i].update(categories)
+                results[i]["safety_matches"].append({
+                    "categories": categories,
+                    "term": match.group(1),
+                    "start": start - starts[i],
+                    "end": end - starts[i],
+                })
+
+        if self.patterns:
+            for i, text in enumerate(texts):
+                matches = results[i]["safety_matches"]
+                for category, regex in self.patterns:
+                    for match in regex.finditer(text):
+                        flagged[i].add(category)
+                        matches.append({"categories": [category], "term": match.group(0),
+                                        "start": match.start(), "end": match.end()})
+                matches.sort(key=lambda m: (m["start"], m["end"]))
+
+        for result, cats in zip(results, flagged):
+            result["safety_flags"] = [c for c in self.categories if c in cats]
+            result["safety_violation_count"] = len(result["safety_flags"])
+        return results
+
+_scanners = {}
+
+def get_scanner(pack_names: Tuple[str, ...] = ("default",)) -> SafetyScanner:
+    """
+    Compiled scanner for a set of packs, built once per process.
+    """
+    pack_names = tuple(pack_names)
+    if pack_names not in _scanners:
+        _scanners[pack_names] = SafetyScanner([load_pack(name) for name in pack_names])
+    return _scanners[pack_names]
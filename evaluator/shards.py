@@ -0,0 +1,171 @@
+# evaluator/shards.py
+"""
+Split a suite across machines and merge the shard results back into one run.
+
+Every machine runs the same suite and config with the same --run-id and its own --shard:
+
+    python evaluator/run_eval.py --suite core --config prod --run-id prod_1762400000 --shard 1/3
+    python evaluator/run_eval.py --suite core --config prod --run-id prod_1762400000 --shard 2/3
+    python evaluator/run_eval.py --suite core --config prod --run-id prod_1762400000 --shard 3/3
+
+Shard results land in reports/shards/<run_id>/. Once they are collected in one place:
+
+    python evaluator/shards.py merge prod_1762400000
+"""
+import argparse
+import hashlib
+import heapq
+import json
+import socket
+import statistics
+from pathlib import Path
+from typing import Dict, Any, List, Tuple
+
+from aggregation import StreamingAggregator
+from checkpoint import iter_json_array, write_json_array
+
+# ---------------------------
+# Splitting
+# ---------------------------
+def parse_shard(value: str) -> Tuple[int, int]:
+    """
+    argparse type for --shard: "i/N" with 1 <= i <= N.
+    """
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, got {value!r}")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"shard index must be between 1 and {count}, got {index}")
+    return index, count
+
+def shard_label(shard: Tuple[int, int]) -> str:
+    return f"shard-{shard[0]}-of-{shard[1]}"
+
+def _id_hash(item_id: str) -> str:
+    return hashlib.sha256(item_id.encode("utf-8")).hexdigest()
+
+def shard_items(items: List[Dict[str, Any]], index: int, count: int,
+                key=lambda item: item["id"]) -> List[Dict[str, Any]]:
+    """
+    Items of shard index (1-based) of count. Items are ordered by a hash of their id and
+    dealt round-robin, so every machine picks the same split, shard sizes differ by at
+    most one, and neighbouring (often similar) items spread across shards.
+    Suite order is kept within the shard. key gives an item's id (e.g. of suite index entries).
+    """
+    ranked = sorted(items, key=lambda item: _id_hash(key(item)))
+    chosen = {key(item) for item in ranked[index - 1::count]}
+    return [item for item in items if key(item) in chosen]
+
+def shard_dir(reports_dir: str, run_id: str) -> Path:
+    path = Path(reports_dir) / "shards" / run_id
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+def host_name() -> str:
+    return socket.gethostname()
+
+def write_shard(reports_dir: str, run_id: str, shard: Tuple[int, int], records, meta: Dict[str, Any]):
+    """
+    Save one shard's results and a meta file with its host, timings and aggregator state.
+    records is called to get a fresh iterator over the shard's results in suite order.
+    """
+    directory = shard_dir(reports_dir, run_id)
+    write_json_array(records(), directory / f"{shard_label(shard)}.json")
+    aggregator = StreamingAggregator().add_all(records())
+    with open(directory / f"{shard_label(shard)}.meta.json", "w") as f:
+        json.dump({**meta, "run_id": run_id, "shard": list(shard), "aggregator": aggregator.to_dict()}, f, indent=2)
+
+# ---------------------------
+# Merging
+# ---------------------------
+def _shard_table(metas: List[Dict[str, Any]]):
+    """
+    Print per-shard host and timings, marking shards much slower per item than the median.
+    """
+    rates = [m["answer_seconds"] / m["n_answered"] for m in metas if m.get("n_answered")]
+    median_rate = statistics.median(rates) if rates else None
+    print("shard | host | n_items | answered | answer_s | s/item | p50_ms | p95_ms")
+    for m in metas:
+        summary = StreamingAggregator.from_dict(m["aggregator"]).summary()
+        rate = m["answer_seconds"] / m["n_answered"] if m.get("n_answered") else None
+        slow = median_rate and rate and rate > 1.5 * median_rate
+        print(f"{m['shard'][0]}/{m['shard'][1]} | {m['host']} | {summary['n_items']} | {m.get('n_answered', 0)} | "
+              f"{m['answer_seconds']:.1f} | {f'{rate:.2f}' if rate else '-'} | {summary['p50_ms']} | {summary['p95_ms']}"
+              + ("  <- slow" if slow else ""))
+
+def merge_shards(run_id: str, reports_dir: str = "./reports", allow_partial: bool = False,
+                 upload: bool = True) -> Dict[str, Any]:
+    """
+    Combine the shard results of run_id into reports/<run_id>.json, add the run to the
+    history store and upload it to Sheets once. Aggregates come from merging the shards'
+    aggregator states (exact), not from re-reading every result.
+    """
+    from run_eval import load_config
+    from suites import suite_index, suite_label
+    from sheets_client import upload_run_in_background, wait_for_uploads
+    import history
+
+    directory = Path(reports_dir) / "shards" / run_id
+    metas = []
+    for path in sorted(directory.glob("*.meta.json")):
+        with open(path, "r") as f:
+            metas.append(json.load(f))
+    if not metas:
+        raise FileNotFoundError(f"No shard results under {directory}")
+
+    runs = {(m["suite"], m["config"], m["shard"][1]) for m in metas}
+    if len(runs) != 1:
+        raise ValueError(f"Shards of {run_id} disagree on suite/config/shard count: {sorted(runs)}")
+    suite_name, config_name, count = runs.pop()
+    metas.sort(key=lambda m: m["shard"][0])
+    missing = sorted(set(range(1, count + 1)) - {m["shard"][0] for m in metas})
+    if missing and not allow_partial:
+        raise ValueError(f"Missing shard(s) {missing} of {count} for {run_id}")
+
+    aggregator = StreamingAggregator()
+    for m in metas:
+        aggregator.merge(StreamingAggregator.from_dict(m["aggregator"]))
+    aggregates = aggregator.summary()
+
+    # Shard files are each in suite order, so a k-way merge restores the suite order
+    order = {entry.id: i for i, entry in enumerate(suite_index(suite_name))}
+
+    def records():
+        return heapq.merge(*(iter_json_array(directory / f"{shard_label(m['shard'])}.json") for m in metas),
+                           key=lambda r: order.get(r["id"], len(order)))
+
+    write_json_array(records(), Path(reports_dir) / f"{run_id}.json")
+
+    conn = history.connect(Path(reports_dir) / history.DEFAULT_PATH.name)
+    history.ingest_run(conn, run_id, config_name, suite_label(suite_name), aggregates, records())
+    conn.close()
+
+    _shard_table(metas)
+    if missing:
+        print(f"Merged without shard(s) {missing}")
+
+    config = load_config(config_name)
+    if upload and config["reports"].get("upload_to_sheets", True):
+        upload_run_in_background(run_id, config_name, suite_label(suite_name), aggregates, records(),
+                                 load_config("sheets"))
+        wait_for_uploads()
+    return aggregates
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge sharded runs")
+    commands = parser.add_subparsers(dest="command", required=True)
+    merge_cmd = commands.add_parser("merge", help="combine shard results into one run")
+    merge_cmd.add_argument("run_id")
+    merge_cmd.add_argument("--reports-dir", default="./reports")
+    merge_cmd.add_argument("--allow-partial", action="store_true", help="merge even if some shards are missing")
+    merge_cmd.add_argument("--no-upload", action="store_true", help="skip the Sheets upload")
+    args = parser.parse_args()
+
+    if args.command == "merge":
+        aggregates = merge_shards(args.run_id, args.reports_dir, args.allow_partial, upload=not args.no_upload)
+        print(f"{args.run_id}: {aggregates['n_items']} items, correctness {aggregates['correctness_avg']:.3f}, "
+              f"p50 {aggregates['p50_ms']}ms, p95 {aggregates['p95_ms']}ms")
+
+if __name__ == "__main__":
+    main()
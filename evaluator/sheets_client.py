@@ -1,52 +1,113 @@
 # evaluator/sheets_client.py
-import gspread
+import heapq
+import queue
+import random
+import re
+import threading
+import time
 import yaml
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Iterable
+
+import tracing
+
+# ---------------------------
+# Headers
+# ---------------------------
+RUNS_HEADER = [
+    "timestamp",
+    "run_id",
+    "config",
+    "suite",
+    "n_items",
+    "correctness",
+    "relevance",
+    "safety_violations",
+    "p50_ms",
+    "p95_ms",
+    "notes"
+]
+
+PER_ITEM_HEADER = [
+    "run_id",
+    "id",
+    "config",
+    "correctness",
+    "relevance",
+    "safety_flags",
+    "latency_ms",
+    "model_answer",
+    "tags"
+]
+
+TOP_FAILURES_HEADER = [
+    "run_id",
+    "id",
+    "snippet",
+    "reason"
+]
+
+# ---------------------------
+# Cached client / spreadsheet
+# ---------------------------
+_clients = {}
+_spreadsheets = {}
+_verified_headers = set()
+_cache_lock = threading.Lock()
+
+def _local_session(api_base: str):
+    """
+    requests session that sends Sheets API calls to api_base instead of Google
+    (used with benchmarks/fake_sheets_server.py).
+    """
+    import requests
+    from gspread.urls import SPREADSHEETS_API_V4_BASE_URL
+
+    class LocalSession(requests.Session):
+        def request(self, method, url, *args, **kwargs):
+            return super().request(method, url.replace(SPREADSHEETS_API_V4_BASE_URL, api_base.rstrip("/")), *args, **kwargs)
+
+    return LocalSession()
+
+def _get_client(config: Dict[str, Any]):
+    """
+    One authorized gspread client per process (authenticating is the slow part).
+    """
+    import gspread
+
+    api_base = config["sheets"].get("api_base")
+    key = api_base or config["sheets"]["json_key"]
+    with _cache_lock:
+        if key not in _clients:
+            if api_base:
+                _clients[key] = gspread.Client(None, session=_local_session(api_base))
+            else:
+                _clients[key] = gspread.service_account(filename=config["sheets"]["json_key"])
+        return _clients[key]
 
 def _get_sheet(config: Dict[str, Any]):
     """
     Open the Google Sheet using gspread.
     Assumes you have already set up Google auth (service account or OAuth).
+    Returns the spreadsheet and a {tab title: sheetId} map, both cached per process.
     """
-    gc = gspread.service_account(filename=config["sheets"]["json_key"])
     sheet_id = config["sheets"]["sheet_id"]
-    return gc.open_by_key(sheet_id)
+    client = _get_client(config)
+    with _cache_lock:
+        if sheet_id not in _spreadsheets:
+            with tracing.span("sheets.open", cat="sheets"):
+                sh = client.open_by_key(sheet_id)
+                tab_ids = {s["properties"]["title"]: s["properties"]["sheetId"]
+                           for s in sh.fetch_sheet_metadata()["sheets"]}
+            _spreadsheets[sheet_id] = (sh, tab_ids)
+        return _spreadsheets[sheet_id]
 
-def append_run(run_id: str, config_name: str, suite_name: str, aggregates: Dict[str, Any], config: Dict[str, Any]):
-    """
-    Append one row to the Runs tab.
-    """
-    sh = _get_sheet(config)
-    ws = sh.worksheet(config["sheets"]["tabs"]["runs"])
-
-    # Define the expected header
-    header = [
-        "timestamp",
-        "run_id",
-        "config",
-        "suite",
-        "n_items",
-        "correctness",
-        "relevance",
-        "safety_violations",
-        "p50_ms",
-        "p95_ms",
-        "notes"
-    ]
-
-    # Check if sheet is empty or header missing
-    existing_values = ws.get_all_values()
-    if not existing_values:  # completely empty sheet
-        ws.append_row(header, value_input_option="USER_ENTERED")
-    else:
-        first_row = existing_values[0]
-        # If header mismatch (e.g. someone cleared it), re-add
-        if first_row != header:
-            ws.insert_row(header, 1, value_input_option="USER_ENTERED")
-
-    row = [
+# ---------------------------
+# Row builders
+# ---------------------------
+def run_rows(run_id: str, config_name: str, suite_name: str, aggregates: Dict[str, Any]) -> List[List[Any]]:
+    return [[
         datetime.utcnow().isoformat(),
         run_id,
         config_name,
@@ -57,40 +118,21 @@ def append_run(run_id: str, config_name: str, suite_name: str, aggregates: Dict[
         aggregates["safety_violations"],
         aggregates["p50_ms"],
         aggregates["p95_ms"],
-        ""  # notes column
-    ]
-    ws.append_row(row, value_input_option="USER_ENTERED")
+        _run_notes(aggregates)  # notes column
+    ]]
 
-def append_per_item(per_item_results: List[Dict[str, Any]], config: Dict[str, Any]):
-    """
-    Append rows to the PerItem tab.
-    """
-    sh = _get_sheet(config)
-    ws = sh.worksheet(config["sheets"]["tabs"]["per_item"])
-
-    # Define expected header
-    header = [
-        "run_id",
-        "id",
-        "config",
-        "correctness",
-        "relevance",
-        "safety_flags",
-        "latency_ms",
-        "model_answer",
-        "tags"
-    ]
-
-    # Check if sheet is empty or header missing
-    existing_values = ws.get_all_values()
-    if not existing_values:  # completely empty sheet
-        ws.append_row(header, value_input_option="USER_ENTERED")
-    else:
-        first_row = existing_values[0]
-        if first_row != header:
-            ws.insert_row(header, 1, value_input_option="USER_ENTERED")
-
-    # Build rows to append
+def _run_notes(aggregates: Dict[str, Any]) -> str:
+    notes = []
+    if aggregates.get("cached_items"):
+        notes.append(f"{aggregates['cached_items']} cached answers")
+    for outcome, n in aggregates.get("outcomes", {}).items():
+        if outcome != "ok":
+            notes.append(f"{n} {outcome}")
+    if aggregates.get("retried_items"):
+        notes.append(f"{aggregates['retried_items']} retried")
+    return ", ".join(notes)
+
+def per_item_rows(per_item_results: Iterable[Dict[str, Any]]) -> List[List[Any]]:
     rows = []
     for r in per_item_results:
         rows.append([
@@ -104,37 +146,11 @@ def append_per_item(per_item_results: List[Dict[str, Any]], config: Dict[str, An
             r["model_answer"],
             ",".join(r.get("tags", []))
         ])
+    return rows
 
-    ws.append_rows(rows, value_input_option="USER_ENTERED",table_range= 'A1')
-
-def append_top_failures(per_item_results: List[Dict[str, Any]], config: Dict[str, Any], top_n: int = 10):
-    """
-    Append rows to the TopFailures tab.
-    """
-    sh = _get_sheet(config)
-    ws = sh.worksheet(config["sheets"]["tabs"]["top_failures"])
-
-    # Define expected header
-    header = [
-        "run_id",
-        "id",
-        "snippet",
-        "reason"
-    ]
-
-    # Check if sheet is empty or header missing
-    existing_values = ws.get_all_values()
-    if not existing_values:  # completely empty sheet
-        ws.append_row(header, value_input_option="USER_ENTERED")
-    else:
-        first_row = existing_values[0]
-        if first_row != header:
-            ws.insert_row(header, 1, value_input_option="USER_ENTERED")
-
-    # Sort by lowest correctness
-    sorted_items = sorted(per_item_results, key=lambda r: r["correctness"])
-    failures = sorted_items[:top_n]
-
+def top_failure_rows(per_item_results: Iterable[Dict[str, Any]], top_n: int = 10) -> List[List[Any]]:
+    # Lowest correctness first (nsmallest keeps only top_n items in memory)
+    failures = heapq.nsmallest(top_n, per_item_results, key=lambda r: r["correctness"])
     rows = []
     for r in failures:
         rows.append([
@@ -143,4 +159,231 @@ def append_top_failures(per_item_results: List[Dict[str, Any]], config: Dict[str
             r["model_answer"][:200],  # snippet
             "Low correctness"
         ])
-    ws.append_rows(rows, value_input_option="USER_ENTERED",table_range='A1')
+    return rows
+
+# ---------------------------
+# Batched upload
+# ---------------------------
+# Typed cells are stored as given, so strings the Sheets UI (and the USER_ENTERED values
+# API the rows used to go through) would parse are converted here: numbers, booleans and
+# ISO dates/timestamps, the latter as date-time serials with a visible date format
+_NUMBER = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+_ISO_DATE = re.compile(r"\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?")
+_SHEETS_EPOCH = datetime(1899, 12, 30)
+_DATE_FORMATS = {False: {"type": "DATE", "pattern": "yyyy-mm-dd"},
+                 True: {"type": "DATE_TIME", "pattern": "yyyy-mm-dd hh:mm:ss"}}
+_CELL_FIELDS = "userEnteredValue,userEnteredFormat.numberFormat"
+
+def _cell(value) -> Dict[str, Any]:
+    if value is None:
+        return {}
+    if isinstance(value, bool):
+        return {"userEnteredValue": {"boolValue": value}}
+    if isinstance(value, (int, float)):
+        return {"userEnteredValue": {"numberValue": value}}
+    text = str(value)
+    stripped = text.strip()
+    if _NUMBER.fullmatch(stripped):
+        return {"userEnteredValue": {"numberValue": float(stripped)}}
+    if stripped.upper() in ("TRUE", "FALSE"):
+        return {"userEnteredValue": {"boolValue": stripped.upper() == "TRUE"}}
+    if _ISO_DATE.fullmatch(stripped):
+        try:
+            moment = datetime.fromisoformat(stripped)
+        except ValueError:
+            pass
+        else:
+            serial = (moment - _SHEETS_EPOCH).total_seconds() / 86400
+            return {"userEnteredValue": {"numberValue": serial},
+                    "userEnteredFormat": {"numberFormat": _DATE_FORMATS[len(stripped) > 10]}}
+    return {"userEnteredValue": {"stringValue": text}}
+
+def _row_data(rows: List[List[Any]]) -> List[Dict[str, Any]]:
+    return [{"values": [_cell(v) for v in row]} for row in rows]
+
+def upload_rows(tables: Dict[str, Any], config: Dict[str, Any]):
+    """
+    Write rows to several tabs with a single spreadsheets.batchUpdate call.
+    tables maps a tab key from sheets.yml ("runs", "per_item", "top_failures") to (header, rows).
+    Headers are checked by reading only row 1 of each tab, once per process.
+    """
+    sh, tab_ids = _get_sheet(config)
+    titles = {key: config["sheets"]["tabs"][key] for key in tables}
+    sheet_id = config["sheets"]["sheet_id"]
+
+    # Check header rows we have not verified yet, all in one read
+    unchecked = [key for key in tables if (sheet_id, titles[key]) not in _verified_headers]
+    first_rows = {}
+    if unchecked:
+        ranges = [f"'{titles[key]}'!1:1" for key in unchecked]
+        with tracing.span("sheets.read_headers", cat="sheets"):
+            value_ranges = sh.values_batch_get(ranges).get("valueRanges", [])
+        for key, value_range in zip(unchecked, value_ranges):
+            first_rows[key] = value_range.get("values", [[]])[0]
+
+    requests = []
+    for key, (header, rows) in tables.items():
+        tab_id = tab_ids[titles[key]]
+        if key in first_rows:
+            first_row = first_rows[key]
+            if not first_row:  # completely empty sheet
+                requests.append({"appendCells": {"sheetId": tab_id, "rows": _row_data([header]), "fields": _CELL_FIELDS}})
+            elif first_row != [str(h) for h in header]:
+                # If header mismatch (e.g. someone cleared it), re-add
+                requests.append({"insertDimension": {
+                    "range": {"sheetId": tab_id, "dimension": "ROWS", "startIndex": 0, "endIndex": 1},
+                    "inheritFromBefore": False,
+                }})
+                requests.append({"updateCells": {
+                    "start": {"sheetId": tab_id, "rowIndex": 0, "columnIndex": 0},
+                    "rows": _row_data([header]),
+                    "fields": _CELL_FIELDS,
+                }})
+        if rows:
+            requests.append({"appendCells": {"sheetId": tab_id, "rows": _row_data(rows), "fields": _CELL_FIELDS}})
+
+    if requests:
+        with tracing.span("sheets.batch_update", cat="sheets", n_requests=len(requests)):
+            sh.batch_update({"requests": requests})
+    _verified_headers.update((sheet_id, titles[key]) for key in tables)
+
+@tracing.traced("sheets.upload_run", cat="sheets")
+def upload_run(run_id: str, config_name: str, suite_name: str, aggregates: Dict[str, Any],
+               per_item_results: Iterable[Dict[str, Any]], config: Dict[str, Any], top_n: int = 10,
+               retry: bool = False):
+    """
+    Upload the Runs, PerItem and TopFailures rows of one run in a single batch.
+    """
+    upload_runs([(run_id, config_name, suite_name, aggregates, per_item_results)], config, top_n, retry)
+
+def uploaded_run_ids(config: Dict[str, Any]) -> set:
+    """
+    Run ids that already have a row in the Runs tab.
+    """
+    sh, _ = _get_sheet(config)
+    column = chr(ord("A") + RUNS_HEADER.index("run_id"))
+    with tracing.span("sheets.read_run_ids", cat="sheets"):
+        value_ranges = sh.values_batch_get([f"'{config['sheets']['tabs']['runs']}'!{column}:{column}"])
+    rows = value_ranges.get("valueRanges", [{}])[0].get("values", [])
+    return {row[0] for row in rows[1:] if row}
+
+@tracing.traced("sheets.upload_runs", cat="sheets")
+def upload_runs(runs: List[tuple], config: Dict[str, Any], top_n: int = 10, retry: bool = False):
+    """
+    Upload the rows of several runs, each (run_id, config_name, suite_name, aggregates,
+    per_item_results), in a single batch. With retry, runs whose Runs row already exists
+    are skipped: a failed attempt (e.g. a read timeout) may still have been applied, and
+    appendCells would add its rows again. A batchUpdate is applied whole or not at all,
+    so a run with a Runs row has its PerItem and TopFailures rows too.
+    """
+    if retry:
+        uploaded = uploaded_run_ids(config)
+        runs = [run for run in runs if run[0] not in uploaded]
+        if not runs:
+            return
+    tables = {"runs": (RUNS_HEADER, []), "per_item": (PER_ITEM_HEADER, []), "top_failures": (TOP_FAILURES_HEADER, [])}
+    for run_id, config_name, suite_name, aggregates, per_item_results in runs:
+        per_item_results = list(per_item_results)
+        tables["runs"][1].extend(run_rows(run_id, config_name, suite_name, aggregates))
+        tables["per_item"][1].extend(per_item_rows(per_item_results))
+        tables["top_failures"][1].extend(top_failure_rows(per_item_results, top_n))
+    upload_rows(tables, config)
+
+def append_run(run_id: str, config_name: str, suite_name: str, aggregates: Dict[str, Any], config: Dict[str, Any]):
+    """
+    Append one row to the Runs tab.
+    """
+    upload_rows({"runs": (RUNS_HEADER, run_rows(run_id, config_name, suite_name, aggregates))}, config)
+
+def append_per_item(per_item_results: Iterable[Dict[str, Any]], config: Dict[str, Any]):
+    """
+    Append rows to the PerItem tab.
+    """
+    upload_rows({"per_item": (PER_ITEM_HEADER, per_item_rows(per_item_results))}, config)
+
+def append_top_failures(per_item_results: Iterable[Dict[str, Any]], config: Dict[str, Any], top_n: int = 10):
+    """
+    Append rows to the TopFailures tab.
+    """
+    upload_rows({"top_failures": (TOP_FAILURES_HEADER, top_failure_rows(per_item_results, top_n))}, config)
+
+# ---------------------------
+# Background uploads
+# ---------------------------
+def _is_retryable(error: Exception) -> bool:
+    """
+    Quota (429) and server errors of the Sheets API, and network errors, may pass on a
+    later attempt. Bad requests, permission errors and bugs (e.g. a missing tab) will not.
+    """
+    import requests
+    from gspread.exceptions import APIError
+
+    if isinstance(error, APIError):
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+class BackgroundUploader:
+    """
+    Runs uploads on a worker thread so the next suite can start while Sheets is written.
+    Failed uploads are retried with jittered exponential backoff; retries are called with
+    retry=True, so an upload whose failed attempt was applied anyway is not appended twice.
+    """
+
+    def __init__(self, max_attempts: int = 5, backoff_seconds: float = 2.0):
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._work, name="sheets-uploader", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        self._queue.put((fn, args, kwargs))
+
+    def _work(self):
+        while True:
+            fn, args, kwargs = self._queue.get()
+            try:
+                for attempt in range(1, self.max_attempts + 1):
+                    try:
+                        fn(*args, **kwargs, retry=attempt > 1)
+                        break
+                    except Exception as e:
+                        if attempt == self.max_attempts or not _is_retryable(e):
+                            print(f"Sheets upload failed after {attempt} attempt(s): {e}")
+                            break
+                        time.sleep(self.backoff_seconds * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+            finally:
+                self._queue.task_done()
+
+    def wait(self):
+        """
+        Block until every submitted upload has finished (or given up).
+        """
+        self._queue.join()
+
+_uploader = None
+
+def _background_uploader() -> "BackgroundUploader":
+    global _uploader
+    if _uploader is None:
+        _uploader = BackgroundUploader()
+    return _uploader
+
+def upload_run_in_background(run_id: str, config_name: str, suite_name: str, aggregates: Dict[str, Any],
+                             per_item_results: Iterable[Dict[str, Any]], config: Dict[str, Any]):
+    """
+    Build the run's rows now and queue the batched upload on the background uploader.
+    """
+    _background_uploader().submit(upload_run, run_id, config_name, suite_name, aggregates, list(per_item_results), config)
+
+def upload_runs_in_background(runs: List[tuple], config: Dict[str, Any]):
+    """
+    upload_runs on the background uploader; per-item results are read now.
+    """
+    runs = [(*run[:4], list(run[4])) for run in runs]
+    _background_uploader().submit(upload_runs, runs, config)
+
+def wait_for_uploads():
+    if _uploader is not None:
+        _uploader.wait()
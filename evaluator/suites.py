@@ -0,0 +1,213 @@
+# evaluator/suites.py
+"""
+Suite loading through a cached byte-offset index.
+
+A suite is a JSONL file of items. Each file gets an index (id, byte offset, length, tags,
+needs_retrieval, text hash per line), built in one pass and cached under .cache/suites/
+until the file changes. Filters by id, tag or sample run on the index, and only the
+matching lines are read and parsed, so large generated suites never have to be
+loaded whole.
+
+A suite spec is a suite name ("core" -> data/core.jsonl), a path, or a glob.
+"""
+import glob
+import hashlib
+import json
+import random
+from pathlib import Path
+from collections.abc import Sequence
+from typing import Dict, Any, Iterable, Iterator, List, NamedTuple, Optional
+
+DATA_DIR = Path("data")
+INDEX_DIR = Path(".cache") / "suites"
+
+class IndexEntry(NamedTuple):
+    id: str
+    path: str
+    offset: int
+    length: int
+    tags: List[str]
+    needs_retrieval: bool
+    text_hash: str
+
+# ---------------------------
+# Files
+# ---------------------------
+def suite_paths(spec: str) -> List[Path]:
+    """
+    Files of a suite spec: a name under data/, a file path, or a glob.
+    """
+    named = DATA_DIR / f"{spec}.jsonl"
+    if named.exists():
+        return [named]
+    if glob.has_magic(spec):
+        paths = sorted(Path(p) for p in glob.glob(spec))
+    else:
+        paths = [Path(spec)] if Path(spec).exists() else []
+    if not paths:
+        raise FileNotFoundError(f"No suite file matches {spec!r}")
+    return paths
+
+def available_suites() -> List[str]:
+    return sorted(p.stem for p in DATA_DIR.glob("*.jsonl"))
+
+def suite_label(spec: str) -> str:
+    """
+    Short name of a suite spec for run metadata: "data/core.jsonl" -> "core".
+    """
+    paths = suite_paths(spec)
+    if len(paths) == 1 and paths[0].parent.resolve() == DATA_DIR.resolve():
+        return paths[0].stem
+    return spec
+
+# ---------------------------
+# Index
+# ---------------------------
+def _index_path(path: Path) -> Path:
+    digest = hashlib.sha256(str(path.resolve()).encode("utf-8")).hexdigest()[:16]
+    return INDEX_DIR / f"{path.stem}-{digest}.json"
+
+def _build_index(path: Path) -> List[list]:
+    rows = []
+    with open(path, "rb") as f:
+        offset = 0
+        for line in f:
+            if line.strip():
+                item = json.loads(line)
+                rows.append([item["id"], offset, len(line), item.get("tags", []),
+                             bool(item.get("needs_retrieval", False)),
+                             hashlib.sha256(line.rstrip(b"\r\n")).hexdigest()[:16]])
+            offset += len(line)
+    return rows
+
+# resolved path -> (size/mtime stamp, entries)
+_indexes: Dict[str, tuple] = {}
+
+def file_index(path: Path) -> List[IndexEntry]:
+    """
+    Index of one suite file, from memory, the on-disk cache, or a fresh scan.
+    The cache is keyed by the file's size and mtime, so edits rebuild it.
+    """
+    path = Path(path)
+    stat = path.stat()
+    stamp = [stat.st_size, stat.st_mtime_ns]
+    key = str(path.resolve())
+    cached = _indexes.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    rows = None
+    index_path = _index_path(path)
+    if index_path.exists():
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data["stamp"] == stamp:
+                rows = data["rows"]
+        except (ValueError, KeyError):
+            rows = None
+    if rows is None:
+        rows = _build_index(path)
+        INDEX_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = index_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"stamp": stamp, "rows": rows}, f, ensure_ascii=False)
+        tmp_path.replace(index_path)
+
+    entries = [IndexEntry(row[0], str(path), row[1], row[2], row[3], row[4], row[5]) for row in rows]
+    _indexes[key] = (stamp, entries)
+    return entries
+
+def suite_index(spec: str) -> List[IndexEntry]:
+    entries = []
+    for path in suite_paths(spec):
+        entries.extend(file_index(path))
+    return entries
+
+# ---------------------------
+# Selection
+# ---------------------------
+def select(entries: List[IndexEntry], ids: Iterable[str] = None, tags: Iterable[str] = None,
+           sample: int = None, seed: int = 0) -> List[IndexEntry]:
+    """
+    Filter index entries: by id, by tag (any of them), then a seeded random sample of
+    `sample` entries. Suite order is kept.
+    """
+    if ids:
+        wanted = set(ids)
+        entries = [e for e in entries if e.id in wanted]
+        missing = wanted - {e.id for e in entries}
+        if missing:
+            raise KeyError(f"Unknown item id(s): {', '.join(sorted(missing))}")
+    if tags:
+        wanted_tags = set(tags)
+        entries = [e for e in entries if wanted_tags.intersection(e.tags)]
+    if sample is not None and sample < len(entries):
+        chosen = set(random.Random(seed).sample(range(len(entries)), sample))
+        entries = [e for i, e in enumerate(entries) if i in chosen]
+    return entries
+
+def iter_items(entries: Iterable[IndexEntry]) -> Iterator[Dict[str, Any]]:
+    """
+    Read and parse only the lines of the given entries, keeping files open between reads.
+    """
+    handles = {}
+    try:
+        for entry in entries:
+            f = handles.get(entry.path)
+            if f is None:
+                f = handles[entry.path] = open(entry.path, "rb")
+            f.seek(entry.offset)
+            yield json.loads(f.read(entry.length))
+    finally:
+        for f in handles.values():
+            f.close()
+
+def iter_suite(spec: str, ids: Iterable[str] = None, tags: Iterable[str] = None,
+               sample: int = None, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily yield the items of a suite spec that pass the filters.
+    """
+    return iter_items(select(suite_index(spec), ids, tags, sample, seed))
+
+def load_suite(spec: str, ids: Iterable[str] = None, tags: Iterable[str] = None,
+               sample: int = None, seed: int = 0) -> List[Dict[str, Any]]:
+    return list(iter_suite(spec, ids, tags, sample, seed))
+
+class SuiteItems(Sequence):
+    """
+    The items of index entries as a read-only sequence that holds only the entries:
+    an item is read from its line when it is accessed, and iterating streams them.
+    """
+
+    def __init__(self, entries: Iterable[IndexEntry]):
+        self.entries = list(entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return SuiteItems(self.entries[index])
+        return next(iter_items([self.entries[index]]))
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter_items(self.entries)
+
+class ItemLookup:
+    """
+    Items of many suite files (or of the given index entries) by id, read on demand
+    from their index (e.g. the ground truth of items in saved reports).
+    """
+
+    def __init__(self, spec: str = "data/*.jsonl", entries: Iterable[IndexEntry] = None):
+        self.entries = {e.id: e for e in (suite_index(spec) if entries is None else entries)}
+
+    def get(self, item_id: str, default=None) -> Optional[Dict[str, Any]]:
+        if item_id not in self.entries:
+            return default
+        return next(iter_items([self.entries[item_id]]))
+
+    def suite_of(self, item_id: str) -> Optional[str]:
+        entry = self.entries.get(item_id)
+        return Path(entry.path).stem if entry else None
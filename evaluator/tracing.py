@@ -0,0 +1,189 @@
+# evaluator/tracing.py
+"""
+Lightweight span/timer layer for the harness hot paths.
+
+Off by default: span() then returns a shared no-op context manager and traced()
+functions only pay one flag check. Once enable()d, every span is kept as a Chrome
+trace event (open the exported file in chrome://tracing or https://ui.perfetto.dev),
+and phase_summary() gives count / total / mean / p95 per span name.
+
+    with tracing.span("ui.submit", item="q001"):
+        ...
+
+    @tracing.traced("metrics.correctness")
+    def compute_correctness_batch(...):
+        ...
+"""
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Dict, Any, List
+
+_enabled = False
+_events: List[Dict[str, Any]] = []
+_thread_names: Dict[int, str] = {}
+_origin = time.perf_counter()
+_NOOP = nullcontext()
+
+def enable():
+    global _enabled
+    _enabled = True
+
+def enabled() -> bool:
+    return _enabled
+
+def reset():
+    _events.clear()
+    _thread_names.clear()
+
+def _us(t: float) -> float:
+    return (t - _origin) * 1e6
+
+def _tid() -> int:
+    tid = threading.get_ident()
+    if tid not in _thread_names:
+        _thread_names[tid] = threading.current_thread().name
+    return tid
+
+# ---------------------------
+# Recording
+# ---------------------------
+def add_span(name: str, start: float, end: float, cat: str = "harness", track: str = None, **args):
+    """
+    Record a span timed elsewhere (start/end from time.perf_counter()), e.g. a phase
+    measured inside the page. Spans given a track are drawn as async slices on that
+    track, so overlapping requests on one thread stay readable.
+    """
+    if not _enabled:
+        return
+    if track is None:
+        _events.append({"name": name, "cat": cat, "ph": "X", "ts": _us(start), "dur": (end - start) * 1e6,
+                        "pid": os.getpid(), "tid": _tid(), "args": args})
+    else:
+        base = {"name": name, "cat": cat, "id": f"{track}:{name}:{start}", "pid": os.getpid(), "tid": _tid()}
+        _events.append({**base, "ph": "b", "ts": _us(start), "args": {"track": track, **args}})
+        _events.append({**base, "ph": "e", "ts": _us(end)})
+
+class _Span:
+    __slots__ = ("name", "cat", "args", "start")
+
+    def __init__(self, name: str, cat: str, args: Dict[str, Any]):
+        self.name, self.cat, self.args = name, cat, args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        add_span(self.name, self.start, time.perf_counter(), self.cat, **self.args)
+        return False
+
+def span(name: str, cat: str = "harness", **args):
+    """
+    Time a block. Keyword arguments (e.g. item="q001") are kept with the span.
+    """
+    if not _enabled:
+        return _NOOP
+    return _Span(name, cat, args)
+
+def traced(name: str = None, cat: str = "harness"):
+    """
+    Decorator form of span(); the span is named after the function unless name is given.
+    """
+    def decorate(fn):
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*a, **kw):
+            if not _enabled:
+                return fn(*a, **kw)
+            with _Span(span_name, cat, {}):
+                return fn(*a, **kw)
+        return wrapper
+    return decorate
+
+# ---------------------------
+# Reporting
+# ---------------------------
+def _durations() -> Dict[str, List[tuple]]:
+    """
+    (duration_ms, args) of every recorded span, by name.
+    """
+    spans: Dict[str, List[tuple]] = {}
+    opened = {}
+    for event in _events:
+        if event["ph"] == "X":
+            spans.setdefault(event["name"], []).append((event["dur"] / 1000, event["args"]))
+        elif event["ph"] == "b":
+            opened[event["id"]] = event
+        elif event["ph"] == "e" and event["id"] in opened:
+            begin = opened.pop(event["id"])
+            spans.setdefault(event["name"], []).append(((event["ts"] - begin["ts"]) / 1000, begin["args"]))
+    return spans
+
+def phase_summary() -> Dict[str, Dict[str, float]]:
+    summary = {}
+    for name, spans in sorted(_durations().items()):
+        durations = sorted(d for d, _ in spans)
+        summary[name] = {
+            "count": len(durations),
+            "total_ms": sum(durations),
+            "mean_ms": sum(durations) / len(durations),
+            "p95_ms": durations[min(len(durations) - 1, int(0.95 * len(durations)))],
+        }
+    return summary
+
+def item_phases() -> Dict[str, Dict[str, float]]:
+    """
+    Total milliseconds per phase for each item (spans recorded with an item argument).
+    """
+    items: Dict[str, Dict[str, float]] = {}
+    for name, spans in _durations().items():
+        for duration, args in spans:
+            if "item" in args:
+                phases = items.setdefault(str(args["item"]), {})
+                phases[name] = phases.get(name, 0.0) + duration
+    return items
+
+def print_phase_summary():
+    print(f"{'phase':<32} {'count':>7} {'total_ms':>11} {'mean_ms':>9} {'p95_ms':>9}")
+    for name, s in phase_summary().items():
+        print(f"{name:<32} {s['count']:>7} {s['total_ms']:>11.1f} {s['mean_ms']:>9.2f} {s['p95_ms']:>9.2f}")
+
+def export_chrome_trace(path):
+    """
+    Write the recorded spans as a Chrome trace (JSON object format), with the phase
+    summary and per-item phase totals under otherData.
+    """
+    metadata = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+                for tid, name in _thread_names.items()]
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({
+            "traceEvents": metadata + _events,
+            "displayTimeUnit": "ms",
+            "otherData": {"phase_summary": phase_summary(), "item_phases": item_phases()},
+        }, f)
+
+@contextmanager
+def profiled(path):
+    """
+    Run a block under cProfile and dump the stats to path (read with pstats or snakeviz).
+    A None path is a no-op.
+    """
+    if path is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(str(path))